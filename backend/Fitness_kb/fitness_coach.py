@@ -1,51 +1,53 @@
 import re
 import os
-import faiss
 import json
 import numpy as np
+from functools import lru_cache
 from typing import List
 from datetime import datetime
 from statistics import mean
-from openai import OpenAI
+from clients import get_openrouter_client, EXTRA_HEADERS
 from dotenv import load_dotenv
-from fastembed import TextEmbedding
 
 load_dotenv()
 
-client_deepseek = OpenAI(
-    api_key=os.environ.get("DEEPSEEK_API_KEY"),
-    base_url="https://openrouter.ai/api/v1"
-)
-
 MODEL_NAME = "x-ai/grok-4.1-fast"
-EXTRA_HEADERS = {
-    "HTTP-Referer": os.environ.get("SITE_URL", "http://localhost"),
-    "X-Title": os.environ.get("SITE_NAME", "Query Orchestrator")
-}
 
 BASE_DIR = os.path.dirname(__file__)
 KB_INDEX_PATH = os.path.join(BASE_DIR, "fitness_kb.index")
 KB_JSON_PATH = os.path.join(BASE_DIR, "fitness_kb.json")
+EMBEDDING_MODEL_NAME = "BAAI/bge-small-en-v1.5"
+
+
+@lru_cache(maxsize=1)
+def get_faiss_index():
+    import faiss
+    return faiss.read_index(KB_INDEX_PATH)
 
 
-faiss_index = faiss.read_index(KB_INDEX_PATH)
+@lru_cache(maxsize=1)
+def get_kb_map() -> dict:
+    with open(KB_JSON_PATH, "r") as f:
+        return json.load(f)
 
-with open(KB_JSON_PATH, "r") as f:
-    KB_MAP = json.load(f)
 
-embedding_model = TextEmbedding("BAAI/bge-small-en-v1.5")
+@lru_cache(maxsize=1)
+def get_embedding_model():
+    from fastembed import TextEmbedding
+    return TextEmbedding(EMBEDDING_MODEL_NAME)
 
 
 def retrieve_kb_snippets(user_query: str, top_k: int = 4) -> list:
-    query_embedding = list(embedding_model.embed([user_query]))
+    query_embedding = list(get_embedding_model().embed([user_query]))
     query_embedding = np.array(query_embedding).astype("float32")
 
-    distances, indices = faiss_index.search(query_embedding, top_k)
+    distances, indices = get_faiss_index().search(query_embedding, top_k)
 
+    kb_map = get_kb_map()
     results = []
     for idx in indices[0]:
         if idx != -1:
-            results.append(KB_MAP[str(idx)])
+            results.append(kb_map[str(idx)])
 
     return results
 
@@ -83,7 +85,7 @@ Avoid generic fitness advice. Use ONLY the user's data + KB context.
 Now provide the explanation:
 """
     try:
-        response = client_deepseek.chat.completions.create(
+        response = get_openrouter_client().chat.completions.create(
             model=MODEL_NAME,
             messages=[
                 {"role": "system", "content": "You extract structured data from text."},
@@ -0,0 +1,30 @@
+import os
+import functools
+from typing import Any, Callable, Dict
+import anyio
+import anyio.to_thread
+
+# The services are synchronous (pymongo, psycopg2, Gemini/OpenRouter clients),
+# so async routes hand them to worker threads instead of running them on the
+# event loop. LLM-bound calls get their own, smaller pool so a burst of slow
+# /query or /calories requests cannot starve plain database reads.
+THREAD_LIMITS = {
+    "db": int(os.getenv("DB_THREADS", "32")),
+    "llm": int(os.getenv("LLM_THREADS", "16")),
+}
+
+_limiters: Dict[str, anyio.CapacityLimiter] = {}
+
+
+def _get_limiter(pool: str) -> anyio.CapacityLimiter:
+    limiter = _limiters.get(pool)
+    if limiter is None:
+        limiter = _limiters[pool] = anyio.CapacityLimiter(THREAD_LIMITS[pool])
+    return limiter
+
+
+async def run_blocking(func: Callable[..., Any], *args, pool: str = "db", **kwargs) -> Any:
+    return await anyio.to_thread.run_sync(
+        functools.partial(func, *args, **kwargs),
+        limiter=_get_limiter(pool),
+    )
@@ -1,12 +1,13 @@
 from fastapi import APIRouter, HTTPException
 from api.models.calories_model import CaloriesRequest,DeleteFood
 from api.services.calories_service import calculate_calories,view_calories,delete_food
+from api.concurrency import run_blocking
 router = APIRouter(prefix="/calories", tags=["calories"])
 @router.post("/calculate")
 async def calculate_calorie_intake(payload: CaloriesRequest):
     try:
-        calorie_plan = calculate_calories(payload.dict())
-        return {"success": True, "calorie_plan": calorie_plan}
+        calorie_plan, unresolved_items = await run_blocking(calculate_calories, payload.dict(), pool="llm")
+        return {"success": True, "calorie_plan": calorie_plan, "unresolved_items": unresolved_items}
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=str(ve))
     except RuntimeError as re:
@@ -16,7 +17,7 @@ async def calculate_calorie_intake(payload: CaloriesRequest):
 @router.get("/view")
 async def view_calories_intake(user_id,date):
     try:
-        calorie_data = view_calories(user_id,date)
+        calorie_data = await run_blocking(view_calories, user_id, date)
         return {"success": True, "calorie_data": calorie_data}
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=str(ve))
@@ -26,4 +27,4 @@ async def view_calories_intake(user_id,date):
         raise HTTPException(status_code=500, detail=f"Unexpected error: {e}")
 @router.post("/delete")
 async def delete(data:DeleteFood):
-    return delete_food(data)
\ No newline at end of file
+    return await run_blocking(delete_food, data)
\ No newline at end of file
@@ -1,11 +1,12 @@
 from fastapi import APIRouter, HTTPException
 from api.models.food_sugg_model import FoodSuggestionRequest
 from api.services.food_sugg_service import suggest_food
+from api.concurrency import run_blocking
 router=APIRouter(prefix="/food")
 @router.post("/suggest")
 async def suggest_food_main(req: FoodSuggestionRequest):
     try:
-        res=suggest_food(req)
+        res=await run_blocking(suggest_food, req, pool="llm")
         return res
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=str(ve))
@@ -2,14 +2,15 @@ from fastapi import APIRouter, HTTPException
 from api.models.macros_model import MacroRequest
 from api.services.macros_service import generate_and_upsert_macro, view_macros,view_macros_full
 from api.services.user_service import generate_user_data
+from api.concurrency import run_blocking
 
 router = APIRouter(prefix="/macros", tags=["macros"])
 
 @router.post("/generate")
 async def create_or_update_macro(payload: MacroRequest):
     try:
-        save_user=generate_user_data(payload)
-        plan = generate_and_upsert_macro(payload.dict())
+        save_user=await run_blocking(generate_user_data, payload)
+        plan = await run_blocking(generate_and_upsert_macro, payload.dict(), pool="llm")
         return {"success": True,"user_data":save_user, "macro_plan": plan}
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=str(ve))
@@ -20,7 +21,7 @@ async def create_or_update_macro(payload: MacroRequest):
 @router.get("/view")
 async def view_user_macros(user_id,date):
     try:
-        user_data = view_macros(user_id,date)
+        user_data = await run_blocking(view_macros, user_id, date)
         return {"success": True, "user_data": user_data}
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=str(ve))
@@ -31,7 +32,7 @@ async def view_user_macros(user_id,date):
 @router.get("/view_full")
 async def view_user_macros_full(user_id):
     try:
-        user_data = view_macros_full(user_id)
+        user_data = await run_blocking(view_macros_full, user_id)
         return {"success": True, "user_data": user_data}
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=str(ve))
@@ -1,11 +1,12 @@
 from fastapi import APIRouter, HTTPException
 from api.models.query_model import QueryRequest
 from api.services.query_service import query_answer_sevice 
+from api.concurrency import run_blocking
 router = APIRouter(prefix="/query", tags=["query"])
 @router.post("/answer")
 async def answer_query(payload: QueryRequest):
     try:
-        answer = query_answer_sevice(payload.dict())
+        answer = await run_blocking(query_answer_sevice, payload.dict(), pool="llm")
         return {"success": True, "answer": answer}
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=str(ve))
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException
 from api.models.user_model import UserRequest
 from api.services.user_service import generate_user_data,view_user
+from api.concurrency import run_blocking
 router = APIRouter(prefix="/user", tags=["user"])
 
 '''@router.post("/generate")
@@ -17,7 +18,7 @@ async def create_or_update_macro(payload: UserRequest):
 @router.get("/view")
 async def view_user_detail(user_id):
     try:
-        user_data = view_user(user_id)
+        user_data = await run_blocking(view_user, user_id)
         return {"success": True, "user_data": user_data}
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=str(ve))
@@ -1,11 +1,12 @@
 from fastapi import HTTPException, APIRouter
 from api.models.weight_model import Weight_save
 from api.services.weight_service import weight_save,view_weight
+from api.concurrency import run_blocking
 router = APIRouter(prefix="/progress", tags=["workout"])
 @router.post("/weight_save")
 async def save_weight(payload: Weight_save):
     try:
-        result = weight_save(payload.dict())
+        result = await run_blocking(weight_save, payload.dict())
         if result is None:
             raise HTTPException(status_code=500, detail="Failed to save weight")
         return {"success": True, "message": result.get("message", "Weight saved successfully")}
@@ -16,7 +17,7 @@ async def save_weight(payload: Weight_save):
 @router.get("/weight_view")
 async def weight_view(user_id):
     try:
-        result = view_weight(user_id)
+        result = await run_blocking(view_weight, user_id)
         return result
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=str(ve))
@@ -1,11 +1,12 @@
 from fastapi import APIRouter, Body, HTTPException
 from api.models.workout_model import WorkoutRequest,SaveWorkoutResponse,WorkoutDeleteSetModel,WorkoutEditModel
 from api.services.workout_service import calculate_workout,view_workout,create_or_update_workout_plan,get_workout_plan,save_plan_and_daily,delete_set,edit_set
+from api.concurrency import run_blocking
 router = APIRouter(prefix="/workout", tags=["workout"])
 @router.post("/calculate")
 async def calculate_workout_data(payload: WorkoutRequest):
     try:
-        workout_plan = calculate_workout(payload.dict())
+        workout_plan = await run_blocking(calculate_workout, payload.dict(), pool="llm")
         return {"success": True, "workout_plan": workout_plan}
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=str(ve))
@@ -16,7 +17,7 @@ async def calculate_workout_data(payload: WorkoutRequest):
 @router.get("/view")
 async def view_calories_intake(user_id,date):
     try:
-        workout_data = view_workout(user_id,date)
+        workout_data = await run_blocking(view_workout, user_id, date)
         return {"success": True, "workout_data": workout_data}
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=str(ve))
@@ -30,7 +31,8 @@ async def save_workout_data(payload:SaveWorkoutResponse):
         for exercise in payload.workout_data:
             sets_list = [s.dict() for s in exercise.sets]
             print("SETS LIST:", sets_list)
-            create_or_update_workout_plan(
+            await run_blocking(
+                create_or_update_workout_plan,
                 user_id=payload.user_id,
                 plan_name=payload.plan_name,
                 exercise_name=exercise.exercise_name,
@@ -46,7 +48,7 @@ async def save_workout_data(payload:SaveWorkoutResponse):
 @router.get("/plan_view")
 async def view_workout_plan(user_id: str, plan_name: str | None = None,list_only: bool = False):
     try:
-        return get_workout_plan(user_id=user_id, plan_name=plan_name,list_only=list_only)
+        return await run_blocking(get_workout_plan, user_id=user_id, plan_name=plan_name, list_only=list_only)
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=str(ve))
     except RuntimeError as re:
@@ -60,12 +62,12 @@ async def plan_save_and_upsert(payload: dict = Body(...)):
     plan_name = payload.get("plan_name")
     entries = payload.get("entries", [])
 
-    result = save_plan_and_daily(user_id=user_id, date=date, plan_name=plan_name, frontend_exercises=entries)
+    result = await run_blocking(save_plan_and_daily, user_id=user_id, date=date, plan_name=plan_name, frontend_exercises=entries)
     return result
 @router.post("/edit")
 async def edit(payload: WorkoutEditModel):
-    return edit_set(payload)
+    return await run_blocking(edit_set, payload)
 
 @router.post("/delete")
 async def delete_set_ex(data: WorkoutDeleteSetModel):
-    return delete_set(data)
+    return await run_blocking(delete_set, data)
@@ -1,8 +1,8 @@
 import os
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
+from pymongo import ReturnDocument
 from tracker.calories_track import estimate_calories,enrich_with_macros
-from trigger.diet_trigger import handle_summary_trigger
-from tracker.progress_tracker import update_daily_progress
+from trigger.post_write import enqueue_post_write
 import datetime
 calories_col = None
 try:
@@ -11,18 +11,6 @@ try:
     print("Using calories_col from db_connection module")
 except Exception:
     calories_col = None
-if calories_col is None:
-    try:
-        from pymongo import MongoClient
-        MONGO_URI = os.getenv("MONGO_URI")
-        if MONGO_URI:
-            client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
-            DB_NAME = os.getenv("DB_NAME")
-            db_from_uri =client[DB_NAME]
-            calories_col = db_from_uri["diet_logs"]
-            print("Using calories_col from direct MongoDB connection")
-    except Exception:
-        calories_col = None
 def compute_totals_from_items(items):
     totals = {
         "total_calories": 0.0,
@@ -41,7 +29,154 @@ def compute_totals_from_items(items):
         totals[k] = round(totals[k], 2)
     return totals
 
-def calculate_calories(calories_payload: Dict[str, Any]) -> Dict[str, Any]:
+ITEM_SUM_FIELDS = ["quantity", "weight", "calories", "proteins", "fats", "carbs", "fiber"]
+SUMMARY_FIELDS = {
+    "total_calories": "calories",
+    "total_protein": "proteins",
+    "total_fat": "fats",
+    "total_carb": "carbs",
+    "total_fiber": "fiber"
+}
+
+def merge_incoming_meals(incoming_meals):
+    merged = {}
+    for meal in incoming_meals:
+        meal_type = meal.get("meal_type")
+        if not meal_type:
+            continue
+        foods = merged.setdefault(meal_type, {})
+        for it in meal.get("items", []) or []:
+            key = it["food"].lower()
+            if key not in foods:
+                foods[key] = it.copy()
+            else:
+                for f in ITEM_SUM_FIELDS:
+                    foods[key][f] = foods[key].get(f, 0) + it.get(f, 0)
+    return {meal_type: list(foods.values()) for meal_type, foods in merged.items()}
+
+def _summary_expr(items_expr, source_fields):
+    return {
+        total: {"$round": [{"$sum": {"$map": {
+            "input": items_expr,
+            "as": "s",
+            "in": {"$toDouble": {"$ifNull": [f"$$s.{field}", 0]}}
+        }}}, 2]}
+        for total, field in source_fields.items()
+    }
+
+def _add_item_fields(item_expr, other_expr):
+    return {"$mergeObjects": [item_expr, {
+        f: {"$add": [{"$ifNull": [f"{item_expr}.{f}", 0]}, {"$ifNull": [f"{other_expr}.{f}", 0]}]}
+        for f in ITEM_SUM_FIELDS
+    }]}
+
+def _collapse_items_expr(items_expr):
+    # Folds stored items with the same lowercased food into one, as the old
+    # read-modify-write merge did, so an incoming item is added exactly once.
+    return {"$reduce": {
+        "input": items_expr,
+        "initialValue": [],
+        "in": {"$cond": [
+            {"$in": [{"$toLower": "$$this.food"}, {"$map": {"input": "$$value", "as": "v", "in": {"$toLower": "$$v.food"}}}]},
+            {"$map": {
+                "input": "$$value",
+                "as": "v",
+                "in": {"$cond": [
+                    {"$eq": [{"$toLower": "$$v.food"}, {"$toLower": "$$this.food"}]},
+                    _add_item_fields("$$v", "$$this"),
+                    "$$v"
+                ]}
+            }},
+            {"$concatArrays": ["$$value", ["$$this"]]}
+        ]}
+    }}
+
+def _merge_meal_expr(new_items):
+    if new_items:
+        updated_existing = {"$map": {
+            "input": "$$existing",
+            "as": "it",
+            "in": {"$switch": {
+                "branches": [
+                    {
+                        "case": {"$eq": [{"$toLower": "$$it.food"}, {"$literal": it["food"].lower()}]},
+                        "then": {"$mergeObjects": ["$$it", {
+                            f: {"$add": [{"$ifNull": [f"$$it.{f}", 0]}, {"$literal": it.get(f, 0)}]}
+                            for f in ITEM_SUM_FIELDS
+                        }]}
+                    }
+                    for it in new_items
+                ],
+                "default": "$$it"
+            }}
+        }}
+    else:
+        updated_existing = "$$existing"
+    appended = {"$filter": {
+        "input": {"$literal": new_items},
+        "as": "n",
+        "cond": {"$not": [{"$in": [
+            {"$toLower": "$$n.food"},
+            {"$map": {"input": "$$existing", "as": "e", "in": {"$toLower": "$$e.food"}}}
+        ]}]}
+    }}
+    return {"$let": {
+        "vars": {"existing": _collapse_items_expr({"$ifNull": ["$$m.items", []]})},
+        "in": {"$let": {
+            "vars": {"items": {"$concatArrays": [updated_existing, appended]}},
+            "in": {"$mergeObjects": ["$$m", {
+                "items": "$$items",
+                "meal_summary": _summary_expr("$$items", SUMMARY_FIELDS)
+            }]}
+        }}
+    }}
+
+def build_diet_merge_pipeline(incoming_meals):
+    # Merges the incoming items into plan_data and recomputes meal/day totals
+    # server-side, so concurrent logs for the same user/day cannot overwrite
+    # each other and the document is not shipped back and forth.
+    incoming = merge_incoming_meals(incoming_meals)
+    now = datetime.datetime.utcnow()
+    existing_meals = {"$ifNull": ["$plan_data", []]}
+    new_meals = [
+        {"meal_type": meal_type, "items": items, "meal_summary": compute_totals_from_items(items)}
+        for meal_type, items in incoming.items()
+    ]
+    merged_plan = {"$concatArrays": [
+        {"$map": {
+            "input": existing_meals,
+            "as": "m",
+            "in": {"$switch": {
+                "branches": [
+                    {"case": {"$eq": ["$$m.meal_type", {"$literal": meal_type}]}, "then": _merge_meal_expr(items)}
+                    for meal_type, items in incoming.items()
+                ],
+                "default": "$$m"
+            }} if incoming else "$$m"
+        }},
+        {"$filter": {
+            "input": {"$literal": new_meals},
+            "as": "nm",
+            "cond": {"$not": [{"$in": [
+                "$$nm.meal_type",
+                {"$map": {"input": existing_meals, "as": "e", "in": "$$e.meal_type"}}
+            ]}]}
+        }}
+    ]}
+    return [
+        {"$set": {
+            "plan_data": merged_plan,
+            "created_at": {"$ifNull": ["$created_at", now]}
+        }},
+        {"$set": {
+            "summary": {"$mergeObjects": [
+                _summary_expr("$plan_data.meal_summary", {t: t for t in SUMMARY_FIELDS}),
+                {"created_at": now.isoformat()}
+            ]}
+        }}
+    ]
+
+def calculate_calories(calories_payload: Dict[str, Any]) -> Tuple[Optional[List[Dict[str, Any]]], List[Dict[str, Any]]]:
     if "user_id" not in calories_payload:
         raise ValueError("calories_payload must include 'user_id'")
     if calories_col is None:
@@ -58,149 +193,34 @@ def calculate_calories(calories_payload: Dict[str, Any]) -> Dict[str, Any]:
     date=calories_payload.get("date")
     calorie_data = estimate_calories(text)
     calorie_data = enrich_with_macros(calorie_data)
+    unresolved = calorie_data.get("unresolved_items", [])
+    if unresolved:
+        print(f"⚠️ Not logged for {user_id}, macros unavailable: {[u['food'] for u in unresolved]}")
     try:
         today_str = date
         incoming_meals = calorie_data.get("meals", [])
         if not incoming_meals:
             print("⚠️ No meals provided.")
-            return None
-
-        doc = calories_col.find_one({"user_id": user_id, "date": today_str})
-
-        if not doc:
-            plan_data = []
-            for meal in incoming_meals:
-                items = meal.get("items", []) or []
-                meal_summary = compute_totals_from_items(items)
-                plan_data.append({
-                    "meal_type": meal.get("meal_type"),
-                    "items": items,
-                    "meal_summary": meal_summary
-                })
+            return None, unresolved
 
-            overall = {
-                "total_calories": 0.0,
-                "total_protein": 0.0,
-                "total_fat": 0.0,
-                "total_carb": 0.0,
-                "total_fiber": 0.0,
-                "created_at": datetime.datetime.utcnow().isoformat()
-            }
-            for m in plan_data:
-                ms = m["meal_summary"]
-                overall["total_calories"] += ms.get("total_calories", 0)
-                overall["total_protein"]  += ms.get("total_protein", 0)
-                overall["total_fat"]      += ms.get("total_fat", 0)
-                overall["total_carb"]     += ms.get("total_carb", 0)
-                overall["total_fiber"]    += ms.get("total_fiber", 0)
-            for k in ["total_calories","total_protein","total_fat","total_carb","total_fiber"]:
-                overall[k] = round(overall[k], 2)
-
-            new_doc = {
-                "user_id": user_id,
-                "date": today_str,
-                "plan_data": plan_data,
-                "summary": overall,
-                "created_at": datetime.datetime.utcnow()
-            }
-            result = calories_col.insert_one(new_doc)
-            print(f"🆕 Created new daily plan for {user_id} on {today_str} (id={result.inserted_id})")
-        else:
-            plan_data = doc.get("plan_data", [])[:] 
-            idx_map = {m["meal_type"]: i for i, m in enumerate(plan_data) if "meal_type" in m}
-
-            for meal in incoming_meals:
-                meal_type = meal.get("meal_type")
-                if not meal_type:
-                    continue
-                new_items = meal.get("items", []) or []
-
-                if meal_type in idx_map:
-                    i = idx_map[meal_type]
-                    existing_meal = plan_data[i]
-                    existing_items = existing_meal.get("items", []) or []
-                    existing_items = existing_meal.get("items", []) or []
-                    merged = {}
-
-                    for it in existing_items:
-                        key = it["food"].lower()
-                        if key not in merged:
-                            merged[key] = it.copy()
-                        else:
-                            merged[key]["quantity"] += it.get("quantity", 0)
-                            merged[key]["weight"] += it.get("weight", 0)
-                            merged[key]["calories"] += it.get("calories", 0)
-                            merged[key]["proteins"] += it.get("proteins", 0)
-                            merged[key]["fats"] += it.get("fats", 0)
-                            merged[key]["carbs"] += it.get("carbs", 0)
-                            merged[key]["fiber"] += it.get("fiber", 0)
-
-                    for it in new_items:
-                        key = it["food"].lower()
-                        if key not in merged:
-                            merged[key] = it.copy()
-                        else:
-                            merged[key]["quantity"] += it.get("quantity", 0)
-                            merged[key]["weight"] += it.get("weight", 0)
-                            merged[key]["calories"] += it.get("calories", 0)
-                            merged[key]["proteins"] += it.get("proteins", 0)
-                            merged[key]["fats"] += it.get("fats", 0)
-                            merged[key]["carbs"] += it.get("carbs", 0)
-                            merged[key]["fiber"] += it.get("fiber", 0)
-
-                    final_items = list(merged.values())
-                    existing_meal["items"] = final_items
-                    existing_meal["meal_summary"] = compute_totals_from_items(final_items)
-
-                    plan_data[i] = existing_meal
-                else:
-                    meal_entry = {
-                        "meal_type": meal_type,
-                        "items": new_items,
-                        "meal_summary": compute_totals_from_items(new_items)
-                    }
-                    plan_data.append(meal_entry)
-                    idx_map[meal_type] = len(plan_data) - 1
-
-            overall = {
-                "total_calories": 0.0,
-                "total_protein": 0.0,
-                "total_fat": 0.0,
-                "total_carb": 0.0,
-                "total_fiber": 0.0,
-                "created_at": datetime.datetime.utcnow().isoformat()
-            }
-            for m in plan_data:
-                ms = m.get("meal_summary", {})
-                overall["total_calories"] += ms.get("total_calories", 0)
-                overall["total_protein"]  += ms.get("total_protein", 0)
-                overall["total_fat"]      += ms.get("total_fat", 0)
-                overall["total_carb"]     += ms.get("total_carb", 0)
-                overall["total_fiber"]    += ms.get("total_fiber", 0)
-            for k in ["total_calories","total_protein","total_fat","total_carb","total_fiber"]:
-                overall[k] = round(overall[k], 2)
-
-            calories_col.update_one(
-                {"user_id": user_id, "date": today_str},
-                {
-                    "$set": {
-                        "plan_data": plan_data,
-                        "summary": overall
-                    }
-                }
-            )
-            print(f"🔁 Merged updates into existing daily plan for {user_id} on {today_str}")
+        pipeline = build_diet_merge_pipeline(incoming_meals)
+        latest_doc = calories_col.find_one_and_update(
+            {"user_id": user_id, "date": today_str},
+            pipeline,
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        plan_data = latest_doc.get("plan_data", []) if latest_doc else []
+        print(f"🔁 Merged updates into daily plan for {user_id} on {today_str}")
 
-        latest_doc = calories_col.find_one({"user_id": user_id, "date": today_str})
         latest_summary = latest_doc.get("summary", {}) if latest_doc else {}
-        handle_summary_trigger(user_id, latest_summary, today_str)
-        update_daily_progress(user_id, today_str)
+        enqueue_post_write(user_id, today_str, diet_summary=latest_summary)
 
-        return plan_data
+        return plan_data, unresolved
 
     except Exception as e:
         print(f"❌ Error inserting/updating calorie plan: {e}")
-        return None
+        return None, unresolved
 def view_calories(user_id: str, date: str) -> Dict[str, Any]:
     if not user_id:
         raise ValueError("user_id is required")
@@ -281,8 +301,5 @@ def delete_food(data):
         {"user_id": data.user_id, "date": data.date},
         {"$set": {"plan_data": plan_data, "summary": full_day}}
     )
-    latest_doc = calories_col.find_one({"user_id": data.user_id, "date": data.date})
-    latest_summary = latest_doc.get("summary", {}) if latest_doc else {}
-    handle_summary_trigger(data.user_id, latest_summary, data.date)
-    update_daily_progress(data.user_id, data.date)
+    enqueue_post_write(data.user_id, data.date, diet_summary=full_day)
     return {"status": "success", "message": "Food deleted"}
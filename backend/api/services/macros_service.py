@@ -12,19 +12,6 @@ try:
 except Exception:
     macro_collection = None
 
-if macro_collection is None:
-    try:
-        from pymongo import MongoClient
-        MONGO_URI = os.getenv("MONGO_URI")
-        if MONGO_URI:
-            client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
-            DB_NAME = os.getenv("DB_NAME")
-            db_from_uri =client[DB_NAME]
-            macro_collection = db_from_uri["macro_plans"]
-            print("Using macro_collection from direct MongoDB connection")
-    except Exception:
-        macro_collection = None
-
 def generate_and_upsert_macro(user_payload: Dict[str, Any]) -> Dict[str, Any]:
 
     if "user_id" not in user_payload:
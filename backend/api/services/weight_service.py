@@ -1,4 +1,4 @@
-from tracker.progress_tracker import update_daily_progress
+from trigger.post_write import enqueue_post_write
 import os
 
 weight_col=None
@@ -8,18 +8,6 @@ try:
     print("weight_col is loaded from mongodb")
 except Exception:
     weight_col=None
-if weight_col is None:
-    try:
-        from pymongo import MongoClient
-        MONGO_URI = os.getenv("MONGO_URI")
-        if MONGO_URI:
-            client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
-            DB_NAME = os.getenv("DB_NAME")
-            db_from_uri =client[DB_NAME]
-            weight_col = db_from_uri["weights"]
-            print("Using weight_col from direct MongoDB connection")
-    except Exception:
-        weight_col = None
 
 def weight_save(weight_data):
     user_id_check = weight_data.get("user_id") if isinstance(weight_data, dict) else (hasattr(weight_data, "user_id") and weight_data.user_id)
@@ -45,7 +33,7 @@ def weight_save(weight_data):
         else:
             weight_col.update_one({"user_id":user_id,"date":today_date},
                                    {"$set": {"weight": weight}})
-        update_daily_progress(user_id,today_date)
+        enqueue_post_write(user_id, today_date)
         return {"status": "success", "message": "Weight saved successfully."}
     except Exception as e:
         print(f"❌ Error inserting/updating workout plan: {e}")
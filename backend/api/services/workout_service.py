@@ -1,46 +1,18 @@
 import os
 from typing import Dict, Any
 from tracker.Workout_tracker import generate_workout_summary
-from trigger.workout_trigger import handle_wo_summary_trigger
-from tracker.progress_tracker import update_daily_progress
+from trigger.post_write import enqueue_post_write
 import datetime
 workout_col = None
+workout_plan_col = None
 try:
     from db_connection import db as _db
     workout_col = _db['workouts_logs']
+    workout_plan_col = _db['workout_plan']
     print("Using workout_col from db_connection module")
 except Exception:
     workout_col = None
-if workout_col is None:
-    try:
-        from pymongo import MongoClient
-        MONGO_URI = os.getenv("MONGO_URI")
-        if MONGO_URI:
-            client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
-            db_from_uri = client.get_default_database() or client["mydb"]
-            workout_col = db_from_uri["workouts_logs"]
-            print("Using workout_col from direct MongoDB connection")
-    except Exception:
-        workout_col = None
-workout_plan_col = None
-try:
-    from db_connection import db as _db
-    workout_plan_col = _db['workout_plan']
-    print("Using workout_plan_col from db_connection module")
-except Exception:
     workout_plan_col = None
-if workout_plan_col is None:
-    try:
-        from pymongo import MongoClient
-        MONGO_URI = os.getenv("MONGO_URI")
-        if MONGO_URI:
-            client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
-            DB_NAME = os.getenv("DB_NAME")
-            db_from_uri = client[DB_NAME]
-            workout_plan_col = db_from_uri["workout_plan"]
-            print("Using workout_plan_col from direct MongoDB connection")
-    except Exception:
-        workout_plan_col = None
 def compute_workout_summary(exercises):
     summary = {
         "total_exercises": len(exercises),
@@ -187,8 +159,7 @@ def calculate_workout(workout_payload: Dict[str, Any]) -> Dict[str, Any]:
 
         latest_doc = workout_col.find_one({"user_id": user_id, "date": today_str})
         latest_summary = latest_doc.get("summary", {}) if latest_doc else {}
-        handle_wo_summary_trigger(user_id, latest_summary,today_str)
-        update_daily_progress(user_id,today_str)
+        enqueue_post_write(user_id, today_str, workout_summary=latest_summary)
 
         return existing_data
 
@@ -453,8 +424,7 @@ def save_plan_and_daily(user_id: str, date: str, plan_name: str, frontend_exerci
             upsert=True
         )
 
-        handle_wo_summary_trigger(user_id, summary, date)
-        update_daily_progress(user_id, date)
+        enqueue_post_write(user_id, date, workout_summary=summary)
 
         return {"status": "success", "message": "Plan and daily workout updated.", "workout_data": workout_data_for_day, "summary": summary}
 
@@ -495,10 +465,7 @@ def delete_set(data):
                 {"$set": {"workout_data": workouts,"summary": summary}}
             )
 
-            latest_doc = workout_col.find_one({"user_id": data.user_id, "date": data.date})
-            latest_summary = latest_doc.get("summary", {}) if latest_doc else {}
-            handle_wo_summary_trigger(data.user_id, latest_summary,data.date)
-            update_daily_progress(data.user_id,data.date)
+            enqueue_post_write(data.user_id, data.date, workout_summary=summary)
             return {"status": "success", "message": "Set deleted"}
 
     return {"status": "error", "message": "Exercise not found"}
@@ -533,8 +500,5 @@ def edit_set(data):
         {"user_id": data.user_id, "date": data.date},
         {"$set": {"workout_data": workouts,"summary": summary}}
     )
-    latest_doc = workout_col.find_one({"user_id": data.user_id, "date": data.date})
-    latest_summary = latest_doc.get("summary", {}) if latest_doc else {}
-    handle_wo_summary_trigger(data.user_id, latest_summary,data.date)
-    update_daily_progress(data.user_id,data.date)
+    enqueue_post_write(data.user_id, data.date, workout_summary=summary)
     return {"status": "success", "message": "Exercise updated"}
@@ -11,8 +11,11 @@ from api.routes.query_route import router as query_router
 from api.routes.user_route import router as user_router
 from api.routes.weight_route import router as weight_router
 from api.routes.food_sug_route import router as food_sug_router
-from db_connection import user_data
+from db_connection import user_data, mongo_pool_stats
 from auth import hash_password, verify_password, create_access_token
+from trigger.post_write import post_write_queue
+from clients import warm_up
+from db_indexes import ensure_indexes_in_background
 
 app = FastAPI()
 origins = [
@@ -60,6 +63,17 @@ def login(user: UserLogin= Body(...)):
     user_id=db_user['user_id']
     token = create_access_token({"sub": user.email,"user_id":user_id})
     return {"token": token,"user_id": user_id,"name":db_user["name"]}
+@app.on_event("startup")
+def warm_clients():
+    warm_up()
+    ensure_indexes_in_background()
+@app.on_event("shutdown")
+def drain_post_write_jobs():
+    if not post_write_queue.drain(timeout=10):
+        print("⚠️ Shutting down with post-write jobs still pending")
+@app.get("/health/pools")
+def pool_stats():
+    return {"mongo": mongo_pool_stats()}
 @app.get("/dashboard")
 def dashboard(user = Depends(get_current_user)):
     return {
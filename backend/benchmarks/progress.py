@@ -0,0 +1,84 @@
+import os
+import sys
+import time
+import argparse
+import statistics
+import threading
+from pymongo import monitoring
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+class CommandCounter(monitoring.CommandListener):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def started(self, event):
+        with self._lock:
+            self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+# Must be registered before db_connection builds the shared client.
+counter = CommandCounter()
+monitoring.register(counter)
+
+from tracker import progress_tracker as pt  # noqa: E402
+
+
+def legacy_update_daily_progress(user_id: str, date_str: str):
+    # The pre-consolidation path: one lookup per input, then the upsert.
+    existing = pt.progress_col.find_one({"user_id": user_id, "date": date_str})
+    if existing:
+        expected = existing["expected"]
+        week_number = existing.get("week_number", 0)
+        goal = existing.get("goal", "unspecified")
+    else:
+        plan = pt.macro_collection.find_one({"user_id": user_id}, sort=[("start_date", pt.ASCENDING)])
+        if not plan:
+            raise ValueError("No plan or progress doc found for user/date")
+        expected = pt.expected_from_plan(plan)
+        week_number = 0
+        goal = plan.get("goal", "unspecified")
+    cal_and_macros = pt.fetch_daily_calories_and_macros(user_id, date_str)
+    achieved = {
+        "calories": cal_and_macros["calories"],
+        "macros": cal_and_macros["macros"],
+        "workout_intensity": pt.compute_workout_intensity_for_day(user_id, date_str),
+        "weight_kg": pt.fetch_weight_for_date(user_id, date_str),
+    }
+    return pt.create_or_update_progress_doc(user_id, date_str, expected, achieved, week_number, goal)
+
+
+def measure(label: str, func, user_id: str, date_str: str, repeats: int):
+    times = []
+    commands = []
+    for _ in range(repeats):
+        before = counter.count
+        start = time.perf_counter()
+        func(user_id, date_str)
+        times.append((time.perf_counter() - start) * 1000)
+        commands.append(counter.count - before)
+    times.sort()
+    p95 = times[min(len(times) - 1, int(len(times) * 0.95))]
+    print(f"{label:>8}: median={statistics.median(times):.2f}ms p95={p95:.2f}ms commands/call={statistics.mean(commands):.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare per-call latency and Mongo command count of update_daily_progress.")
+    parser.add_argument("user_id")
+    parser.add_argument("date", help="YYYY-MM-DD with an existing progress doc or macro plan")
+    parser.add_argument("--repeats", type=int, default=50)
+    args = parser.parse_args()
+
+    # Warm the pool so connection setup is not billed to either variant.
+    pt.update_daily_progress(args.user_id, args.date)
+    measure("before", legacy_update_daily_progress, args.user_id, args.date, args.repeats)
+    measure("after", pt.update_daily_progress, args.user_id, args.date, args.repeats)
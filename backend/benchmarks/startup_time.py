@@ -0,0 +1,43 @@
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ["faiss", "fastembed", "openai", "google.genai"]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import be_main
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "loaded": [m for m in %r if m in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+
+def measure_once() -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def run(repeats: int):
+    samples = [measure_once() for _ in range(repeats)]
+    times = [s["seconds"] for s in samples]
+    print(f"import be_main over {repeats} fresh interpreters:")
+    print(f"  median={statistics.median(times):.3f}s min={min(times):.3f}s max={max(times):.3f}s")
+    print(f"  heavy modules loaded at import: {samples[-1]['loaded'] or 'none'}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure cold import time of the FastAPI app.")
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+    run(args.repeats)
@@ -0,0 +1,197 @@
+import os
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from bson import json_util
+from pymongo.errors import OperationFailure
+import db_connection as dbc
+import db_etl
+import duckdb_etl
+from food_etl import get_week_key
+
+CDC_COLLECTIONS = ["diet_logs", "workouts_logs", "progress"]
+CDC_BATCH_SIZE = int(os.getenv("CDC_BATCH_SIZE", "500"))
+CDC_BATCH_SECONDS = float(os.getenv("CDC_BATCH_SECONDS", "2"))
+CDC_RESUME_TOKEN_PATH = os.getenv("CDC_RESUME_TOKEN_PATH", "cdc_resume_token.json")
+
+CHANGE_STREAM_HISTORY_LOST = 286
+
+# Collection -> warehouse table holding its rows, for the weekly_summary sources.
+WAREHOUSE_TABLES = {
+    "diet_logs": "foods",
+    "workouts_logs": "workouts",
+}
+
+
+def load_checkpoint(path: str = CDC_RESUME_TOKEN_PATH) -> Tuple[Optional[Dict[str, Any]], Set[Tuple[str, str, str]]]:
+    # Resume token plus the (collection, user_id, week) rebuilds that failed
+    # since, which are retried with every batch until they go through.
+    if not os.path.exists(path):
+        return None, set()
+    with open(path) as f:
+        checkpoint = json_util.loads(f.read())
+    return checkpoint.get("resume_token"), {tuple(w) for w in checkpoint.get("failed_weeks", [])}
+
+
+def save_checkpoint(token: Optional[Dict[str, Any]], failed_weeks: Iterable[Tuple[str, str, str]], path: str = CDC_RESUME_TOKEN_PATH):
+    if token is None:
+        return
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        f.write(json_util.dumps({"resume_token": token, "failed_weeks": sorted(failed_weeks)}))
+    os.replace(tmp, path)
+
+
+def open_change_stream(resume_token: Optional[Dict[str, Any]] = None):
+    # One database-level stream for all three collections, so a single resume
+    # token covers them. updateLookup ships the current doc with every update.
+    return dbc.db.watch(
+        [{"$match": {"ns.coll": {"$in": CDC_COLLECTIONS}}}],
+        full_document="updateLookup",
+        resume_after=resume_token,
+        max_await_time_ms=int(CDC_BATCH_SECONDS * 1000),
+    )
+
+
+def warehouse_days(table: str, doc_ids: List[str]) -> Set[Tuple[str, str]]:
+    # (user_id, date) the warehouse currently holds for these docs. Read before
+    # the merge, it recovers the old date of deleted or re-dated docs, which
+    # change events without pre-images do not carry.
+    if not doc_ids:
+        return set()
+    rows = duckdb_etl.con.execute(
+        f"SELECT DISTINCT user_id, strftime(date, '%Y-%m-%d') FROM {table} WHERE source_doc_id IN (SELECT unnest(?))",
+        [doc_ids],
+    ).fetchall()
+    return {(user_id, day) for user_id, day in rows if user_id and day}
+
+
+def collapse_changes(changes: List[Dict[str, Any]]):
+    # Last event per doc wins: a doc updated five times in one micro-batch is
+    # merged once, and one deleted after its insert is just a delete.
+    latest: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for change in changes:
+        coll = change.get("ns", {}).get("coll")
+        if coll not in CDC_COLLECTIONS or "documentKey" not in change:
+            continue
+        latest[(coll, str(change["documentKey"]["_id"]))] = change
+
+    upserts: Dict[str, List[Dict[str, Any]]] = {}
+    deletes: Dict[str, List[str]] = {}
+    for (coll, doc_id), change in latest.items():
+        doc = change.get("fullDocument")
+        if change["operationType"] == "delete" or doc is None:
+            # An update whose doc was deleted before the lookup is a delete too.
+            deletes.setdefault(coll, []).append(doc_id)
+        else:
+            upserts.setdefault(coll, []).append(doc)
+    return upserts, deletes
+
+
+def apply_changes(changes: List[Dict[str, Any]], retry_weeks: Iterable[Tuple[str, str, str]] = ()) -> Dict[str, Any]:
+    upserts, deletes = collapse_changes(changes)
+
+    weeks: Set[Tuple[str, str, str]] = set()
+    for coll, table in WAREHOUSE_TABLES.items():
+        doc_ids = [str(d["_id"]) for d in upserts.get(coll, [])] + deletes.get(coll, [])
+        days = warehouse_days(table, doc_ids)
+        days |= {(d.get("user_id"), d.get("date")) for d in upserts.get(coll, []) if d.get("user_id") and d.get("date")}
+        weeks |= {(coll, user_id, get_week_key(day)[0]) for user_id, day in days}
+
+    duckdb_etl.apply_doc_changes(upserts, deletes)
+
+    weeks |= set(retry_weeks)
+    failed = db_etl.rebuild_weekly_summaries(weeks)
+
+    return {
+        "changes": len(changes),
+        "upserts": sum(len(v) for v in upserts.values()),
+        "deletes": sum(len(v) for v in deletes.values()),
+        "weeks": len(weeks),
+        "failed_weeks": failed,
+    }
+
+
+def catch_up() -> List[Tuple[str, str, str]]:
+    # Brings the warehouse and weekly_summary up to date by watermark (a full
+    # sync on a fresh warehouse). Deletes are invisible to a watermark, so
+    # ones made while nothing was tailing stay until the next full sync.
+    since = duckdb_etl.get_last_etl_run()
+    duckdb_etl.etl_incremental()
+    return db_etl.rebuild_weekly_summaries(db_etl.weeks_changed_since(since))
+
+
+def run_cdc(
+    stream_factory: Callable[[Optional[Dict[str, Any]]], Any] = open_change_stream,
+    batch_size: int = CDC_BATCH_SIZE,
+    batch_seconds: float = CDC_BATCH_SECONDS,
+    token_path: str = CDC_RESUME_TOKEN_PATH,
+) -> Dict[str, int]:
+    # Tails the stream and applies changes in micro-batches of batch_size
+    # events or batch_seconds, whichever comes first. The checkpoint is saved
+    # only after a batch is applied, so a crash replays at most one batch.
+    duckdb_etl.init_schema()
+    token, failed_weeks = load_checkpoint(token_path)
+    stream = None
+    resumed = False
+    if token is not None:
+        try:
+            stream = stream_factory(token)
+            resumed = True
+        except OperationFailure as e:
+            if e.code != CHANGE_STREAM_HISTORY_LOST:
+                raise
+            print(f"⚠️ Resume token expired, catching up by watermark: {e}")
+
+    if stream is None:
+        # No usable checkpoint. The stream is opened before the catch-up so
+        # every write made while it runs is still tailed afterwards; docs both
+        # paths see are merged and rebuilt twice, which is harmless.
+        stream = stream_factory(None)
+        failed_weeks |= set(catch_up())
+        save_checkpoint(stream.resume_token, failed_weeks, token_path)
+
+    print(f"CDC ETL started ({'resuming' if resumed else 'caught up, tailing from now'}), batch={batch_size} events / {batch_seconds}s")
+    totals = {"batches": 0, "changes": 0}
+    batch: List[Dict[str, Any]] = []
+    batch_started = time.monotonic()
+
+    def flush():
+        nonlocal batch, failed_weeks
+        t0 = time.perf_counter()
+        result = apply_changes(batch, failed_weeks)
+        failed_weeks = set(result["failed_weeks"])
+        save_checkpoint(stream.resume_token, failed_weeks, token_path)
+        totals["batches"] += 1
+        totals["changes"] += len(batch)
+        print(
+            f"CDC batch: {result['changes']} events, {result['upserts']} upserts, {result['deletes']} deletes, "
+            f"{result['weeks']} weekly summaries, weeks_failed={len(failed_weeks)} in {time.perf_counter() - t0:.2f}s"
+        )
+        batch = []
+
+    try:
+        while stream.alive:
+            change = stream.try_next()
+            if change is not None:
+                if not batch:
+                    batch_started = time.monotonic()
+                batch.append(change)
+            if batch and (len(batch) >= batch_size or time.monotonic() - batch_started >= batch_seconds):
+                flush()
+            elif change is None and not batch:
+                # Idle: keep the checkpoint moving with the stream's
+                # post-batch token so a restart does not rescan quiet oplog.
+                save_checkpoint(stream.resume_token, failed_weeks, token_path)
+        if batch:
+            flush()
+    except KeyboardInterrupt:
+        if batch:
+            flush()
+        print("CDC ETL stopped")
+    finally:
+        stream.close()
+    return totals
+
+
+if __name__ == "__main__":
+    run_cdc()
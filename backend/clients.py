@@ -0,0 +1,67 @@
+import os
+import threading
+from functools import lru_cache
+from typing import Optional
+from dotenv import load_dotenv
+load_dotenv()
+
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+EXTRA_HEADERS = {
+    "HTTP-Referer": os.environ.get("SITE_URL", "http://localhost"),
+    "X-Title": os.environ.get("SITE_NAME", "Query Orchestrator")
+}
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "")
+
+
+@lru_cache(maxsize=None)
+def get_gemini_client(api_key_env: Optional[str] = None):
+    from google import genai
+    try:
+        if api_key_env:
+            return genai.Client(api_key=os.getenv(api_key_env))
+        return genai.Client()
+    except Exception as e:
+        print(f"Error initializing Gemini client: {e}")
+        return None
+
+
+@lru_cache(maxsize=None)
+def get_openrouter_client():
+    from openai import OpenAI
+    return OpenAI(
+        api_key=os.environ.get("DEEPSEEK_API_KEY"),
+        base_url=OPENROUTER_BASE_URL
+    )
+
+
+def _warm(targets):
+    for name in targets:
+        try:
+            if name == "gemini":
+                for key in (None, "CALORIES_GEMINI_KEY", "WORKOUT_GEMINI_KEY"):
+                    get_gemini_client(key)
+            elif name == "openrouter":
+                get_openrouter_client()
+            elif name == "kb":
+                from Fitness_kb.fitness_coach import get_embedding_model, get_faiss_index, get_kb_map
+                get_faiss_index()
+                get_kb_map()
+                get_embedding_model()
+            print(f"Warmed up {name}")
+        except Exception as e:
+            print(f"⚠️ Warm-up of {name} failed: {e}")
+
+
+def warm_up(targets: str = WARMUP_ON_STARTUP, background: bool = True):
+    # targets is a comma separated subset of "gemini,openrouter,kb" (or "all").
+    names = [t.strip() for t in (targets or "").split(",") if t.strip()]
+    if "all" in names:
+        names = ["gemini", "openrouter", "kb"]
+    if not names:
+        return None
+    if not background:
+        _warm(names)
+        return None
+    thread = threading.Thread(target=_warm, args=(names,), name="client-warmup", daemon=True)
+    thread.start()
+    return thread
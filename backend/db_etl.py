@@ -1,44 +1,84 @@
 import os
 import json
 import time
-from datetime import datetime, timedelta
-from typing import List, Dict, Any
+from datetime import date, datetime, timedelta
+from typing import List, Dict, Any, Optional, Set, Tuple
 import pandas as pd
 import duckdb
-from pymongo import MongoClient
-from workout_etl import upsert_weekly_workout_summary
-from food_etl import upsert_weekly_food_summary
+from workout_etl import build_weekly_workout_summary
+from food_etl import build_weekly_food_summary, get_week_key
 from dotenv import load_dotenv
 load_dotenv()
-try:
-    MONGO_URI = os.environ.get("MONGO_URI")
-    DB_NAME = os.environ.get("DB_NAME")
-    client = MongoClient(MONGO_URI)
-    mongo_db = client[DB_NAME]
-    diet_col = mongo_db["diet_logs"]
-    workout_col = mongo_db["workouts_logs"]
-except Exception:
-    import db_connection as dbc
-    mongo_db = dbc.db
-    diet_col = getattr(dbc, "diet_col", mongo_db["diet_logs"])
-    workout_col = getattr(dbc, "workout_col", mongo_db["workouts_logs"])
+import db_connection as dbc
+mongo_db = dbc.db
+diet_col = dbc.diet_col
+workout_col = dbc.workout_col
+
+# Collection -> weekly_summary field it feeds and the builder for that field.
+WEEKLY_SUMMARY_FIELDS = {
+    "diet_logs": ("nutrition_summary", build_weekly_food_summary),
+    "workouts_logs": ("workout_summary", build_weekly_workout_summary),
+}
+
+
+def week_bounds(week_key: str) -> Tuple[str, str]:
+    year, week = week_key.split("-W")
+    start = date.fromisocalendar(int(year), int(week), 1)
+    return start.isoformat(), (start + timedelta(days=6)).isoformat()
+
+
+def rebuild_weekly_summary(db, coll: str, user_id: str, week_key: str):
+    # Recomputed from every doc of the week rather than $inc'ed per doc, so
+    # the nightly run, the CDC stream and any replay of either can touch the
+    # same week without double counting.
+    field, build = WEEKLY_SUMMARY_FIELDS[coll]
+    start, end = week_bounds(week_key)
+    docs = list(db[coll].find({"user_id": user_id, "date": {"$gte": start, "$lte": end}}))
+    key = {"user_id": user_id, "week": week_key}
+    if not docs:
+        db.weekly_summary.update_one(key, {"$unset": {field: ""}})
+        return
+    db.weekly_summary.update_one(
+        key,
+        {
+            "$set": {field: build(docs)},
+            "$setOnInsert": {"start_date": min(d["date"] for d in docs)},
+        },
+        upsert=True,
+    )
+
+
+def weeks_changed_since(since: Optional[datetime]) -> Set[Tuple[str, str, str]]:
+    # (collection, user_id, week) of every doc written since the watermark,
+    # same filters as duckdb_etl.etl_incremental; all weeks when there is none.
+    queries = {
+        "diet_logs": {"summary.created_at": {"$gte": since.isoformat()}} if since else {},
+        "workouts_logs": {"created_at": {"$gte": since}} if since else {},
+    }
+    weeks = set()
+    for coll, query in queries.items():
+        for doc in mongo_db[coll].find(query, {"user_id": 1, "date": 1}):
+            if doc.get("user_id") and doc.get("date"):
+                weeks.add((coll, doc["user_id"], get_week_key(doc["date"])[0]))
+    return weeks
+
+
+def rebuild_weekly_summaries(weeks) -> List[Tuple[str, str, str]]:
+    failed = []
+    for coll, user_id, week_key in sorted(weeks):
+        try:
+            rebuild_weekly_summary(mongo_db, coll, user_id, week_key)
+        except Exception as e:
+            failed.append((coll, user_id, week_key))
+            print(f"⚠️ Failed to rebuild weekly summary {coll} {user_id} {week_key}: {e}")
+    return failed
+
 
 def start_etl():
-    today=datetime.utcnow().date()-timedelta(days=1)
-    diet_docs = list(
-            diet_col.find({
-                "summary.created_at": {"$gte":today.strftime("%Y-%m-%d")}
-            })
-        )
-    workout_docs = list(
-            workout_col.find({
-                "created_at": {"$gte": today.strftime("%Y-%m-%d")}
-            })
-        )
-    for doc in diet_docs:
-        upsert_weekly_food_summary(mongo_db, doc)
-    for doc in workout_docs:
-        upsert_weekly_workout_summary(mongo_db, doc)    
-    return 
+    yesterday = datetime.combine(datetime.utcnow().date() - timedelta(days=1), datetime.min.time())
+    weeks = weeks_changed_since(yesterday)
+    failed = rebuild_weekly_summaries(weeks)
+    print(f"Weekly summaries rebuilt: {len(weeks) - len(failed)} ok, {len(failed)} failed")
+    return failed
 if __name__ == "__main__":
-    start_etl()
\ No newline at end of file
+    start_etl()
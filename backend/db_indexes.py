@@ -0,0 +1,145 @@
+import os
+import sys
+import json
+import threading
+from typing import Any, Dict, List, Optional
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+from db_connection import db
+
+ENSURE_INDEXES_ON_STARTUP = os.getenv("ENSURE_INDEXES_ON_STARTUP", "1") == "1"
+
+DUPLICATE_KEY = 11000
+INDEX_CONFLICT_CODES = {85, 86}  # IndexOptionsConflict, IndexKeySpecsConflict
+
+# collection -> list of index specs. Names are fixed so re-running is a no-op
+# and the report can tell our indexes apart from ones created by hand.
+INDEXES: Dict[str, List[Dict[str, Any]]] = {
+    "diet_logs": [
+        {"keys": [("user_id", ASCENDING), ("date", ASCENDING)], "name": "user_date_unique", "unique": True},
+    ],
+    "workouts_logs": [
+        {"keys": [("user_id", ASCENDING), ("date", ASCENDING)], "name": "user_date_unique", "unique": True},
+    ],
+    "diet_summary": [
+        {"keys": [("user_id", ASCENDING), ("date", ASCENDING)], "name": "user_date_unique", "unique": True},
+    ],
+    "workout_summary": [
+        {"keys": [("user_id", ASCENDING), ("date", ASCENDING)], "name": "user_date_unique", "unique": True},
+    ],
+    "progress": [
+        {"keys": [("user_id", ASCENDING), ("date", ASCENDING)], "name": "user_date_unique", "unique": True},
+        {"keys": [("updated_at", ASCENDING)], "name": "updated_at"},
+    ],
+    "weights": [
+        {"keys": [("user_id", ASCENDING), ("date", ASCENDING)], "name": "user_date_unique", "unique": True},
+    ],
+    "weekly_summary": [
+        {"keys": [("user_id", ASCENDING), ("week", ASCENDING)], "name": "user_week_unique", "unique": True},
+    ],
+    "weekly_progress": [
+        {"keys": [("user_id", ASCENDING), ("week_number", DESCENDING)], "name": "user_week_number"},
+    ],
+    "user_data": [
+        {"keys": [("email", ASCENDING)], "name": "email_unique", "unique": True},
+    ],
+    "users": [
+        {"keys": [("user_id", ASCENDING)], "name": "user_id"},
+    ],
+    "macro_plans": [
+        {"keys": [("user_id", ASCENDING)], "name": "user_id"},
+        {"keys": [("Weekly_Plan.end_date", ASCENDING)], "name": "weekly_plan_end_date"},
+    ],
+    "workout_plan": [
+        {"keys": [("user_id", ASCENDING)], "name": "user_id"},
+    ],
+}
+
+
+def _index_options(spec: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in spec.items() if k != "keys"}
+
+
+def _duplicate_groups(collection: str, keys) -> int:
+    group_id = {field: f"${field}" for field, _ in keys}
+    pipeline = [
+        {"$group": {"_id": group_id, "n": {"$sum": 1}}},
+        {"$match": {"n": {"$gt": 1}}},
+        {"$count": "groups"},
+    ]
+    result = list(db[collection].aggregate(pipeline, allowDiskUse=True))
+    return result[0]["groups"] if result else 0
+
+
+def ensure_indexes(registry: Optional[Dict[str, List[Dict[str, Any]]]] = None) -> Dict[str, List[str]]:
+    registry = registry or INDEXES
+    result = {"created": [], "failed": []}
+    for collection, specs in registry.items():
+        for spec in specs:
+            label = f"{collection}.{spec['name']}"
+            try:
+                db[collection].create_index(spec["keys"], **_index_options(spec))
+                result["created"].append(label)
+            except OperationFailure as e:
+                if e.code == DUPLICATE_KEY:
+                    groups = _duplicate_groups(collection, spec["keys"])
+                    print(f"⚠️ Cannot create unique index {label}: {groups} duplicate key groups must be merged first")
+                elif e.code in INDEX_CONFLICT_CODES:
+                    print(f"⚠️ Index {label} conflicts with an existing index: {e.details.get('errmsg') if e.details else e}")
+                else:
+                    print(f"❌ Failed to create index {label}: {e}")
+                result["failed"].append(label)
+    print(f"Indexes ensured: {len(result['created'])} ok, {len(result['failed'])} failed")
+    return result
+
+
+def _key_tuple(keys) -> tuple:
+    return tuple((field, int(direction)) for field, direction in keys)
+
+
+def report_indexes(registry: Optional[Dict[str, List[Dict[str, Any]]]] = None) -> Dict[str, Any]:
+    # Missing = declared here but not on the server. Unused = present on the
+    # server with zero accesses since the last mongod restart ($indexStats).
+    registry = registry or INDEXES
+    report = {"missing": [], "unused": []}
+    for collection, specs in registry.items():
+        existing = {
+            _key_tuple(info["key"].items()): name
+            for name, info in db[collection].index_information().items()
+        }
+        for spec in specs:
+            if _key_tuple(spec["keys"]) not in existing:
+                report["missing"].append(f"{collection}.{spec['name']}")
+        try:
+            for stat in db[collection].aggregate([{"$indexStats": {}}]):
+                if stat["name"] != "_id_" and stat.get("accesses", {}).get("ops", 0) == 0:
+                    report["unused"].append(f"{collection}.{stat['name']}")
+        except OperationFailure as e:
+            print(f"⚠️ $indexStats unavailable for {collection}: {e}")
+    return report
+
+
+def ensure_indexes_in_background() -> Optional[threading.Thread]:
+    if not ENSURE_INDEXES_ON_STARTUP:
+        return None
+
+    def _run():
+        try:
+            ensure_indexes()
+        except Exception as e:
+            print(f"⚠️ Index check failed: {e}")
+
+    thread = threading.Thread(target=_run, name="ensure-indexes", daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "ensure"
+    if command == "ensure":
+        ensure_indexes()
+    elif command == "report":
+        print(json.dumps(report_indexes(), indent=2))
+    else:
+        print("usage: python db_indexes.py [ensure|report]")
+        sys.exit(1)
@@ -1,72 +1,85 @@
 import os
-import json
+import sys
 import time
-from datetime import datetime
-from typing import List, Dict, Any
+import shutil
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional
 import pandas as pd
 import duckdb
-from pymongo import MongoClient
 try:
-    MONGO_URI = os.environ.get("MONGO_URI")
-    DB_NAME = os.environ.get("DB_NAME")
-    client = MongoClient(MONGO_URI)
-    mongo_db = client[DB_NAME]
-    diet_col = mongo_db["diet_logs"]
-    workout_col = mongo_db["workouts_logs"]
-    progress_col = mongo_db["progress"]
-except Exception:
-    import db_connection as dbc
-    mongo_db = dbc.db
-    diet_col = getattr(dbc, "diet_col", mongo_db["diet_logs"])
-    workout_col = getattr(dbc, "workout_col", mongo_db["workouts_logs"])
-    progress_col = getattr(dbc, "progress_col", mongo_db["progress"])
-DUCKDB_PATH = ("trainer.duckdb")
+    import pyarrow as pa
+except ImportError:
+    pa = None
+import db_connection as dbc
+from tracker.progress_tracker import stamp_unversioned_progress_docs
+mongo_db = dbc.db
+diet_col = dbc.diet_col
+workout_col = dbc.workout_col
+progress_col = dbc.progress_col
+DUCKDB_PATH = os.getenv("DUCKDB_PATH", "trainer.duckdb")
 ETL_METADATA_TABLE = "etl_metadata"
+ETL_BATCH_SIZE = int(os.getenv("ETL_BATCH_SIZE", "5000"))
+ETL_USE_ARROW = os.getenv("ETL_USE_ARROW", "1") == "1" and pa is not None
+PARQUET_EXPORT = os.getenv("PARQUET_EXPORT", "1") == "1"
+PARQUET_DIR = os.getenv("PARQUET_DIR", "warehouse_parquet")
+PARQUET_USER_BUCKETS = int(os.getenv("PARQUET_USER_BUCKETS", "16"))
+# Readers cannot open trainer.duckdb while the ETL holds it, so a failed export
+# is also flagged by this file in PARQUET_DIR; text_to_sql_runner checks it.
+PARQUET_FAILED_MARKER = ".export_failed"
 
 con = duckdb.connect(DUCKDB_PATH)
 
 
-def init_schema():
+def init_workouts_table():
     con.execute(
         """
-        CREATE TABLE IF NOT EXISTS foods (
+        CREATE TABLE IF NOT EXISTS workouts (
             source_row_id TEXT PRIMARY KEY,
             user_id TEXT,
             date DATE,
-            meal_type TEXT,
-            food TEXT,
-            quantity DOUBLE,
-            weight DOUBLE,
-            calories DOUBLE,
-            proteins DOUBLE,
-            fats DOUBLE,
-            carbs DOUBLE,
-            fiber DOUBLE,
+            exercise_name TEXT,
+            muscle_group TEXT,
+            sets INTEGER,
+            reps INTEGER[], -- one element per set
+            weight DOUBLE[],
+            total_reps INTEGER,
+            max_weight DOUBLE,
+            tonnage DOUBLE, -- sum of reps * weight over sets
+            duration_minutes DOUBLE,
+            calories_burned DOUBLE,
             source_doc_id TEXT,
             created_at TIMESTAMP,
             updated_at TIMESTAMP
         );
         """
     )
+
+
+def init_schema():
     con.execute(
         """
-        CREATE TABLE IF NOT EXISTS workouts (
+        CREATE TABLE IF NOT EXISTS foods (
             source_row_id TEXT PRIMARY KEY,
             user_id TEXT,
             date DATE,
-            exercise_name TEXT,
-            muscle_group TEXT,
-            sets INTEGER,
-            reps TEXT, -- JSON string of reps list
-            weight TEXT,
-            duration_minutes DOUBLE,
-            calories_burned DOUBLE,
+            meal_type TEXT,
+            food TEXT,
+            quantity DOUBLE,
+            weight DOUBLE,
+            calories DOUBLE,
+            proteins DOUBLE,
+            fats DOUBLE,
+            carbs DOUBLE,
+            fiber DOUBLE,
             source_doc_id TEXT,
             created_at TIMESTAMP,
             updated_at TIMESTAMP
         );
         """
     )
+    init_workouts_table()
+    migrate_workouts_lists()
+    init_workout_sets_table()
     con.execute(
     """
     CREATE TABLE IF NOT EXISTS daily_progress (
@@ -92,6 +105,8 @@ def init_schema():
     """
     )
 
+    init_rollup_tables()
+
     con.execute(
         f"""
         CREATE TABLE IF NOT EXISTS {ETL_METADATA_TABLE} (
@@ -105,6 +120,355 @@ def init_schema():
         con.execute(f"INSERT INTO {ETL_METADATA_TABLE} VALUES ('last_etl_run', NULL);")
 
 
+# One row per set, exploded from workouts. Epley estimate for the 1RM; a single
+# rep is the 1RM itself. Rows are inserted ordered by (user_id, date) so row
+# group zone maps can skip other users and dates.
+WORKOUT_SETS_SELECT = """
+    SELECT
+        user_id, date, exercise_name, muscle_group, set_index,
+        reps[set_index] AS reps,
+        weight[set_index] AS weight,
+        CASE
+            WHEN weight[set_index] IS NULL OR reps[set_index] IS NULL OR reps[set_index] <= 0 THEN NULL
+            WHEN reps[set_index] = 1 THEN weight[set_index]
+            ELSE weight[set_index] * (1 + reps[set_index] / 30.0)
+        END AS est_1rm,
+        source_row_id, source_doc_id, updated_at
+    FROM (
+        SELECT *, unnest(generate_series(1, greatest(len(reps), len(weight)))) AS set_index
+        FROM {source}
+    )
+    ORDER BY user_id, date, source_row_id, set_index
+"""
+
+
+def init_workout_sets_table():
+    exists = con.execute(
+        "SELECT count(*) FROM information_schema.tables WHERE table_name = 'workout_sets'"
+    ).fetchone()[0]
+    if exists:
+        return
+    con.execute(
+        """
+        CREATE TABLE workout_sets (
+            user_id TEXT,
+            date DATE,
+            exercise_name TEXT,
+            muscle_group TEXT,
+            set_index INTEGER, -- 1-based position in workouts.reps/weight
+            reps INTEGER,
+            weight DOUBLE,
+            est_1rm DOUBLE,
+            source_row_id TEXT, -- workouts.source_row_id
+            source_doc_id TEXT,
+            updated_at TIMESTAMP
+        );
+        """
+    )
+    # Backfill from a warehouse that already has workouts.
+    con.execute("INSERT INTO workout_sets " + WORKOUT_SETS_SELECT.format(source="workouts"))
+
+
+# Rollups keyed by (user_id, date) or (user_id, week_start). Weeks start on
+# Monday (date_trunc('week')). Each select reads from an alias "src" and takes a
+# {scope} predicate so a run can recompute only the partitions it touched.
+ROLLUP_TABLES = {
+    "user_daily_nutrition": """
+        user_id TEXT,
+        date DATE,
+        meals INTEGER,
+        items INTEGER,
+        calories DOUBLE,
+        proteins DOUBLE,
+        fats DOUBLE,
+        carbs DOUBLE,
+        fiber DOUBLE,
+        PRIMARY KEY (user_id, date)
+    """,
+    "user_daily_training": """
+        user_id TEXT,
+        date DATE,
+        exercises INTEGER,
+        sets INTEGER,
+        total_reps INTEGER,
+        tonnage DOUBLE,
+        max_weight DOUBLE,
+        duration_minutes DOUBLE,
+        calories_burned DOUBLE,
+        PRIMARY KEY (user_id, date)
+    """,
+    "user_weekly_nutrition": """
+        user_id TEXT,
+        week_start DATE,
+        days_logged INTEGER,
+        calories DOUBLE,
+        avg_daily_calories DOUBLE,
+        proteins DOUBLE,
+        fats DOUBLE,
+        carbs DOUBLE,
+        fiber DOUBLE,
+        PRIMARY KEY (user_id, week_start)
+    """,
+    "user_weekly_training": """
+        user_id TEXT,
+        week_start DATE,
+        training_days INTEGER,
+        exercises INTEGER,
+        sets INTEGER,
+        total_reps INTEGER,
+        tonnage DOUBLE,
+        max_weight DOUBLE,
+        duration_minutes DOUBLE,
+        calories_burned DOUBLE,
+        PRIMARY KEY (user_id, week_start)
+    """,
+}
+
+# Daily rollups come before the weekly ones built from them.
+ROLLUPS = [
+    {
+        "table": "user_daily_nutrition",
+        "key": "date",
+        "touched": "touched_nutrition_days",
+        "select": """
+            SELECT user_id, date, count(DISTINCT meal_type), count(*),
+                   sum(calories), sum(proteins), sum(fats), sum(carbs), sum(fiber)
+            FROM foods src WHERE {scope}
+            GROUP BY user_id, date ORDER BY user_id, date
+        """,
+    },
+    {
+        "table": "user_daily_training",
+        "key": "date",
+        "touched": "touched_training_days",
+        "select": """
+            SELECT user_id, date, count(*), sum(sets), sum(total_reps), sum(tonnage),
+                   max(max_weight), sum(duration_minutes), sum(calories_burned)
+            FROM workouts src WHERE {scope}
+            GROUP BY user_id, date ORDER BY user_id, date
+        """,
+    },
+    {
+        "table": "user_weekly_nutrition",
+        "key": "week_start",
+        "touched": "touched_nutrition_weeks",
+        "select": """
+            SELECT user_id, week_start, count(*), sum(calories), avg(calories),
+                   sum(proteins), sum(fats), sum(carbs), sum(fiber)
+            FROM (SELECT *, date_trunc('week', date)::DATE AS week_start FROM user_daily_nutrition) src
+            WHERE {scope}
+            GROUP BY user_id, week_start ORDER BY user_id, week_start
+        """,
+    },
+    {
+        "table": "user_weekly_training",
+        "key": "week_start",
+        "touched": "touched_training_weeks",
+        "select": """
+            SELECT user_id, week_start, count(*), sum(exercises), sum(sets), sum(total_reps),
+                   sum(tonnage), max(max_weight), sum(duration_minutes), sum(calories_burned)
+            FROM (SELECT *, date_trunc('week', date)::DATE AS week_start FROM user_daily_training) src
+            WHERE {scope}
+            GROUP BY user_id, week_start ORDER BY user_id, week_start
+        """,
+    },
+]
+
+
+def init_rollup_tables():
+    existing = {
+        row[0] for row in con.execute("SELECT table_name FROM information_schema.tables").fetchall()
+    }
+    for table, columns in ROLLUP_TABLES.items():
+        con.execute(f"CREATE TABLE IF NOT EXISTS {table} ({columns})")
+    # Backfill rollups created on a warehouse that already holds facts.
+    for rollup in ROLLUPS:
+        if rollup["table"] not in existing:
+            con.execute(f"INSERT INTO {rollup['table']} " + rollup["select"].format(scope="TRUE"))
+
+
+def capture_touched_partitions():
+    # Must run before the merge: a re-extracted doc touches the dates of its old
+    # rows as well as the dates of its staged ones.
+    for table, domain in (("foods", "nutrition"), ("workouts", "training"), ("daily_progress", "progress")):
+        con.execute(
+            f"""
+            CREATE OR REPLACE TEMP TABLE touched_{domain}_days AS
+            SELECT DISTINCT user_id, date FROM (
+                SELECT user_id, date FROM {table}
+                WHERE source_doc_id IN (SELECT source_doc_id FROM stage_docs WHERE target = '{table}')
+                UNION ALL
+                SELECT user_id, date FROM stage_{table}
+            )
+            """
+        )
+        con.execute(
+            f"""
+            CREATE OR REPLACE TEMP TABLE touched_{domain}_weeks AS
+            SELECT DISTINCT user_id, date_trunc('week', date)::DATE AS week_start FROM touched_{domain}_days
+            """
+        )
+    con.execute(
+        f"""
+        CREATE OR REPLACE TEMP TABLE touched_partitions AS
+        SELECT DISTINCT {parquet_partition_columns("d")} FROM (
+            SELECT user_id, date AS d FROM touched_nutrition_days
+            UNION ALL SELECT user_id, date FROM touched_training_days
+            UNION ALL SELECT user_id, date FROM touched_progress_days
+            UNION ALL SELECT user_id, week_start FROM touched_nutrition_weeks
+            UNION ALL SELECT user_id, week_start FROM touched_training_weeks
+        )
+        """
+    )
+
+
+def refresh_rollup(rollup: Dict[str, str]):
+    table, key, touched = rollup["table"], rollup["key"], rollup["touched"]
+    in_scope = f"EXISTS (SELECT 1 FROM {touched} t WHERE t.user_id = src.user_id AND t.{key} = src.{key})"
+    con.execute("CREATE OR REPLACE TEMP TABLE rollup_fresh AS " + rollup["select"].format(scope=in_scope))
+    # Same pattern as merge_item_table: drop touched partitions that no longer
+    # have any facts, upsert the rest.
+    con.execute(
+        f"""
+        DELETE FROM {table} src
+        WHERE {in_scope}
+          AND NOT EXISTS (SELECT 1 FROM rollup_fresh f WHERE f.user_id = src.user_id AND f.{key} = src.{key})
+        """
+    )
+    con.execute(f"INSERT OR REPLACE INTO {table} SELECT * FROM rollup_fresh")
+
+
+def refresh_rollups():
+    for rollup in ROLLUPS:
+        refresh_rollup(rollup)
+
+
+# Tables mirrored to hive-partitioned Parquet, with the date column that picks
+# the month partition. The bucket is the first 32 bits of md5(user_id), so it is
+# stable across DuckDB versions and readers can compute it with hashlib.
+PARQUET_TABLES = {
+    "foods": "date",
+    "workouts": "date",
+    "workout_sets": "date",
+    "daily_progress": "date",
+    "user_daily_nutrition": "date",
+    "user_daily_training": "date",
+    "user_weekly_nutrition": "week_start",
+    "user_weekly_training": "week_start",
+}
+
+
+def parquet_partition_columns(date_col: str) -> str:
+    return (
+        f"CAST(CAST('0x' || left(md5(user_id), 8) AS BIGINT) % {PARQUET_USER_BUCKETS} AS INTEGER) AS user_bucket, "
+        f"coalesce(strftime({date_col}, '%Y-%m'), 'unknown') AS month"
+    )
+
+
+def _partition_dirs(root: str) -> set:
+    if not os.path.isdir(root):
+        return set()
+    return {
+        os.path.join(bucket, month)
+        for bucket in os.listdir(root)
+        for month in os.listdir(os.path.join(root, bucket))
+    }
+
+
+def _swap_partition(staged_root: str, target_root: str, partition: str):
+    # Files are moved in one by one with os.replace, so a reader sees either the
+    # old or the new file, never a partial one. Leftover files are stale.
+    staged = os.path.join(staged_root, partition)
+    target = os.path.join(target_root, partition)
+    fresh = set(os.listdir(staged)) if os.path.isdir(staged) else set()
+    if fresh:
+        os.makedirs(target, exist_ok=True)
+    for name in fresh:
+        os.replace(os.path.join(staged, name), os.path.join(target, name))
+    if os.path.isdir(target):
+        for name in set(os.listdir(target)) - fresh:
+            os.remove(os.path.join(target, name))
+        if not os.listdir(target):
+            os.rmdir(target)
+
+
+def export_parquet(full: bool = False) -> Dict[str, int]:
+    # Rewrites only the (user_bucket, month) partitions touched by the last merge;
+    # every other partition file is left as is. A table without an export yet,
+    # or full=True, is written out completely.
+    staging_root = os.path.join(PARQUET_DIR, ".staging")
+    shutil.rmtree(staging_root, ignore_errors=True)
+    os.makedirs(staging_root)
+    touched = [] if full else con.execute("SELECT user_bucket, month FROM touched_partitions").fetchall()
+    written = {}
+    for table, date_col in PARQUET_TABLES.items():
+        target = os.path.join(PARQUET_DIR, table)
+        table_full = full or not os.path.isdir(target)
+        if not table_full and not touched:
+            continue
+        scope = "TRUE" if table_full else (
+            "EXISTS (SELECT 1 FROM touched_partitions t WHERE t.user_bucket = p.user_bucket AND t.month = p.month)"
+        )
+        staged = os.path.join(staging_root, table)
+        written[table] = con.execute(
+            f"""
+            COPY (
+                SELECT * FROM (SELECT *, {parquet_partition_columns(date_col)} FROM {table}) p
+                WHERE {scope}
+                ORDER BY user_id, {date_col}
+            ) TO '{staged}' (FORMAT PARQUET, PARTITION_BY (user_bucket, month), COMPRESSION ZSTD)
+            """
+        ).fetchone()[0]
+        partitions = _partition_dirs(staged)
+        if table_full:
+            partitions |= _partition_dirs(target)
+        else:
+            partitions |= {os.path.join(f"user_bucket={b}", f"month={m}") for b, m in touched}
+        for partition in partitions:
+            _swap_partition(staged, target, partition)
+    shutil.rmtree(staging_root, ignore_errors=True)
+    return written
+
+
+def migrate_workouts_lists():
+    # Warehouses created before reps/weight became LIST columns stored them as
+    # JSON text; rebuild the table once with typed lists and derived totals.
+    row = con.execute(
+        "SELECT data_type FROM information_schema.columns WHERE table_name = 'workouts' AND column_name = 'reps'"
+    ).fetchone()
+    if not row or row[0] != "VARCHAR":
+        return
+    print("Migrating workouts.reps/weight from JSON text to LIST columns")
+    con.execute("BEGIN TRANSACTION")
+    try:
+        con.execute("ALTER TABLE workouts RENAME TO workouts_json")
+        init_workouts_table()
+        con.execute(
+            """
+            INSERT INTO workouts
+            SELECT
+                source_row_id, user_id, date, exercise_name, muscle_group, sets,
+                r AS reps,
+                w AS weight,
+                COALESCE(list_sum(r), 0) AS total_reps,
+                list_max(w) AS max_weight,
+                COALESCE(list_sum(list_transform(generate_series(1, least(len(r), len(w))), i -> r[i] * w[i])), 0) AS tonnage,
+                duration_minutes, calories_burned, source_doc_id, created_at, updated_at
+            FROM (
+                SELECT *,
+                    TRY_CAST(reps::JSON AS INTEGER[]) AS r,
+                    TRY_CAST(weight::JSON AS DOUBLE[]) AS w
+                FROM workouts_json
+            )
+            """
+        )
+        con.execute("DROP TABLE workouts_json")
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+
+
 def get_last_etl_run() -> datetime | None:
     row = con.execute(
         f"SELECT value FROM {ETL_METADATA_TABLE} WHERE key='last_etl_run'"
@@ -121,6 +485,30 @@ def set_last_etl_run(ts: datetime):
     con.execute(f"INSERT OR REPLACE INTO {ETL_METADATA_TABLE} VALUES ('last_etl_run', ?)", [iso])
 
 
+def get_parquet_export_state() -> Optional[str]:
+    row = con.execute(f"SELECT value FROM {ETL_METADATA_TABLE} WHERE key='parquet_export'").fetchone()
+    return row[0] if row else None
+
+
+def set_parquet_export_state(state: str):
+    con.execute(f"INSERT OR REPLACE INTO {ETL_METADATA_TABLE} VALUES ('parquet_export', ?)", [state])
+    marker = os.path.join(PARQUET_DIR, PARQUET_FAILED_MARKER)
+    if state == "failed":
+        os.makedirs(PARQUET_DIR, exist_ok=True)
+        open(marker, "w").close()
+    elif state == "ok" and os.path.exists(marker):
+        os.remove(marker)
+
+
+def previous_export_incomplete() -> bool:
+    # Only one process can hold trainer.duckdb, so "pending" seen at start means
+    # the last run died between its commit and the end of its export.
+    state = get_parquet_export_state()
+    if state == "pending":
+        set_parquet_export_state("failed")
+    return state in ("pending", "failed")
+
+
 def flatten_diet_doc(doc: Dict[str, Any]) -> List[Dict[str, Any]]:
     rows = []
     _id = str(doc.get("_id"))
@@ -167,6 +555,19 @@ def flatten_diet_doc(doc: Dict[str, Any]) -> List[Dict[str, Any]]:
             })
     return rows
 
+def _number_list(values, cast) -> List[Any]:
+    if values is None:
+        return []
+    if not isinstance(values, (list, tuple)):
+        values = [values]
+    out = []
+    for v in values:
+        try:
+            out.append(cast(float(v)) if v is not None else None)
+        except (TypeError, ValueError):
+            out.append(None)
+    return out
+
 def flatten_workout_doc(doc: Dict[str, Any]) -> List[Dict[str, Any]]:
     rows = []
     _id = str(doc.get("_id"))
@@ -191,6 +592,9 @@ def flatten_workout_doc(doc: Dict[str, Any]) -> List[Dict[str, Any]]:
     workout_data = doc.get("workout_data", []) or []
     for wi, ex in enumerate(workout_data):
         source_row_id = f"{_id}::exercise::{wi}"
+        reps = _number_list(ex.get("reps"), int)
+        weights = _number_list(ex.get("weight"), float)
+        valid_weights = [w for w in weights if w is not None]
         rows.append({
             "source_row_id": source_row_id,
             "user_id": user_id,
@@ -198,8 +602,11 @@ def flatten_workout_doc(doc: Dict[str, Any]) -> List[Dict[str, Any]]:
             "exercise_name": ex.get("exercise_name"),
             "muscle_group": ex.get("muscle_group"),
             "sets": int(ex.get("sets") or 0),
-            "reps": json.dumps(ex.get("reps") or []),
-            "weight": json.dumps(ex.get("weight") or []),
+            "reps": reps,
+            "weight": weights,
+            "total_reps": sum(r for r in reps if r is not None),
+            "max_weight": max(valid_weights) if valid_weights else None,
+            "tonnage": float(sum(r * w for r, w in zip(reps, weights) if r is not None and w is not None)),
             "duration_minutes": float(ex.get("duration_minutes") or 0) if ex.get("duration_minutes") is not None else None,
             "calories_burned": float(ex.get("calories_burned") or 0) if ex.get("calories_burned") is not None else None,
             "source_doc_id": _id,
@@ -237,82 +644,386 @@ def flatten_progress_doc(doc: Dict[str, Any]) -> Dict[str, Any]:
         "updated_at": doc.get("updated_at") or datetime.utcnow().isoformat()
     }
 
-def etl_incremental():
-    init_schema()
-    last_run = get_last_etl_run()
+class StageStats:
+    def __init__(self, name: str):
+        self.name = name
+        self.docs = 0
+        self.rows = 0
+        self.batches = 0
+        self.seconds = {"extract": 0.0, "transform": 0.0, "load": 0.0}
 
-    if last_run is None:
-        print("First ETL run: performing full sync")
-        diet_docs = list(diet_col.find())
-        workout_docs = list(workout_col.find())
-        progress_docs = list(progress_col.find())
+    def report(self) -> str:
+        parts = []
+        for stage, secs in self.seconds.items():
+            count = self.docs if stage == "extract" else self.rows
+            rate = count / secs if secs > 0 else 0.0
+            parts.append(f"{stage}={secs:.2f}s ({rate:,.0f} {'docs' if stage == 'extract' else 'rows'}/s)")
+        return f"{self.name}: docs={self.docs} rows={self.rows} batches={self.batches} " + " ".join(parts)
+
+
+def iter_batches(cursor, batch_size: int = ETL_BATCH_SIZE) -> Iterator[List[Dict[str, Any]]]:
+    batch = []
+    for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+STAGED_TABLES = ["foods", "workouts", "daily_progress"]
+
+
+# Column types mirror init_schema so DuckDB scans the Arrow buffers directly
+# instead of inferring types from pandas object columns on every batch.
+ARROW_SCHEMAS = {}
+if pa is not None:
+    ARROW_SCHEMAS = {
+        "foods": pa.schema([
+            ("source_row_id", pa.string()),
+            ("user_id", pa.string()),
+            ("date", pa.date32()),
+            ("meal_type", pa.string()),
+            ("food", pa.string()),
+            ("quantity", pa.float64()),
+            ("weight", pa.float64()),
+            ("calories", pa.float64()),
+            ("proteins", pa.float64()),
+            ("fats", pa.float64()),
+            ("carbs", pa.float64()),
+            ("fiber", pa.float64()),
+            ("source_doc_id", pa.string()),
+            ("created_at", pa.timestamp("us")),
+            ("updated_at", pa.timestamp("us")),
+        ]),
+        "workouts": pa.schema([
+            ("source_row_id", pa.string()),
+            ("user_id", pa.string()),
+            ("date", pa.date32()),
+            ("exercise_name", pa.string()),
+            ("muscle_group", pa.string()),
+            ("sets", pa.int32()),
+            ("reps", pa.list_(pa.int32())),
+            ("weight", pa.list_(pa.float64())),
+            ("total_reps", pa.int32()),
+            ("max_weight", pa.float64()),
+            ("tonnage", pa.float64()),
+            ("duration_minutes", pa.float64()),
+            ("calories_burned", pa.float64()),
+            ("source_doc_id", pa.string()),
+            ("created_at", pa.timestamp("us")),
+            ("updated_at", pa.timestamp("us")),
+        ]),
+        "daily_progress": pa.schema([
+            ("source_doc_id", pa.string()),
+            ("user_id", pa.string()),
+            ("date", pa.date32()),
+            ("goal", pa.string()),
+            ("achieved_calories", pa.float64()),
+            ("achieved_weight_kg", pa.float64()),
+            ("achieved_workout_intensity", pa.float64()),
+            ("expected_daily_calories", pa.float64()),
+            ("expected_target_weight_kg", pa.float64()),
+            ("expected_workout_intensity", pa.float64()),
+            ("progress_calories", pa.float64()),
+            ("progress_protein", pa.float64()),
+            ("progress_carbs", pa.float64()),
+            ("progress_fats", pa.float64()),
+            ("remarks", pa.string()),
+            ("week_number", pa.int32()),
+            ("created_at", pa.timestamp("us")),
+            ("updated_at", pa.timestamp("us")),
+        ]),
+        "stage_docs": pa.schema([
+            ("target", pa.string()),
+            ("source_doc_id", pa.string()),
+        ]),
+    }
+
+
+def _as_date(value) -> Optional[date]:
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def _as_timestamp(value) -> Optional[datetime]:
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+
+
+def _as_float(value) -> Optional[float]:
+    return float(value) if value is not None else None
+
+
+def _as_int(value) -> Optional[int]:
+    return int(value) if value is not None else None
+
+
+def _as_str(value) -> Optional[str]:
+    return str(value) if value is not None else None
+
+
+def _converter(arrow_type):
+    if pa.types.is_list(arrow_type):
+        return lambda value: list(value) if value is not None else None
+    if pa.types.is_date(arrow_type):
+        return _as_date
+    if pa.types.is_timestamp(arrow_type):
+        return _as_timestamp
+    if pa.types.is_floating(arrow_type):
+        return _as_float
+    if pa.types.is_integer(arrow_type):
+        return _as_int
+    return _as_str
+
+
+def to_record_batch(rows: List[Dict[str, Any]], schema) -> "pa.RecordBatch":
+    # Build each column straight from the flattened rows with its declared type.
+    arrays = []
+    for field in schema:
+        convert = _converter(field.type)
+        arrays.append(pa.array([convert(r.get(field.name)) for r in rows], type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def _insert_rows(table: str, rows: List[Dict[str, Any]], schema_name: str):
+    if ETL_USE_ARROW:
+        data = pa.Table.from_batches([to_record_batch(rows, ARROW_SCHEMAS[schema_name])])
     else:
-        print(f"Incremental ETL from {last_run}")
+        data = pd.DataFrame(rows)
+    con.register("tmp_stage_data", data)
+    con.execute(f"INSERT INTO {table} SELECT * FROM tmp_stage_data")
+    con.unregister("tmp_stage_data")
 
-        diet_docs = list(
-            diet_col.find({
-                "summary.created_at": {"$gte": last_run.isoformat()}
-            })
-        )
 
-        workout_docs = list(
-            workout_col.find({
-                "created_at": {"$gte": last_run}
-            })
+def create_staging_tables():
+    # Session-local TEMP tables with the same columns as the targets, plus the
+    # ids of every extracted doc (including docs that now flatten to no rows).
+    for table in STAGED_TABLES:
+        con.execute(f"CREATE OR REPLACE TEMP TABLE stage_{table} AS SELECT * FROM {table} LIMIT 0")
+    con.execute("CREATE OR REPLACE TEMP TABLE stage_docs (target TEXT, source_doc_id TEXT)")
+
+
+def stage_rows(table: str, rows: List[Dict[str, Any]], doc_ids: List[str]):
+    if rows:
+        _insert_rows(f"stage_{table}", rows, table)
+    if doc_ids:
+        _insert_rows("stage_docs", [{"target": table, "source_doc_id": d} for d in doc_ids], "stage_docs")
+
+
+def load_foods(rows: List[Dict[str, Any]], doc_ids: List[str]):
+    stage_rows("foods", rows, doc_ids)
+
+
+def load_workouts(rows: List[Dict[str, Any]], doc_ids: List[str]):
+    stage_rows("workouts", rows, doc_ids)
+
+
+def load_progress(rows: List[Dict[str, Any]], doc_ids: List[str]):
+    stage_rows("daily_progress", rows, doc_ids)
+
+
+def merge_item_table(table: str):
+    # Rows of a re-extracted doc that no longer exist (removed meal items or
+    # exercises) are dropped with one anti-join; the rest are upserted by key.
+    # Only keys absent from staging are deleted, so the upsert never re-inserts
+    # a key deleted in the same transaction.
+    con.execute(
+        f"""
+        DELETE FROM {table}
+        WHERE source_doc_id IN (SELECT source_doc_id FROM stage_docs WHERE target = '{table}')
+          AND source_row_id NOT IN (SELECT source_row_id FROM stage_{table})
+        """
+    )
+    con.execute(f"INSERT OR REPLACE INTO {table} SELECT DISTINCT ON (source_row_id) * FROM stage_{table}")
+
+
+def merge_progress():
+    # One progress row per (user_id, date): a re-created Mongo doc replaces the
+    # row left behind by the old _id. Staged doc ids without a row are deletes.
+    con.execute(
+        """
+        DELETE FROM daily_progress
+        WHERE source_doc_id IN (SELECT source_doc_id FROM stage_docs WHERE target = 'daily_progress')
+          AND source_doc_id NOT IN (SELECT source_doc_id FROM stage_daily_progress)
+        """
+    )
+    con.execute(
+        """
+        DELETE FROM daily_progress
+        WHERE EXISTS (
+            SELECT 1 FROM stage_daily_progress s
+            WHERE s.user_id = daily_progress.user_id
+              AND s.date = daily_progress.date
+              AND s.source_doc_id <> daily_progress.source_doc_id
         )
+        """
+    )
+    con.execute("INSERT OR REPLACE INTO daily_progress SELECT DISTINCT ON (source_doc_id) * FROM stage_daily_progress")
 
-        progress_docs = list(progress_col.find())
 
+def merge_workout_sets():
+    # workout_sets has no key: every set of a re-extracted workout doc is
+    # replaced wholesale from the staged exercise rows.
+    con.execute(
+        """
+        DELETE FROM workout_sets
+        WHERE source_doc_id IN (SELECT source_doc_id FROM stage_docs WHERE target = 'workouts')
+        """
+    )
+    staged = "(SELECT DISTINCT ON (source_row_id) * FROM stage_workouts)"
+    con.execute("INSERT INTO workout_sets " + WORKOUT_SETS_SELECT.format(source=staged))
+
+
+def merge_staged():
+    capture_touched_partitions()
+    merge_item_table("foods")
+    merge_item_table("workouts")
+    merge_workout_sets()
+    merge_progress()
+    refresh_rollups()
 
-    diet_rows, diet_ids_to_delete = [], []
-    for d in diet_docs:
-        rows = flatten_diet_doc(d)
-        diet_rows.extend(rows)
-        diet_ids_to_delete.extend([r["source_row_id"] for r in rows])
 
-    wo_rows, wo_ids_to_delete = [], []
-    for w in workout_docs:
-        rows = flatten_workout_doc(w)
-        wo_rows.extend(rows)
-        wo_ids_to_delete.extend([r["source_row_id"] for r in rows])
+def stream_collection(name: str, cursor, flatten: Callable[[Dict[str, Any]], List[Dict[str, Any]]], load: Callable[[List[Dict[str, Any]], List[str]], None], batch_size: int = ETL_BATCH_SIZE) -> StageStats:
+    # Pull one cursor batch, flatten it and append it to DuckDB before fetching
+    # the next, so memory stays bounded by batch_size rather than the collection.
+    stats = StageStats(name)
+    batches = iter_batches(cursor.batch_size(batch_size), batch_size)
+    while True:
+        t0 = time.perf_counter()
+        docs = next(batches, None)
+        t1 = time.perf_counter()
+        stats.seconds["extract"] += t1 - t0
+        if docs is None:
+            break
+        rows = []
+        for doc in docs:
+            rows.extend(flatten(doc))
+        t2 = time.perf_counter()
+        stats.seconds["transform"] += t2 - t1
+        load(rows, [str(doc.get("_id")) for doc in docs])
+        stats.seconds["load"] += time.perf_counter() - t2
+        stats.docs += len(docs)
+        stats.rows += len(rows)
+        stats.batches += 1
+    return stats
 
-    progress_rows, progress_ids_to_delete = [], []
-    for p in progress_docs:
-        row = flatten_progress_doc(p)
-        progress_rows.append(row)
-        progress_ids_to_delete.append(row["source_doc_id"])
 
-    if diet_ids_to_delete:
-        con.execute("DELETE FROM foods WHERE source_row_id IN (" + ",".join(["?"] * len(diet_ids_to_delete)) + ")", diet_ids_to_delete)
-    if wo_ids_to_delete:
-        con.execute("DELETE FROM workouts WHERE source_row_id IN (" + ",".join(["?"] * len(wo_ids_to_delete)) + ")", wo_ids_to_delete)
-    if progress_ids_to_delete:
-        con.execute("DELETE FROM daily_progress WHERE source_doc_id IN (" + ",".join(["?"] * len(progress_ids_to_delete)) + ")", progress_ids_to_delete)
+COLLECTION_LOADERS = {
+    "diet_logs": (flatten_diet_doc, load_foods),
+    "workouts_logs": (flatten_workout_doc, load_workouts),
+    "progress": (lambda d: [flatten_progress_doc(d)], load_progress),
+}
 
-    if diet_rows:
-        df_foods = pd.DataFrame(diet_rows)
-        con.register("tmp_foods_df", df_foods)
-        con.execute("INSERT INTO foods SELECT * FROM tmp_foods_df")
-        con.unregister("tmp_foods_df")
 
-    if wo_rows:
-        df_wo = pd.DataFrame(wo_rows)
-        con.register("tmp_wo_df", df_wo)
-        con.execute("INSERT INTO workouts SELECT * FROM tmp_wo_df")
-        con.unregister("tmp_wo_df")
+def export_after_merge(full: bool = False):
+    if not PARQUET_EXPORT:
+        return
+    t0 = time.perf_counter()
+    try:
+        written = export_parquet(full=full)
+        set_parquet_export_state("ok")
+        print(f"parquet export: {sum(written.values())} rows from {len(written)} tables in {time.perf_counter() - t0:.2f}s")
+    except Exception as e:
+        set_parquet_export_state("failed")
+        print(f"⚠️ Parquet export failed, readers use trainer.duckdb until the next run re-exports everything: {e}")
 
-    if progress_rows:
-        for r in progress_rows:
-            con.execute("DELETE FROM daily_progress WHERE user_id=? AND date=?", [r["user_id"], r["date"]])
-        df_progress = pd.DataFrame(progress_rows)
-        con.register("tmp_progress_df", df_progress)
-        con.execute("INSERT INTO daily_progress SELECT * FROM tmp_progress_df")
-        con.unregister("tmp_progress_df")
 
-    set_last_etl_run(datetime.utcnow())
+def apply_doc_changes(upserts: Dict[str, List[Dict[str, Any]]], deletes: Dict[str, List[str]]):
+    # Same staging + merge as a batch run, for an explicit set of changed docs
+    # keyed by Mongo collection. Deleted doc ids are staged without rows, so the
+    # merge drops everything they produced.
+    export_pending = previous_export_incomplete()
+    con.execute("BEGIN TRANSACTION")
+    try:
+        create_staging_tables()
+        for name, (flatten, load) in COLLECTION_LOADERS.items():
+            docs = upserts.get(name, [])
+            rows = []
+            for doc in docs:
+                rows.extend(flatten(doc))
+            load(rows, [str(doc.get("_id")) for doc in docs] + list(deletes.get(name, [])))
+        merge_staged()
+        if PARQUET_EXPORT:
+            set_parquet_export_state("pending")
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+    export_after_merge(full=export_pending)
 
-    print(f"ETL complete. diet_docs={len(diet_docs)} workout_docs={len(workout_docs)} progress_docs={len(progress_docs)}. Time={datetime.utcnow().isoformat()}")
+
+def etl_incremental(batch_size: int = ETL_BATCH_SIZE):
+    init_schema()
+    last_run = get_last_etl_run()
+    run_started = datetime.utcnow()
+    export_pending = previous_export_incomplete()
+
+    if last_run is None:
+        print("First ETL run: performing full sync")
+        diet_cursor = diet_col.find()
+        workout_cursor = workout_col.find()
+        progress_cursor = progress_col.find()
+    else:
+        print(f"Incremental ETL from {last_run}")
+
+        diet_cursor = diet_col.find({
+            "summary.created_at": {"$gte": last_run.isoformat()}
+        })
+
+        workout_cursor = workout_col.find({
+            "created_at": {"$gte": last_run}
+        })
+
+        stamped = stamp_unversioned_progress_docs()
+        if stamped:
+            print(f"Stamped updated_at on {stamped} legacy progress docs")
+        progress_cursor = progress_col.find({
+            "updated_at": {"$gte": last_run}
+        })
+
+    # Everything from staging to the watermark commits together: a failed run
+    # leaves the warehouse and last_etl_run exactly as they were.
+    con.execute("BEGIN TRANSACTION")
+    try:
+        create_staging_tables()
+        cursors = {"diet_logs": diet_cursor, "workouts_logs": workout_cursor, "progress": progress_cursor}
+        stages = [
+            stream_collection(name, cursors[name], flatten, load, batch_size)
+            for name, (flatten, load) in COLLECTION_LOADERS.items()
+        ]
+        t0 = time.perf_counter()
+        merge_staged()
+        # Watermark is the run start so docs written while the ETL ran are
+        # picked up next time.
+        set_last_etl_run(run_started)
+        if PARQUET_EXPORT:
+            # Cleared once the export below succeeds; if it never does, the
+            # next run cannot know which partitions went stale and exports all.
+            set_parquet_export_state("pending")
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+    for stats in stages:
+        print(stats.report())
+    print(f"merge: {time.perf_counter() - t0:.2f}s")
+    export_after_merge(full=export_pending)
+
+    print(f"ETL complete. diet_docs={stages[0].docs} workout_docs={stages[1].docs} progress_docs={stages[2].docs}. Time={datetime.utcnow().isoformat()}")
 
 
 if __name__ == "__main__":
-    etl_incremental()
+    if len(sys.argv) > 1 and sys.argv[1] == "export":
+        init_schema()
+        export_parquet(full=True)
+        set_parquet_export_state("ok")
+    else:
+        etl_incremental()
@@ -59,6 +59,31 @@ def build_weekly_food_update(raw_food_doc):
             f["total_calories"] += item["calories"]
 
     return week_key, date_obj, meal_updates, totals
+def build_weekly_food_summary(raw_food_docs):
+    # The nutrition_summary a week's $inc updates add up to, built in one pass
+    # so the week can be rewritten from its docs instead of incremented.
+    summary = {
+        "weekly_totals": {k: 0 for k in ("total_calories", "total_protein", "total_fat", "total_carb", "total_fiber")},
+        "days_logged": 0,
+        "by_meal_type": {}
+    }
+
+    for raw_food_doc in raw_food_docs:
+        _, _, meal_updates, totals = build_weekly_food_update(raw_food_doc)
+        for k in summary["weekly_totals"]:
+            summary["weekly_totals"][k] += totals[k]
+        summary["days_logged"] += totals["days_logged"]
+
+        for meal_type, m in meal_updates.items():
+            meal = summary["by_meal_type"].setdefault(meal_type, {k: 0 for k in summary["weekly_totals"]})
+            for k in summary["weekly_totals"]:
+                meal[k] += m[k]
+            for food, f in m["foods"].items():
+                totals_for_food = meal.setdefault("foods", {}).setdefault(food, {k: 0 for k in f})
+                for k, v in f.items():
+                    totals_for_food[k] += v
+
+    return summary
 def upsert_weekly_food_summary(db, raw_food_doc):
     week_key, date_obj, meal_updates, totals = build_weekly_food_update(raw_food_doc)
 
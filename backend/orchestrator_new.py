@@ -5,10 +5,7 @@ from datetime import datetime
 from typing import List, Dict, Any
 from Fitness_kb.fitness_coach import run_coach_reasoning_engine
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from google.genai.types import Type
-from google import genai
-from google.genai.errors import APIError
-from openai import OpenAI
+from clients import get_gemini_client, get_openrouter_client, EXTRA_HEADERS
 from dotenv import load_dotenv
 
 try:
@@ -39,21 +36,8 @@ try:
 except Exception:
     workout_query = None
 load_dotenv()
-client_deepseek = OpenAI(
-    api_key=os.environ.get("DEEPSEEK_API_KEY"),
-    base_url="https://openrouter.ai/api/v1"
-)
 MODEL_NAME = "x-ai/grok-4.1-fast"
-EXTRA_HEADERS = {
-    "HTTP-Referer": os.environ.get("SITE_URL", "http://localhost"),
-    "X-Title": os.environ.get("SITE_NAME", "Query Orchestrator")
-}
-try:
-    client_gemini = genai.Client()
-except Exception as e:
-    print(f"Error initializing Gemini client: {e}")
-    client_gemini = None
-    
+
 SPLIT_MODEL_NAME = "gemini-2.5-flash" 
 FINAL_MODEL_NAME = "gemini-2.5-flash" 
 
@@ -80,6 +64,10 @@ Adhere strictly to the JSON schema and rules. Today's date is {today_date}.
 """
 
 def split_into_subqueries(user_question: str) -> List[Dict[str, Any]]:
+    # Imported here rather than at module level to keep google.genai out of app startup.
+    from google.genai import types
+    from google.genai.errors import APIError
+    client_gemini = get_gemini_client()
     if not client_gemini:
         return [{"intent": "other", "subquery": user_question, "start_date": None, "end_date": None}]
 
@@ -96,25 +84,25 @@ def split_into_subqueries(user_question: str) -> List[Dict[str, Any]]:
         contents=[
             {"role": "user", "parts": [{"text": user_prompt}]}
         ],
-        config=genai.types.GenerateContentConfig(
+        config=types.GenerateContentConfig(
             system_instruction=SYSTEM_PROMPT.format(today_date=today_str),
             temperature=0.0,
             response_schema={
-                "type": Type.ARRAY,
+                "type": types.Type.ARRAY,
                 "items": {
-                    "type": Type.OBJECT,
+                    "type": types.Type.OBJECT,
                     "properties": {
-                        "intent": {"type": Type.STRING},
+                        "intent": {"type": types.Type.STRING},
 
-                        "start_date": {"type": Type.STRING, "nullable": True},
-                        "end_date": {"type": Type.STRING, "nullable": True},
+                        "start_date": {"type": types.Type.STRING, "nullable": True},
+                        "end_date": {"type": types.Type.STRING, "nullable": True},
 
-                        "exercise": {"type": Type.STRING, "nullable": True},
-                        "muscle_group": {"type": Type.STRING, "nullable": True},
-                        "exercise_breakdown": {"type": Type.BOOLEAN, "nullable": True},
+                        "exercise": {"type": types.Type.STRING, "nullable": True},
+                        "muscle_group": {"type": types.Type.STRING, "nullable": True},
+                        "exercise_breakdown": {"type": types.Type.BOOLEAN, "nullable": True},
 
-                        "food": {"type": Type.STRING, "nullable": True},
-                        "food_breakdown": {"type": Type.BOOLEAN, "nullable": True}
+                        "food": {"type": types.Type.STRING, "nullable": True},
+                        "food_breakdown": {"type": types.Type.BOOLEAN, "nullable": True}
                     }
                 }
             }
@@ -253,6 +241,9 @@ Rules:
 """
 
 def synthesize_final_answer(user_question: str, collected: Dict[str, Any]) -> str:
+    from google.genai import types
+    from google.genai.errors import APIError
+    client_gemini = get_gemini_client()
     if not client_gemini:
         return "Error: Gemini client not initialized."
 
@@ -267,7 +258,7 @@ def synthesize_final_answer(user_question: str, collected: Dict[str, Any]) -> st
             contents=[
                 {"role": "user", "parts": [{"text": prompt}]}
             ],
-            config=genai.types.GenerateContentConfig(
+            config=types.GenerateContentConfig(
                 system_instruction=system_instr,
                 temperature=0.2,
                 max_output_tokens=800
@@ -297,7 +288,7 @@ def temp_final_answer(collected: Dict[str, Any]) -> str:
         }
     ]
 
-    resp = client_deepseek.chat.completions.create(
+    resp = get_openrouter_client().chat.completions.create(
         model=MODEL_NAME,
         messages=messages,
         temperature=0.3,
@@ -0,0 +1,112 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+import psycopg2
+from psycopg2 import pool
+from dotenv import load_dotenv
+load_dotenv()
+
+SUPABASE_DB_URL = os.getenv("P_DATABASE_URL")
+PG_POOL_MIN = int(os.getenv("PG_POOL_MIN", "1"))
+PG_POOL_MAX = int(os.getenv("PG_POOL_MAX", "10"))
+PG_POOL_TIMEOUT = float(os.getenv("PG_POOL_TIMEOUT", "10"))
+PG_CONNECT_TIMEOUT = int(os.getenv("PG_CONNECT_TIMEOUT", "5"))
+PG_HEALTH_CHECK_INTERVAL = float(os.getenv("PG_HEALTH_CHECK_INTERVAL", "30"))
+
+_pool = None
+_pool_lock = threading.Lock()
+# ThreadedConnectionPool raises as soon as it runs dry; the semaphore makes
+# callers wait (up to PG_POOL_TIMEOUT) for a free connection instead.
+_slots = threading.BoundedSemaphore(PG_POOL_MAX)
+_last_checked = {}
+
+
+def get_pg_pool() -> pool.ThreadedConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                if not SUPABASE_DB_URL:
+                    raise RuntimeError("P_DATABASE_URL is not set; cannot create Postgres pool.")
+                _pool = pool.ThreadedConnectionPool(
+                    PG_POOL_MIN,
+                    PG_POOL_MAX,
+                    SUPABASE_DB_URL,
+                    connect_timeout=PG_CONNECT_TIMEOUT,
+                    keepalives=1,
+                    keepalives_idle=30,
+                    keepalives_interval=10,
+                    keepalives_count=3,
+                )
+                print(f"Postgres pool ready (min={PG_POOL_MIN}, max={PG_POOL_MAX})")
+    return _pool
+
+
+def _is_healthy(conn) -> bool:
+    if conn.closed:
+        return False
+    now = time.monotonic()
+    if now - _last_checked.get(id(conn), 0) < PG_HEALTH_CHECK_INTERVAL:
+        return True
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        conn.rollback()
+    except psycopg2.Error:
+        return False
+    _last_checked[id(conn)] = now
+    return True
+
+
+def _checkout(pg_pool):
+    conn = pg_pool.getconn()
+    if _is_healthy(conn):
+        return conn
+    _last_checked.pop(id(conn), None)
+    pg_pool.putconn(conn, close=True)
+    return pg_pool.getconn()
+
+
+@contextmanager
+def pg_connection():
+    pg_pool = get_pg_pool()
+    if not _slots.acquire(timeout=PG_POOL_TIMEOUT):
+        raise RuntimeError(f"Timed out after {PG_POOL_TIMEOUT}s waiting for a Postgres connection")
+    conn = None
+    try:
+        conn = _checkout(pg_pool)
+        yield conn
+        conn.commit()
+    except Exception:
+        if conn is not None and not conn.closed:
+            conn.rollback()
+        raise
+    finally:
+        if conn is not None:
+            broken = bool(conn.closed)
+            if broken:
+                _last_checked.pop(id(conn), None)
+            pg_pool.putconn(conn, close=broken)
+        _slots.release()
+
+
+def pg_pool_stats() -> dict:
+    if _pool is None:
+        return {"initialized": False, "max": PG_POOL_MAX}
+    return {
+        "initialized": True,
+        "min": PG_POOL_MIN,
+        "max": PG_POOL_MAX,
+        "in_use": len(_pool._used),
+        "idle": len(_pool._pool),
+    }
+
+
+def close_pg_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+            _last_checked.clear()
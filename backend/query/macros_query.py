@@ -4,7 +4,6 @@ import re
 from datetime import datetime, timedelta
 from dateutil import parser
 from pymongo import MongoClient
-from openai import OpenAI
 from db_connection import db
 
 
@@ -1,14 +1,10 @@
 import os
 import re
-import duckdb
 from functools import lru_cache
-from typing import Tuple
+from typing import Optional, Tuple
 
-try:
-    from orchestrator_new import client_deepseek, EXTRA_HEADERS
-except Exception:
-    client_deepseek = None
-    EXTRA_HEADERS = {}
+from clients import get_openrouter_client, EXTRA_HEADERS
+from sql_query.text_to_sql_runner import SCHEMA_DESCRIPTION, connect_analytics
 
 MODEL_NAME = os.getenv("SQL_MODEL_NAME", "x-ai/grok-4.1-fast")
 DUCKDB_PATH = os.getenv("DUCKDB_PATH", "trainer.duckdb")
@@ -51,19 +47,12 @@ def inject_user_clause(sql: str, user_id: str) -> str:
         return sql + where_clause
 
 def build_system_message(user_id: str) -> str:
-    schema = (
-        "Table daily_progress(user_id,date,goal,"
-        "achieved_calories,achieved_weight_kg,achieved_workout_intensity,"
-        "expected_daily_calories,expected_target_weight_kg,expected_workout_intensity,"
-        "progress_calories,progress_protein,progress_carbs,progress_fats,"
-        "remarks,week_number,created_at,updated_at)"
-    )
     rules = (
         "You are an expert SQL generator (DuckDB). Output ONE valid SELECT query only, no commentary. "
         "Always ensure results are filtered by user_id = '{uid}'. Prefer grouping, aggregation, date summaries. "
         "Use DuckDB-compatible SQL. Output only the SQL text (no markdown)."
     )
-    return f"{schema}\n{rules}".replace("{uid}", user_id)
+    return f"{SCHEMA_DESCRIPTION}{rules}".replace("{uid}", user_id)
 
 def build_user_message(user_question: str) -> str:
     question = user_question.strip()
@@ -87,6 +76,10 @@ def _extract_sql_from_model(raw: str) -> str:
 
 def generate_sql(user_question: str, user_id: str, max_retries: int = MAX_RETRIES) -> str:
 
+    try:
+        client_deepseek = get_openrouter_client()
+    except Exception:
+        client_deepseek = None
     if client_deepseek is None:
         raise RuntimeError("client_deepseek is not configured. Import or initialize it in orchestrator_new.")
 
@@ -136,9 +129,9 @@ def generate_sql(user_question: str, user_id: str, max_retries: int = MAX_RETRIE
 
     raise ValueError(f"Failed to produce valid SQL after {max_retries+1} attempts: {last_error or 'unknown'}")
 
-def execute_sql_on_duckdb(sql: str, duckdb_path: str = DUCKDB_PATH, limit: int = 2000):
+def execute_sql_on_duckdb(sql: str, duckdb_path: str = DUCKDB_PATH, limit: int = 2000, user_id: Optional[str] = None):
 
-    con = duckdb.connect(duckdb_path)
+    con = connect_analytics(duckdb_path, user_id)
     try:
         if re.search(r'\blimit\b', sql, flags=re.IGNORECASE) is None:
             sql_exec = sql.rstrip().rstrip(";") + f" LIMIT {limit}"
@@ -155,7 +148,7 @@ if __name__ == "__main__":
     try:
         query = generate_sql(test_question, test_user)
         print("Generated SQL:\n", query)
-        df = execute_sql_on_duckdb(query)
+        df = execute_sql_on_duckdb(query, user_id=test_user)
         print(df.head())
     except Exception as exc:
         print("Error:", exc)
@@ -1,20 +1,23 @@
 import os
 import re
+import glob
+import hashlib
 import duckdb
 from functools import lru_cache
-from typing import Tuple
+from typing import Optional, Tuple
 
-try:
-    from orchestrator_new import client_deepseek, EXTRA_HEADERS
-except Exception:
-    client_deepseek = None
-    EXTRA_HEADERS = {}
+from clients import get_openrouter_client, EXTRA_HEADERS
 
 MODEL_NAME = os.getenv("SQL_MODEL_NAME", "x-ai/grok-4.1-fast")
 DUCKDB_PATH = os.getenv("DUCKDB_PATH", "trainer.duckdb")
 TEMPERATURE = float(os.getenv("SQL_TEMPERATURE", "0.1"))
 MAX_TOKENS = int(os.getenv("SQL_MAX_TOKENS", "512"))
 MAX_RETRIES = int(os.getenv("SQL_MAX_RETRIES", "2"))
+PARQUET_DIR = os.getenv("PARQUET_DIR", "warehouse_parquet")
+# Must match the bucket count the ETL exported with (duckdb_etl.PARQUET_USER_BUCKETS).
+PARQUET_USER_BUCKETS = int(os.getenv("PARQUET_USER_BUCKETS", "16"))
+# Written by the ETL while its last export failed (duckdb_etl.PARQUET_FAILED_MARKER).
+PARQUET_FAILED_MARKER = ".export_failed"
 
 FORBIDDEN = {
     "insert", "update", "delete", "drop", "alter",
@@ -58,13 +61,30 @@ def inject_user_clause(sql: str, user_id: str) -> str:
         return sql + f" AND user_id = '{user_id}'"
     return sql + f" WHERE user_id = '{user_id}'"
 
-def build_system_message(user_id: str) -> str:
-    schema = (
-        "Tables:\n"
-        "foods(user_id,date,meal_type,food,quantity,weight,calories,proteins,fats,carbs,fiber,source_row_id)\n"
-        "workouts(user_id,date,exercise_name,muscle_group,sets,reps,weight,duration_minutes,calories_burned,source_row_id)\n"
-    )
+# Shared with text_to_sql_prog so both entry points describe the same warehouse.
+SCHEMA_DESCRIPTION = (
+    "Tables:\n"
+    "foods(user_id,date,meal_type,food,quantity,weight,calories,proteins,fats,carbs,fiber,source_row_id)\n"
+    "workouts(user_id,date,exercise_name,muscle_group,sets,reps,weight,total_reps,max_weight,tonnage,duration_minutes,calories_burned,source_row_id)\n"
+    "workouts.reps is INTEGER[] and workouts.weight is DOUBLE[] (one element per set); "
+    "total_reps, max_weight and tonnage (sum of reps*weight) are precomputed per row. "
+    "Use them or DuckDB list functions (list_max, list_sum, unnest) instead of parsing JSON.\n"
+    "workout_sets(user_id,date,exercise_name,muscle_group,set_index,reps,weight,est_1rm,source_row_id) "
+    "has one row per set (est_1rm is the Epley estimate); use it for set-level questions.\n"
+    "daily_progress(user_id,date,goal,achieved_calories,achieved_weight_kg,achieved_workout_intensity,"
+    "expected_daily_calories,expected_target_weight_kg,expected_workout_intensity,"
+    "progress_calories,progress_protein,progress_carbs,progress_fats,remarks,week_number,created_at,updated_at) "
+    "has one row per user per day with that day's targets, achieved values and progress percentages.\n"
+    "Pre-aggregated rollups (one row per user per day or per week, week_start is the Monday):\n"
+    "user_daily_nutrition(user_id,date,meals,items,calories,proteins,fats,carbs,fiber)\n"
+    "user_daily_training(user_id,date,exercises,sets,total_reps,tonnage,max_weight,duration_minutes,calories_burned)\n"
+    "user_weekly_nutrition(user_id,week_start,days_logged,calories,avg_daily_calories,proteins,fats,carbs,fiber)\n"
+    "user_weekly_training(user_id,week_start,training_days,exercises,sets,total_reps,tonnage,max_weight,duration_minutes,calories_burned)\n"
+    "For daily or weekly totals and trends query the rollups; use foods/workouts only for per-item or per-exercise detail.\n"
+)
+
 
+def build_system_message(user_id: str) -> str:
     rules = (
         "You generate ONE valid DuckDB SELECT query. "
         "No commentary. No markdown. "
@@ -73,7 +93,7 @@ def build_system_message(user_id: str) -> str:
         "Return only SQL."
     )
 
-    return (schema + rules).replace("{uid}", user_id)
+    return (SCHEMA_DESCRIPTION + rules).replace("{uid}", user_id)
 
 
 def build_user_message(question: str) -> str:
@@ -96,6 +116,10 @@ def generate_sql_cached(question: str, user_id: str) -> str:
 
 
 def generate_sql(question: str, user_id: str, max_retries: int = MAX_RETRIES) -> str:
+    try:
+        client_deepseek = get_openrouter_client()
+    except Exception:
+        client_deepseek = None
     if client_deepseek is None:
         raise RuntimeError("client_deepseek is not initialized.")
 
@@ -148,8 +172,48 @@ def clean_result(df):
     return df.drop(columns=[c for c in drop if c in df.columns], errors="ignore")
 
 
-def execute_sql_on_duckdb(sql: str, duckdb_path: str = DUCKDB_PATH):
-    con = duckdb.connect(duckdb_path)
+def user_bucket(user_id: str) -> int:
+    # Same as the ETL's partition column: first 32 bits of md5(user_id).
+    return int(hashlib.md5(user_id.encode("utf-8")).hexdigest()[:8], 16) % PARQUET_USER_BUCKETS
+
+
+def connect_parquet(parquet_dir: str = PARQUET_DIR, user_id: Optional[str] = None):
+    # In-memory connection with one view per exported table, so queries never
+    # touch trainer.duckdb or its write lock. With a user_id the views only list
+    # that user's bucket, letting DuckDB skip every other partition's files.
+    tables = {}
+    for table in sorted(os.listdir(parquet_dir)):
+        path = os.path.join(parquet_dir, table, "*", "*", "*.parquet")
+        if not table.startswith(".") and glob.glob(path):
+            tables[table] = path.replace("'", "''")
+    if not tables:
+        return None
+    con = duckdb.connect(":memory:")
+    bucket_filter = f"WHERE user_bucket = {user_bucket(user_id)}" if user_id else ""
+    for table, path in tables.items():
+        con.execute(
+            f"""
+            CREATE VIEW {table} AS
+            SELECT * EXCLUDE (user_bucket, month)
+            FROM read_parquet('{path}', hive_partitioning = true, hive_types = {{'user_bucket': INTEGER, 'month': VARCHAR}})
+            {bucket_filter}
+            """
+        )
+    return con
+
+
+def connect_analytics(duckdb_path: str = DUCKDB_PATH, user_id: Optional[str] = None, parquet_dir: str = PARQUET_DIR):
+    # Parquet export when there is a usable one; after a failed export it may be
+    # stale or half swapped, so read trainer.duckdb (read-only) instead.
+    if parquet_dir and os.path.isdir(parquet_dir) and not os.path.exists(os.path.join(parquet_dir, PARQUET_FAILED_MARKER)):
+        con = connect_parquet(parquet_dir, user_id)
+        if con is not None:
+            return con
+    return duckdb.connect(duckdb_path, read_only=True)
+
+
+def execute_sql_on_duckdb(sql: str, duckdb_path: str = DUCKDB_PATH, user_id: Optional[str] = None, parquet_dir: str = PARQUET_DIR):
+    con = connect_analytics(duckdb_path, user_id, parquet_dir)
     try:
         if "limit" not in sql.lower():
             sql = sql.rstrip(";") + " LIMIT 2000"
@@ -163,4 +227,4 @@ if __name__ == "__main__":
     user = "u001"
     sql = generate_sql(q, user)
     print("Generated SQL:", sql)
-    print(execute_sql_on_duckdb(sql))
+    print(execute_sql_on_duckdb(sql, user_id=user))
@@ -2,19 +2,12 @@ from typing import List, Dict
 import math
 import os
 import random
-from google import genai
 import json
 from typing import List, Dict, Any
-from google.genai import types
 import re
+from clients import get_gemini_client
 from dotenv import load_dotenv
 load_dotenv()
-try:
-    api_key=os.getenv("CALORIES_GEMINI_KEY")
-    client_gemini = genai.Client(api_key=api_key)
-except Exception as e:
-    print(f"Error initializing Gemini client: {e}")
-    client_gemini = None
 
 
 def normalize_item(item: Dict) -> Dict:
@@ -119,7 +112,9 @@ Return valid JSON only.
     return prompt
 
 def call_llm(prompt: str) -> Dict:
+    from google.genai import types
     try:
+        client_gemini = get_gemini_client("CALORIES_GEMINI_KEY")
         response = client_gemini.models.generate_content(
             model='gemini-2.5-flash-lite',
             contents=[
@@ -0,0 +1,44 @@
+import os
+import sys
+import tempfile
+import duckdb
+import mongomock
+import pymongo
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault("DB_NAME", "trainer_test")
+# duckdb_etl opens its warehouse at import time; keep it out of the source tree.
+_warehouse_dir = tempfile.mkdtemp(prefix="trainer-tests-")
+os.environ.setdefault("DUCKDB_PATH", os.path.join(_warehouse_dir, "trainer.duckdb"))
+os.environ.setdefault("PARQUET_DIR", os.path.join(_warehouse_dir, "warehouse_parquet"))
+
+# db_connection builds its client at import time; every module that imports it
+# during the test session gets an in-memory mongomock client instead.
+_mongo = mongomock.MongoClient()
+pymongo.MongoClient = lambda *args, **kwargs: _mongo
+
+
+@pytest.fixture
+def mongo_db():
+    db = _mongo[os.environ["DB_NAME"]]
+    for name in db.list_collection_names():
+        db.drop_collection(name)
+    return db
+
+
+@pytest.fixture
+def warehouse(tmp_path, monkeypatch):
+    # duckdb_etl with its own warehouse file and Parquet export directory.
+    import duckdb_etl
+    con = duckdb.connect(str(tmp_path / "trainer.duckdb"))
+    monkeypatch.setattr(duckdb_etl, "con", con)
+    monkeypatch.setattr(duckdb_etl, "DUCKDB_PATH", str(tmp_path / "trainer.duckdb"))
+    monkeypatch.setattr(duckdb_etl, "PARQUET_DIR", str(tmp_path / "warehouse_parquet"))
+    duckdb_etl.init_schema()
+    yield duckdb_etl
+    try:
+        con.close()
+    except duckdb.Error:
+        pass
@@ -0,0 +1,105 @@
+import copy
+import random
+from datetime import datetime
+import pytest
+from tracker.progress_tracker import compute_week_adaptation, week_dates
+from tracker.batch_adapt import compute_batch_adaptation, _next_week_docs
+
+NOW = datetime(2025, 3, 10, 6, 0)
+WEEK_START = "2025-03-03"
+GOALS = ["lose weight", "Fat Loss - lose", "gain muscle", "Muscle building", "maintain", None]
+
+
+def maybe(rng, value, p_missing=0.2):
+    return None if rng.random() < p_missing else value
+
+
+def make_plan(rng):
+    if rng.random() < 0.2:
+        return None
+    plan = {"Weekly_Plan": []}
+    for _ in range(rng.randint(0, 6)):
+        week = {"expected_weight_kg": maybe(rng, round(rng.uniform(60, 95), 1))}
+        if rng.random() < 0.7:
+            week["expected_macros"] = {
+                "Protein_g": maybe(rng, rng.randint(100, 200)),
+                "Carbs_g": maybe(rng, rng.randint(150, 350)),
+                "Fats_g": maybe(rng, rng.randint(40, 90)),
+            }
+        plan["Weekly_Plan"].append(week)
+    if rng.random() < 0.6:
+        plan["Macros"] = {"Protein_g": 150, "Carbs_g": 250, "Fats_g": 70}
+    return plan
+
+
+def make_docs(rng, user_id, days):
+    goal = rng.choice(GOALS)
+    base_weight = rng.uniform(60, 95)
+    docs = []
+    for date in rng.sample(week_dates(WEEK_START), days):
+        achieved = {
+            "calories": maybe(rng, rng.uniform(1400, 3200)),
+            "weight_kg": maybe(rng, round(base_weight + rng.uniform(-1.5, 1.5), 2), 0.4),
+            "workout_intensity": maybe(rng, rng.uniform(20, 90)),
+        }
+        if rng.random() < 0.7:
+            achieved["macros"] = {
+                "protein_g": maybe(rng, rng.uniform(60, 220)),
+                "carbs_g": maybe(rng, rng.uniform(100, 400)),
+                "fats_g": maybe(rng, rng.uniform(30, 120)),
+            }
+        expected = {"daily_calories": maybe(rng, rng.choice([1800, 2100, 2450.5, 2900])), "workout_intensity": 55.0}
+        if rng.random() < 0.7:
+            expected["daily_macros"] = {
+                "protein_g": maybe(rng, rng.choice([120, 150.5, 180])),
+                "carbs_g": maybe(rng, rng.choice([200, 260, 310])),
+                "fats_g": maybe(rng, rng.choice([55, 70, 85.5])),
+            }
+        doc = {"user_id": user_id, "date": date, "achieved": achieved, "expected": expected}
+        if goal is not None:
+            doc["goal"] = goal
+        docs.append(doc)
+    return docs
+
+
+def make_inputs(seed, n_users=300):
+    rng = random.Random(seed)
+    inputs = {}
+    for u in range(n_users):
+        user_id = f"user-{u:04d}"
+        # Docs arrive unsorted, as a plain find() returns them; 0 days = no progress yet.
+        inputs[user_id] = {
+            "start_date": WEEK_START,
+            "docs": make_docs(rng, user_id, rng.choice([0, 1, 2, 3, 5, 7, 7, 7])),
+            "plan": make_plan(rng),
+            "last_week_number": rng.choice([None, None, 0, 1, 3, 5]),
+        }
+    return inputs
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_batch_matches_per_user_engine(seed):
+    inputs = make_inputs(seed)
+    batch = compute_batch_adaptation(copy.deepcopy(inputs), now=NOW)
+
+    assert set(batch) == {u for u, slot in inputs.items() if slot["docs"]}
+    for user_id, slot in inputs.items():
+        if not slot["docs"]:
+            continue
+        slot = copy.deepcopy(slot)
+        expected = compute_week_adaptation(user_id, slot["start_date"], slot["docs"], slot["plan"], slot["last_week_number"], now=NOW)
+        assert batch[user_id] == expected, user_id
+        assert _next_week_docs(user_id, slot, batch[user_id]) == _next_week_docs(user_id, slot, expected), user_id
+
+
+def test_doc_order_does_not_change_the_result():
+    inputs = make_inputs(seed=3, n_users=50)
+    for user_id, slot in inputs.items():
+        if len(slot["docs"]) < 2:
+            continue
+        by_date = sorted(slot["docs"], key=lambda d: d["date"])
+        results = [
+            compute_week_adaptation(user_id, WEEK_START, copy.deepcopy(docs), slot["plan"], slot["last_week_number"], now=NOW)
+            for docs in (by_date, by_date[::-1], slot["docs"])
+        ]
+        assert results[0] == results[1] == results[2], user_id
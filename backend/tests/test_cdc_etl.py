@@ -0,0 +1,221 @@
+import datetime
+from pymongo.errors import OperationFailure
+import cdc_etl
+import db_etl
+
+
+class ReplayChangeStream:
+    # Stand-in for a pymongo ChangeStream (mongomock has no watch): tails the
+    # shared event log from just after resume_token, or from the start when
+    # opened without one, exposing the try_next/resume_token/alive surface
+    # run_cdc uses. Events appended after opening are still delivered.
+    def __init__(self, events, resume_token=None):
+        self.events = events
+        self.resume_token = resume_token or {"_data": "0"}
+        self.position = 0
+        if resume_token is not None:
+            seen = [i for i, e in enumerate(events) if e["_id"] == resume_token]
+            if seen:
+                self.position = seen[0] + 1
+        self.alive = True
+
+    def try_next(self):
+        if self.position >= len(self.events):
+            self.alive = False
+            return None
+        event = self.events[self.position]
+        self.position += 1
+        self.resume_token = event["_id"]
+        return event
+
+    def close(self):
+        self.alive = False
+
+
+class ChangeLog:
+    # Writes to mongomock and records the change event a replica set would emit.
+    def __init__(self, db):
+        self.db = db
+        self.events = []
+
+    def _event(self, op, coll, doc_id, doc=None):
+        event = {
+            "_id": {"_data": str(len(self.events) + 1)},
+            "operationType": op,
+            "ns": {"db": self.db.name, "coll": coll},
+            "documentKey": {"_id": doc_id},
+        }
+        if doc is not None:
+            event["fullDocument"] = doc
+        self.events.append(event)
+
+    def insert(self, coll, doc):
+        self.db[coll].insert_one(doc)
+        self._event("insert", coll, doc["_id"], dict(doc))
+
+    def replace(self, coll, doc):
+        self.db[coll].replace_one({"_id": doc["_id"]}, doc)
+        self._event("replace", coll, doc["_id"], dict(doc))
+
+    def delete(self, coll, doc_id):
+        self.db[coll].delete_one({"_id": doc_id})
+        self._event("delete", coll, doc_id)
+
+    def stream(self, resume_token=None):
+        return ReplayChangeStream(self.events, resume_token)
+
+
+def diet_doc(doc_id, day, calories):
+    meal_summary = {"total_calories": calories, "total_protein": 10, "total_fat": 5, "total_carb": 30, "total_fiber": 2}
+    return {
+        "_id": doc_id,
+        "user_id": "u1",
+        "date": day,
+        "plan_data": [{
+            "meal_type": "lunch",
+            "items": [{"food": "rice", "quantity": 1, "weight": 200, "calories": calories}],
+            "meal_summary": meal_summary,
+        }],
+        "summary": {**meal_summary, "created_at": datetime.datetime.utcnow().isoformat()},
+    }
+
+
+def workout_doc(doc_id, day, weight):
+    return {
+        "_id": doc_id,
+        "user_id": "u1",
+        "date": day,
+        "workout_data": [{
+            "exercise_name": "bench press", "muscle_group": "Chest", "sets": 2,
+            "reps": [10, 8], "weight": weight, "duration_minutes": 6, "calories_burned": 35,
+        }],
+        "created_at": datetime.datetime.utcnow(),
+    }
+
+
+def weekly(db, week, field):
+    doc = db.weekly_summary.find_one({"user_id": "u1", "week": week}) or {}
+    return doc.get(field)
+
+
+def daily_calories(warehouse):
+    rows = warehouse.con.execute(
+        "SELECT strftime(date, '%Y-%m-%d'), calories FROM user_daily_nutrition WHERE user_id = 'u1' ORDER BY date"
+    ).fetchall()
+    return dict(rows)
+
+
+def snapshot(db, warehouse):
+    # Warehouse facts and rollups minus ETL bookkeeping columns, plus weekly_summary.
+    tables = {}
+    for table in ["foods", "workouts", "user_daily_nutrition", "user_weekly_nutrition", "user_daily_training", "user_weekly_training"]:
+        columns = [c[0] for c in warehouse.con.execute(f"DESCRIBE {table}").fetchall()]
+        kept = ", ".join(c for c in columns if c not in ("source_row_id", "created_at", "updated_at"))
+        tables[table] = warehouse.con.execute(f"SELECT {kept} FROM {table} ORDER BY ALL").fetchall()
+    weeks = sorted(repr(sorted(d.items())) for d in db.weekly_summary.find({}, {"_id": 0}))
+    return tables, weeks
+
+
+def run(log, token_path, **kwargs):
+    return cdc_etl.run_cdc(stream_factory=log.stream, batch_size=100, batch_seconds=60, token_path=str(token_path), **kwargs)
+
+
+def test_insert_redate_delete_and_full_replay(mongo_db, warehouse, tmp_path):
+    log = ChangeLog(mongo_db)
+    token_path = tmp_path / "cdc_token.json"
+
+    # 2025-01-06 and 2025-01-07 are in 2025-W2, 2025-01-14 in 2025-W3.
+    log.insert("diet_logs", diet_doc("d1", "2025-01-06", 500))
+    log.insert("diet_logs", diet_doc("d2", "2025-01-07", 300))
+    log.insert("workouts_logs", workout_doc("w1", "2025-01-06", [50, 60]))
+    # First start: the catch-up full sync and the stream both see these docs.
+    run(log, token_path)
+
+    assert warehouse.con.execute("SELECT count(*) FROM foods").fetchone()[0] == 2
+    assert daily_calories(warehouse) == {"2025-01-06": 500, "2025-01-07": 300}
+    assert warehouse.con.execute("SELECT calories, days_logged FROM user_weekly_nutrition").fetchall() == [(800, 2)]
+    assert warehouse.con.execute("SELECT sets, tonnage FROM user_weekly_training").fetchall() == [(2, 980)]
+    w2 = weekly(mongo_db, "2025-W2", "nutrition_summary")
+    assert w2["weekly_totals"]["total_calories"] == 800 and w2["days_logged"] == 2
+    assert weekly(mongo_db, "2025-W2", "workout_summary")["totals"]["total_sets"] == 2
+
+    # Re-date d2 into the next week: both weeks are rebuilt.
+    log.replace("diet_logs", diet_doc("d2", "2025-01-14", 300))
+    run(log, token_path)
+
+    assert daily_calories(warehouse) == {"2025-01-06": 500, "2025-01-14": 300}
+    assert warehouse.con.execute(
+        "SELECT strftime(week_start, '%Y-%m-%d'), calories FROM user_weekly_nutrition ORDER BY week_start"
+    ).fetchall() == [("2025-01-06", 500), ("2025-01-13", 300)]
+    assert weekly(mongo_db, "2025-W2", "nutrition_summary")["weekly_totals"]["total_calories"] == 500
+    assert weekly(mongo_db, "2025-W3", "nutrition_summary")["weekly_totals"]["total_calories"] == 300
+
+    log.delete("diet_logs", "d1")
+    run(log, token_path)
+
+    assert daily_calories(warehouse) == {"2025-01-14": 300}
+    assert weekly(mongo_db, "2025-W2", "nutrition_summary") is None
+    assert weekly(mongo_db, "2025-W2", "workout_summary")["totals"]["total_sets"] == 2
+    settled = snapshot(mongo_db, warehouse)
+
+    # A lost checkpoint replays the whole log on top of the catch-up, and the
+    # nightly job rebuilds the same weeks again: nothing is counted twice.
+    token_path.unlink()
+    run(log, token_path)
+    db_etl.start_etl()
+    assert snapshot(mongo_db, warehouse) == settled
+    assert weekly(mongo_db, "2025-W3", "nutrition_summary")["weekly_totals"]["total_calories"] == 300
+
+
+def test_failed_week_rebuild_is_checkpointed_and_retried(mongo_db, warehouse, tmp_path):
+    log = ChangeLog(mongo_db)
+    token_path = tmp_path / "cdc_token.json"
+    run(log, token_path)
+
+    log.insert("workouts_logs", workout_doc("w1", "2025-01-06", None))
+    run(log, token_path)
+
+    token, failed = cdc_etl.load_checkpoint(str(token_path))
+    assert token == log.events[-1]["_id"]
+    assert failed == {("workouts_logs", "u1", "2025-W2")}
+    assert weekly(mongo_db, "2025-W2", "workout_summary") is None
+
+    # Fixed without a change event reaching this week (e.g. a transient
+    # failure): the next batch retries it anyway.
+    mongo_db.workouts_logs.update_one({"_id": "w1"}, {"$set": {"workout_data.0.weight": [50, 60]}})
+    log.insert("diet_logs", diet_doc("d1", "2025-02-03", 400))
+    run(log, token_path)
+
+    assert cdc_etl.load_checkpoint(str(token_path))[1] == set()
+    assert weekly(mongo_db, "2025-W2", "workout_summary")["totals"]["total_sets"] == 2
+
+
+def test_lost_token_opens_stream_before_catch_up(mongo_db, warehouse, tmp_path, monkeypatch):
+    log = ChangeLog(mongo_db)
+    token_path = tmp_path / "cdc_token.json"
+    cdc_etl.save_checkpoint({"_data": "expired"}, [], str(token_path))
+    mongo_db.diet_logs.insert_one(diet_doc("before", "2025-01-06", 500))
+    calls = []
+
+    def stream_factory(resume_token):
+        if resume_token is not None:
+            raise OperationFailure("resume point no longer in the oplog", code=cdc_etl.CHANGE_STREAM_HISTORY_LOST)
+        calls.append("open")
+        return log.stream(None)
+
+    etl_incremental = warehouse.etl_incremental
+
+    def catch_up_with_concurrent_write(*args, **kwargs):
+        calls.append("catch_up")
+        result = etl_incremental(*args, **kwargs)
+        # Lands after the catch-up read the collection, while the stream is open.
+        log.insert("diet_logs", diet_doc("during", "2025-01-07", 300))
+        return result
+
+    monkeypatch.setattr(warehouse, "etl_incremental", catch_up_with_concurrent_write)
+    cdc_etl.run_cdc(stream_factory=stream_factory, batch_size=100, batch_seconds=60, token_path=str(token_path))
+
+    assert calls == ["open", "catch_up"]
+    assert daily_calories(warehouse) == {"2025-01-06": 500, "2025-01-07": 300}
+    w2 = weekly(mongo_db, "2025-W2", "nutrition_summary")
+    assert w2["weekly_totals"]["total_calories"] == 800 and w2["days_logged"] == 2
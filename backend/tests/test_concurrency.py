@@ -0,0 +1,54 @@
+import time
+import anyio
+import httpx
+import pytest
+from fastapi import FastAPI
+from api.routes import calories_route, query_route
+
+SLOW_QUERY_SECONDS = 1.0
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def app(monkeypatch):
+    def slow_answer(payload):
+        time.sleep(SLOW_QUERY_SECONDS)
+        return "answer"
+
+    monkeypatch.setattr(query_route, "query_answer_sevice", slow_answer)
+    monkeypatch.setattr(calories_route, "view_calories", lambda user_id, date: {"user_id": user_id, "date": date})
+    app = FastAPI()
+    app.include_router(query_route.router)
+    app.include_router(calories_route.router)
+    return app
+
+
+@pytest.mark.anyio
+async def test_slow_query_answer_does_not_delay_calories_view(app):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        results = {}
+
+        async def slow_query():
+            results["query"] = await client.post("/query/answer", json={"user_id": "u1", "query": "how am I doing?"})
+            results["query_done"] = time.perf_counter()
+
+        async with anyio.create_task_group() as tg:
+            fired = time.perf_counter()
+            tg.start_soon(slow_query)
+            await anyio.sleep(0.1)  # /query/answer is now blocked in its worker thread
+
+            view = await client.get("/calories/view", params={"user_id": "u1", "date": "2025-01-01"})
+            view_done = time.perf_counter()
+
+        assert view.status_code == 200
+        assert view.json()["calorie_data"] == {"user_id": "u1", "date": "2025-01-01"}
+        # Measured from when the slow request was fired: with the service run on
+        # the event loop, even the sleep above would have waited for it.
+        assert view_done - fired < SLOW_QUERY_SECONDS / 2
+        assert view_done < results["query_done"]
+        assert results["query"].json() == {"success": True, "answer": "answer"}
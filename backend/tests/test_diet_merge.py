@@ -0,0 +1,209 @@
+import datetime
+import pytest
+from api.services.calories_service import build_diet_merge_pipeline, merge_incoming_meals
+
+# mongomock cannot run this pipeline ($mergeObjects, $reduce, $switch are not
+# implemented), so apply_update() below runs the generated stages with the
+# handful of aggregation operators they use, following MongoDB semantics.
+
+
+def _path(value, parts):
+    for part in parts:
+        if isinstance(value, list):
+            value = [v[part] for v in value if isinstance(v, dict) and part in v]
+        elif isinstance(value, dict):
+            value = value.get(part)
+        else:
+            return None
+    return value
+
+
+def _eval(expr, doc, env):
+    if isinstance(expr, str) and expr.startswith("$$"):
+        name, *parts = expr[2:].split(".")
+        return _path(env[name], parts)
+    if isinstance(expr, str) and expr.startswith("$"):
+        return _path(doc, expr[1:].split("."))
+    if isinstance(expr, list):
+        return [_eval(e, doc, env) for e in expr]
+    if not isinstance(expr, dict):
+        return expr
+    if not expr or not next(iter(expr)).startswith("$"):
+        return {k: _eval(v, doc, env) for k, v in expr.items()}
+
+    (op, arg), = expr.items()
+    def ev(sub, /, **bound):
+        return _eval(sub, doc, {**env, **bound})
+
+    if op == "$literal":
+        return arg
+    if op == "$ifNull":
+        value = ev(arg[0])
+        return ev(arg[1]) if value is None else value
+    if op == "$map":
+        return [ev(arg["in"], **{arg["as"]: x}) for x in ev(arg["input"])]
+    if op == "$filter":
+        return [x for x in ev(arg["input"]) if ev(arg["cond"], **{arg["as"]: x})]
+    if op == "$reduce":
+        acc = ev(arg["initialValue"])
+        for x in ev(arg["input"]):
+            acc = ev(arg["in"], value=acc, this=x)
+        return acc
+    if op == "$let":
+        return ev(arg["in"], **{k: ev(v) for k, v in arg["vars"].items()})
+    if op == "$switch":
+        for branch in arg["branches"]:
+            if ev(branch["case"]):
+                return ev(branch["then"])
+        return ev(arg["default"])
+    if op == "$cond":
+        return ev(arg[1]) if ev(arg[0]) else ev(arg[2])
+    if op == "$mergeObjects":
+        merged = {}
+        for part in arg:
+            merged.update(ev(part) or {})
+        return merged
+    if op == "$concatArrays":
+        return [x for part in arg for x in ev(part)]
+    if op == "$eq":
+        return ev(arg[0]) == ev(arg[1])
+    if op == "$in":
+        return ev(arg[0]) in ev(arg[1])
+    if op == "$not":
+        return not ev(arg[0])
+    if op == "$toLower":
+        return (ev(arg) or "").lower()
+    if op == "$toDouble":
+        return float(ev(arg))
+    if op == "$add":
+        return sum(ev(a) for a in arg)
+    if op == "$sum":
+        return sum(ev(arg))
+    if op == "$round":
+        return round(ev(arg[0]), arg[1])
+    raise NotImplementedError(op)
+
+
+def apply_update(doc, pipeline):
+    # Each $set stage sees the output of the previous one.
+    for stage in pipeline:
+        (op, fields), = stage.items()
+        assert op == "$set"
+        doc = {**doc, **{k: _eval(v, doc, {}) for k, v in fields.items()}}
+    return doc
+
+
+def item(food, calories, quantity=1, weight=100, proteins=1.0):
+    return {"food": food, "quantity": quantity, "weight": weight, "calories": calories,
+            "proteins": proteins, "fats": 1.0, "carbs": 2.0, "fiber": 0.5}
+
+
+def meal(meal_type, *items):
+    return {"meal_type": meal_type, "items": list(items)}
+
+
+def foods(doc, meal_type):
+    m = next(m for m in doc["plan_data"] if m["meal_type"] == meal_type)
+    return {i["food"]: (i["quantity"], i["weight"], i["calories"]) for i in m["items"]}
+
+
+def meal_summary(doc, meal_type):
+    return next(m for m in doc["plan_data"] if m["meal_type"] == meal_type)["meal_summary"]
+
+
+NEW_DAY = {"user_id": "u1", "date": "2025-01-06"}
+
+
+def test_merge_incoming_meals_folds_duplicate_foods_per_meal():
+    incoming = [
+        meal("lunch", item("Rice", 130), item("rice", 65, weight=50), item("dal", 120)),
+        meal("lunch", item("RICE", 10, weight=10)),
+        meal("dinner", item("rice", 200)),
+        {"items": [item("orphan", 1)]},
+    ]
+    merged = merge_incoming_meals(incoming)
+
+    assert list(merged) == ["lunch", "dinner"]
+    lunch = {i["food"]: i for i in merged["lunch"]}
+    assert set(lunch) == {"Rice", "dal"}
+    assert (lunch["Rice"]["quantity"], lunch["Rice"]["weight"], lunch["Rice"]["calories"]) == (3, 160, 205)
+    assert merged["dinner"] == [item("rice", 200)]
+    assert incoming[0]["items"][0] == item("Rice", 130)
+
+
+def test_upsert_creates_missing_day():
+    doc = apply_update(NEW_DAY, build_diet_merge_pipeline([
+        meal("breakfast", item("oats", 150.555, proteins=5.333)),
+        meal("lunch", item("rice", 130), item("Rice", 130)),
+    ]))
+
+    assert [m["meal_type"] for m in doc["plan_data"]] == ["breakfast", "lunch"]
+    assert foods(doc, "lunch") == {"rice": (2, 200, 260)}
+    assert meal_summary(doc, "breakfast") == {
+        "total_calories": 150.56, "total_protein": 5.33, "total_fat": 1.0, "total_carb": 2.0, "total_fiber": 0.5
+    }
+    summary = dict(doc["summary"])
+    assert datetime.datetime.fromisoformat(summary.pop("created_at"))
+    assert summary == {"total_calories": 410.56, "total_protein": 7.33, "total_fat": 3.0, "total_carb": 6.0, "total_fiber": 1.5}
+    assert isinstance(doc["created_at"], datetime.datetime)
+
+
+def test_merges_into_existing_meal_and_keeps_other_meals():
+    day = apply_update(NEW_DAY, build_diet_merge_pipeline([
+        meal("breakfast", item("oats", 150)),
+        meal("lunch", item("Rice", 130), item("dal", 120)),
+    ]))
+    created_at = day["created_at"]
+
+    doc = apply_update(day, build_diet_merge_pipeline([meal("lunch", item("rice", 65, weight=50), item("curd", 60))]))
+
+    assert foods(doc, "lunch") == {"Rice": (2, 150, 195), "dal": (1, 100, 120), "curd": (1, 100, 60)}
+    assert [i["food"] for i in doc["plan_data"][1]["items"]] == ["Rice", "dal", "curd"]
+    assert meal_summary(doc, "lunch")["total_calories"] == 375
+    assert doc["plan_data"][0] == day["plan_data"][0]
+    assert doc["summary"]["total_calories"] == 525
+    assert doc["created_at"] == created_at
+
+
+def test_adds_new_meal_after_existing_ones():
+    day = apply_update(NEW_DAY, build_diet_merge_pipeline([meal("lunch", item("rice", 130))]))
+
+    doc = apply_update(day, build_diet_merge_pipeline([meal("dinner", item("egg", 70), item("Egg", 70))]))
+
+    assert [m["meal_type"] for m in doc["plan_data"]] == ["lunch", "dinner"]
+    assert foods(doc, "dinner") == {"egg": (2, 200, 140)}
+    assert meal_summary(doc, "dinner")["total_calories"] == 140
+    assert doc["summary"]["total_calories"] == 270
+
+
+def test_stored_duplicate_foods_are_collapsed_once():
+    # Docs written before the merge folded items can hold the same food twice.
+    stored = {**NEW_DAY, "plan_data": [
+        {"meal_type": "lunch", "items": [item("egg", 70), item("Egg", 70), item("rice", 130)], "meal_summary": {}},
+    ]}
+
+    doc = apply_update(stored, build_diet_merge_pipeline([meal("lunch", item("EGG", 70))]))
+
+    assert foods(doc, "lunch") == {"egg": (3, 300, 210), "rice": (1, 100, 130)}
+    assert doc["summary"]["total_calories"] == 340
+
+
+def test_food_names_are_literals():
+    # User-supplied names must never be read as field paths or operators.
+    doc = apply_update(NEW_DAY, build_diet_merge_pipeline([meal("lunch", item("$user_id", 10))]))
+    doc = apply_update(doc, build_diet_merge_pipeline([meal("lunch", item("$user_id", 10))]))
+    assert foods(doc, "lunch") == {"$user_id": (2, 200, 20)}
+
+
+def test_pipeline_shape():
+    pipeline = build_diet_merge_pipeline([meal("lunch", item("rice", 130))])
+    assert [list(stage) for stage in pipeline] == [["$set"], ["$set"]]
+    assert set(pipeline[0]["$set"]) == {"plan_data", "created_at"}
+    assert set(pipeline[1]["$set"]) == {"summary"}
+
+
+@pytest.mark.parametrize("incoming", [[], [{"items": [item("rice", 1)]}]])
+def test_no_meals_leaves_plan_unchanged(incoming):
+    day = apply_update(NEW_DAY, build_diet_merge_pipeline([meal("lunch", item("rice", 130))]))
+    doc = apply_update(day, build_diet_merge_pipeline(incoming))
+    assert doc["plan_data"] == day["plan_data"]
@@ -0,0 +1,67 @@
+import json
+import time
+from functools import partial
+from types import SimpleNamespace
+import pytest
+from tracker import calories_track, fallback_cal
+
+FAST = 0.05
+SLOW = 1.0
+
+
+class StubModels:
+    # generate_content that takes FAST seconds per food (SLOW for "slow ...")
+    # and, like the SDK, gives up with an error once the request's own
+    # http_options timeout has passed.
+    def __init__(self):
+        self.calls = []
+
+    def generate_content(self, model, contents, config):
+        food = contents[0].parts[0].text.split(",")[0]
+        self.calls.append(food)
+        delay = SLOW if food.startswith("slow") else FAST
+        timeout = config.http_options.timeout / 1000
+        time.sleep(min(delay, timeout))
+        if delay > timeout:
+            raise TimeoutError(f"{food} timed out")
+        data = {"food": food, "quantity": 1, "weight": 100, "calories": 200, "proteins": 10, "fats": 5, "carbs": 20, "fiber": 2}
+        part = SimpleNamespace(text=json.dumps(data))
+        return SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))])
+
+
+@pytest.fixture
+def stub_models(monkeypatch):
+    models = StubModels()
+    monkeypatch.setattr(fallback_cal, "get_gemini_client", lambda *args: SimpleNamespace(models=models))
+    return models
+
+
+def test_queued_foods_get_their_own_timeout(stub_models):
+    # Ten foods on two workers take five waves of FAST each: well past one
+    # call's timeout in total, but every call finishes within its own.
+    foods = [("slow curry", 100)] + [(f"food {i}", 100) for i in range(9)]
+    results = fallback_cal.estimate_foods_with_llm(foods, max_workers=2, timeout=0.2)
+
+    assert sorted(stub_models.calls) == sorted(f for f, _ in foods)
+    assert set(results) == {f"food {i}" for i in range(9)}
+    assert results["food 8"]["calories"] == 200
+
+
+def test_enrich_with_macros_reports_foods_it_could_not_estimate(stub_models, monkeypatch):
+    monkeypatch.setattr(calories_track, "get_food_macros_bulk", lambda names: {
+        "rice": {"calories_100g": 130.0, "protein_100g": 2.7, "carbs_100g": 28.0, "fat_100g": 0.3, "fiber_100g": 0.4}
+    })
+    monkeypatch.setattr(calories_track, "insert_food_macros_100g", lambda **kwargs: None)
+    monkeypatch.setattr(calories_track, "estimate_foods_with_llm", partial(fallback_cal.estimate_foods_with_llm, timeout=0.2))
+
+    result = calories_track.enrich_with_macros({"meals": [
+        {"meal_type": "lunch", "items": [
+            {"food": "rice", "quantity": 1, "weight": 200},
+            {"food": "paneer", "quantity": 1, "weight": 100},
+            {"food": "slow curry", "quantity": 1, "weight": 150},
+        ]},
+    ]})
+
+    assert [i["food"] for i in result["meals"][0]["items"]] == ["rice", "paneer"]
+    assert result["meals"][0]["items"][0]["calories"] == 260.0
+    assert result["unresolved_items"] == [{"meal_type": "lunch", "food": "slow curry", "quantity": 1, "weight": 150}]
@@ -0,0 +1,70 @@
+import pytest
+from tracker.local_parser import parse_simple_log
+
+CATALOG = {"rice", "egg", "apple", "chicken breast", "oats", "milk"}
+
+
+def items(parsed, meal_type):
+    return next(m["items"] for m in parsed["meals"] if m["meal_type"] == meal_type)
+
+
+@pytest.mark.parametrize("text, food, weight", [
+    ("200g rice for lunch", "rice", 200.0),
+    ("200 gms rice for lunch", "rice", 200.0),
+    ("0.5 kg rice for lunch", "rice", 500.0),
+    ("250 ml of milk for lunch", "milk", 250.0),
+    ("I had a 150 g apple for lunch", "apple", 150.0),
+    ("120g eggs for lunch", "egg", 120.0),
+])
+def test_explicit_mass(text, food, weight):
+    assert parse_simple_log(text, CATALOG) == {
+        "meals": [{"meal_type": "lunch", "items": [{"food": food, "quantity": 1, "weight": weight}]}]
+    }
+
+
+@pytest.mark.parametrize("text", [
+    "2 eggs breakfast",
+    "4 eggs for breakfast",
+    "two eggs for breakfast",
+    "half egg for snacks",
+    "an apple for lunch",
+    "egg for breakfast",
+    "two 100g eggs for breakfast",
+])
+def test_counts_without_mass_fall_back(text):
+    assert parse_simple_log(text, CATALOG) is None
+
+
+def test_multiple_items_and_meals():
+    parsed = parse_simple_log("100g oats and 250ml milk for breakfast, 200g rice + 150g chicken breast for dinner", CATALOG)
+    assert [m["meal_type"] for m in parsed["meals"]] == ["breakfast", "dinner"]
+    assert items(parsed, "breakfast") == [
+        {"food": "oats", "quantity": 1, "weight": 100.0},
+        {"food": "milk", "quantity": 1, "weight": 250.0},
+    ]
+    assert [i["food"] for i in items(parsed, "dinner")] == ["rice", "chicken breast"]
+
+
+@pytest.mark.parametrize("text", [
+    "200g rice and 2 eggs for lunch",
+    "200g rice and 100g biryani for lunch",
+    "200g rice and some eggs for lunch",
+])
+def test_any_unparsed_item_returns_none(text):
+    assert parse_simple_log(text, CATALOG) is None
+
+
+@pytest.mark.parametrize("text, meal_type", [
+    ("for breakfast 100g oats", "breakfast"),
+    ("100g oats at breakfast", "breakfast"),
+    ("150g apple for snacks", "snack"),
+    ("150g apple snack", "snack"),
+    ("200g rice during my dinner", "dinner"),
+])
+def test_meal_keyword(text, meal_type):
+    assert [m["meal_type"] for m in parse_simple_log(text, CATALOG)["meals"]] == [meal_type]
+
+
+@pytest.mark.parametrize("text", ["200g rice", "for lunch", "", "lunch dinner 200g rice"])
+def test_missing_or_ambiguous_meal_returns_none(text):
+    assert parse_simple_log(text, CATALOG) is None
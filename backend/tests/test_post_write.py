@@ -0,0 +1,155 @@
+import threading
+import pytest
+from trigger import post_write
+from trigger.post_write import PostWriteQueue
+
+WAIT = 5
+
+
+class Handler:
+    # Records calls; a key listed in block waits for release() before returning.
+    def __init__(self, block=()):
+        self.calls = []
+        self.block = set(block)
+        self.started = threading.Event()
+        self.gate = threading.Event()
+        self.lock = threading.Lock()
+
+    def __call__(self, user_id, date, payload):
+        with self.lock:
+            self.calls.append(((user_id, date), dict(payload)))
+        if (user_id, date) in self.block:
+            self.started.set()
+            assert self.gate.wait(WAIT)
+
+    def release(self):
+        self.gate.set()
+
+
+def test_burst_for_one_day_coalesces_into_one_job():
+    handler = Handler(block=[("busy", "d")])
+    queue = PostWriteQueue(handler, workers=1)
+    queue.submit("busy", "d", {})
+    assert handler.started.wait(WAIT)
+
+    # The only worker is busy, so these all wait in the queue together.
+    queue.submit("u1", "2025-01-06", {"diet_summary": {"total_calories": 100}})
+    queue.submit("u1", "2025-01-06", {"diet_summary": {"total_calories": 250}})
+    queue.submit("u1", "2025-01-06", {"workout_summary": {"total_sets": 3}})
+    queue.submit("u2", "2025-01-06", {})
+    handler.release()
+    assert queue.drain(WAIT)
+
+    assert handler.calls[1:] == [
+        (("u1", "2025-01-06"), {"diet_summary": {"total_calories": 250}, "workout_summary": {"total_sets": 3}}),
+        (("u2", "2025-01-06"), {}),
+    ]
+    assert queue.stats()["coalesced"] == 2
+    assert queue.stats()["processed"] == 3
+
+
+def test_submit_while_running_reruns_once_after():
+    handler = Handler(block=[("u1", "d")])
+    queue = PostWriteQueue(handler, workers=2)
+    queue.submit("u1", "d", {"diet_summary": {"v": 1}})
+    assert handler.started.wait(WAIT)
+
+    # A second worker is free, but the same day must not run concurrently.
+    queue.submit("u1", "d", {"diet_summary": {"v": 2}})
+    queue.submit("u1", "d", {"workout_summary": {"v": 3}})
+    stats = queue.stats()
+    assert (stats["pending"], stats["running"]) == (1, 1)
+    assert len(handler.calls) == 1
+
+    handler.release()
+    assert queue.drain(WAIT)
+    assert handler.calls == [
+        (("u1", "d"), {"diet_summary": {"v": 1}}),
+        (("u1", "d"), {"diet_summary": {"v": 2}, "workout_summary": {"v": 3}}),
+    ]
+    assert queue.stats()["coalesced"] == 1
+
+
+def test_drain_waits_for_queued_and_running_jobs():
+    handler = Handler(block=[("u0", "d")])
+    queue = PostWriteQueue(handler, workers=2)
+    for i in range(6):
+        queue.submit(f"u{i}", "d", {})
+    assert handler.started.wait(WAIT)
+
+    assert queue.drain(timeout=0.2) is False
+    handler.release()
+    assert queue.drain(WAIT) is True
+    assert sorted(k for k, _ in handler.calls) == [(f"u{i}", "d") for i in range(6)]
+    assert queue.stats()["pending"] == 0 and queue.stats()["running"] == 0
+
+
+def test_failing_job_does_not_stop_the_worker():
+    calls = []
+
+    def handler(user_id, date, payload):
+        calls.append(user_id)
+        if user_id == "bad":
+            raise RuntimeError("boom")
+
+    queue = PostWriteQueue(handler, workers=1)
+    queue.submit("bad", "d", {})
+    queue.submit("good", "d", {})
+    assert queue.drain(WAIT)
+    assert calls == ["bad", "good"]
+
+
+def test_durable_queue_replays_unfinished_jobs(tmp_path):
+    path = str(tmp_path / "post_write.sqlite")
+    stuck = Handler(block=[("u1", "d1")])
+    first = PostWriteQueue(stuck, workers=1, path=path)
+    first.submit("u1", "d1", {"diet_summary": {"total_calories": 100}})
+    assert stuck.started.wait(WAIT)
+    first.submit("u1", "d1", {"workout_summary": {"total_sets": 3}})
+    first.submit("u2", "d1", {})
+
+    # A new process over the same file (the first one "crashed" mid-job)
+    # runs every job that was not finished, with its merged payload.
+    replayed = Handler()
+    second = PostWriteQueue(replayed, workers=1, path=path)
+    assert second.drain(WAIT)
+    assert sorted(replayed.calls) == [
+        (("u1", "d1"), {"diet_summary": {"total_calories": 100}, "workout_summary": {"total_sets": 3}}),
+        (("u2", "d1"), {}),
+    ]
+    stuck.release()
+    assert first.drain(WAIT)
+
+    # Finished jobs are cleared from the file.
+    third = PostWriteQueue(Handler(), workers=1, path=path)
+    assert third.stats()["pending"] == 0 and third.stats()["durable"] is True
+
+
+def test_run_post_write_job_guards_each_step(monkeypatch):
+    progress = []
+
+    def broken_trigger(*args):
+        raise RuntimeError("summary collection unavailable")
+
+    monkeypatch.setattr(post_write, "handle_summary_trigger", broken_trigger)
+    monkeypatch.setattr(post_write, "handle_wo_summary_trigger", broken_trigger)
+    monkeypatch.setattr(post_write, "update_daily_progress", lambda user_id, date: progress.append((user_id, date)))
+
+    post_write.run_post_write_job("u1", "d", {"diet_summary": {}, "workout_summary": {}})
+    assert progress == [("u1", "d")]
+
+
+@pytest.mark.parametrize("async_mode", [False, True])
+def test_inline_mode_runs_job_on_the_caller(monkeypatch, async_mode):
+    inline, queued = [], []
+    monkeypatch.setattr(post_write, "POST_WRITE_ASYNC", async_mode)
+    monkeypatch.setattr(post_write, "run_post_write_job", lambda *args: inline.append((args, threading.current_thread())))
+    monkeypatch.setattr(post_write.post_write_queue, "submit", lambda *args: queued.append(args))
+
+    post_write.enqueue_post_write("u1", "d", diet_summary={"total_calories": 1})
+
+    expected = ("u1", "d", {"diet_summary": {"total_calories": 1}})
+    if async_mode:
+        assert queued == [expected] and inline == []
+    else:
+        assert inline == [(expected, threading.current_thread())] and queued == []
@@ -0,0 +1,140 @@
+import copy
+import pytest
+from pymongo.errors import OperationFailure
+from tracker import progress_tracker
+from tracker.progress_tracker import aggregate_and_adapt_week, compute_week_adaptation, week_dates
+from tests.test_batch_adapt import WEEK_START, make_inputs
+
+COLLECTIONS = ("progress_col", "macro_collection", "progress_weekly_col")
+
+
+def seed(mongo_db, inputs):
+    for user_id, inp in inputs.items():
+        for doc in inp["docs"]:
+            progress_tracker.progress_col.insert_one(copy.deepcopy(doc))
+        if inp["plan"] is not None:
+            progress_tracker.macro_collection.insert_one({"user_id": user_id, **copy.deepcopy(inp["plan"])})
+        if inp["last_week_number"] is not None:
+            for week_number in range(inp["last_week_number"] + 1):
+                progress_tracker.progress_weekly_col.insert_one({"user_id": user_id, "week_number": week_number})
+
+
+def union_with_aggregate(collection):
+    # mongomock has no $unionWith: run the base stages, then each branch on
+    # its own collection, and concatenate like the server does.
+    aggregate = type(collection).aggregate
+    database = collection.database
+
+    def run(pipeline):
+        cut = next((i for i, s in enumerate(pipeline) if "$unionWith" in s), len(pipeline))
+        docs = list(aggregate(collection, pipeline[:cut]))
+        for stage in pipeline[cut:]:
+            branch = stage["$unionWith"]
+            docs += list(aggregate(database[branch["coll"]], branch["pipeline"]))
+        return iter(docs)
+    return run
+
+
+def apply_bulk(collection):
+    # This mongomock cannot take the installed pymongo's UpdateOne objects in
+    # bulk_write; apply each upsert on its own.
+    def run(ops, ordered=True):
+        for op in ops:
+            collection.update_one(op._filter, op._doc, upsert=op._upsert)
+    return run
+
+
+@pytest.fixture
+def calls(mongo_db, monkeypatch):
+    # Every command the rollover sends, as (collection, method); calls that
+    # mongomock makes internally while serving one are not counted.
+    log = []
+    depth = [0]
+    monkeypatch.setattr(progress_tracker.progress_col, "aggregate", union_with_aggregate(progress_tracker.progress_col))
+    for attr in COLLECTIONS:
+        collection = getattr(progress_tracker, attr)
+        monkeypatch.setattr(collection, "bulk_write", apply_bulk(collection))
+        for method in ("find", "find_one", "aggregate", "update_one", "bulk_write"):
+            original = getattr(collection, method)
+
+            def wrapped(*args, _original=original, _key=(attr, method), **kwargs):
+                if not depth[0]:
+                    log.append(_key)
+                depth[0] += 1
+                try:
+                    return _original(*args, **kwargs)
+                finally:
+                    depth[0] -= 1
+            monkeypatch.setattr(collection, method, wrapped)
+    return log
+
+
+def rollover_all(inputs):
+    results = {}
+    for user_id, inp in inputs.items():
+        if inp["docs"]:
+            results[user_id] = aggregate_and_adapt_week(user_id, WEEK_START)
+    return results
+
+
+def stored_state():
+    skip = ("_id", "created_at", "generated_at", "updated_at")
+    strip = lambda docs: sorted(({k: v for k, v in d.items() if k not in skip} for d in docs), key=repr)
+    return strip(progress_tracker.progress_col.find()), strip(progress_tracker.progress_weekly_col.find())
+
+
+def without_timestamps(results):
+    out = copy.deepcopy(results)
+    for result in out.values():
+        result["weekly_summary"].pop("generated_at")
+    return out
+
+
+def test_rollover_reads_inputs_with_one_aggregate(mongo_db, calls):
+    inputs = make_inputs(seed=7, n_users=40)
+    seed(mongo_db, inputs)
+
+    for user_id, inp in inputs.items():
+        if not inp["docs"]:
+            continue
+        del calls[:]
+        result = aggregate_and_adapt_week(user_id, WEEK_START)
+
+        assert calls == [
+            ("progress_col", "aggregate"),
+            ("progress_weekly_col", "update_one"),
+            ("progress_col", "bulk_write"),
+        ]
+        expected = compute_week_adaptation(
+            user_id, WEEK_START, sorted(inp["docs"], key=lambda d: d["date"]), inp["plan"], inp["last_week_number"]
+        )
+        expected.pop("generated_at")
+        assert {k: v for k, v in result["weekly_summary"].items() if k != "generated_at"} == expected
+        assert result["generated_next_week"]["created_dates"] == week_dates("2025-03-10")
+        assert progress_tracker.progress_weekly_col.find_one({"user_id": user_id, "start_date": WEEK_START})
+
+
+def test_combined_and_fallback_reads_agree(mongo_db, calls, monkeypatch):
+    inputs = make_inputs(seed=8, n_users=40)
+
+    seed(mongo_db, inputs)
+    combined = rollover_all(inputs)
+    combined_state = stored_state()
+
+    def unsupported(pipeline):
+        raise OperationFailure("$unionWith is not allowed")
+
+    for name in list(mongo_db.list_collection_names()):
+        mongo_db.drop_collection(name)
+    seed(mongo_db, inputs)
+    monkeypatch.setattr(progress_tracker.progress_col, "aggregate", unsupported)
+    fallback = rollover_all(inputs)
+
+    assert without_timestamps(combined) == without_timestamps(fallback)
+    assert combined_state == stored_state()
+
+
+def test_no_progress_docs_raises_before_writing(mongo_db, calls):
+    with pytest.raises(ValueError):
+        aggregate_and_adapt_week("nobody", WEEK_START)
+    assert calls == [("progress_col", "aggregate")]
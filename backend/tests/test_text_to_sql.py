@@ -0,0 +1,71 @@
+import datetime
+import duckdb
+import pytest
+from sql_query import text_to_sql_prog, text_to_sql_runner
+from sql_query.text_to_sql_runner import connect_analytics
+
+
+def diet_doc(doc_id, day):
+    return {
+        "_id": doc_id,
+        "user_id": "u1",
+        "date": day,
+        "plan_data": [{"meal_type": "lunch", "items": [{"food": "rice", "quantity": 1, "weight": 200, "calories": 260.0}]}],
+        "summary": {"created_at": datetime.datetime(2025, 1, 1).isoformat()},
+    }
+
+
+def database_name(con):
+    return con.execute("SELECT current_database()").fetchone()[0]
+
+
+def test_reads_parquet_export_and_falls_back_after_failed_export(warehouse, monkeypatch):
+    parquet_dir = warehouse.PARQUET_DIR
+    warehouse.apply_doc_changes({"diet_logs": [diet_doc("d1", "2025-01-01")]}, {})
+
+    con = connect_analytics(warehouse.DUCKDB_PATH, "u1", parquet_dir)
+    assert database_name(con) == "memory"
+    assert con.execute("SELECT count(*) FROM foods").fetchone()[0] == 1
+    con.close()
+
+    def broken_export(full=False):
+        raise OSError("disk full")
+
+    export_parquet = warehouse.export_parquet
+    monkeypatch.setattr(warehouse, "export_parquet", broken_export)
+    warehouse.apply_doc_changes({"diet_logs": [diet_doc("d2", "2025-01-02")]}, {})
+    assert warehouse.get_parquet_export_state() == "failed"
+    warehouse.con.close()  # the file can only be opened read-only once the writer lets go
+
+    con = connect_analytics(warehouse.DUCKDB_PATH, "u1", parquet_dir)
+    assert database_name(con) == "trainer"
+    assert con.execute("SELECT count(*) FROM foods").fetchone()[0] == 2
+    con.close()
+
+    df = text_to_sql_prog.execute_sql_on_duckdb(
+        "SELECT count(*) AS n FROM foods WHERE user_id = 'u1'", duckdb_path=warehouse.DUCKDB_PATH, user_id="u1"
+    )
+    assert df["n"].tolist() == [2]
+
+    # The next successful run re-exports everything and readers go back to Parquet.
+    monkeypatch.setattr(warehouse, "con", duckdb.connect(warehouse.DUCKDB_PATH))
+    monkeypatch.setattr(warehouse, "export_parquet", export_parquet)
+    warehouse.apply_doc_changes({"diet_logs": [diet_doc("d3", "2025-02-01")]}, {})
+    assert warehouse.get_parquet_export_state() == "ok"
+    con = connect_analytics(warehouse.DUCKDB_PATH, "u1", parquet_dir)
+    assert database_name(con) == "memory"
+    assert con.execute("SELECT count(*) FROM foods").fetchone()[0] == 3
+    con.close()
+    warehouse.con.close()
+
+
+@pytest.mark.parametrize("runner", [text_to_sql_prog, text_to_sql_runner])
+def test_system_message_lists_every_warehouse_table(warehouse, runner):
+    # Both entry points query the same warehouse, so both prompts must name
+    # every table it holds (except the ETL's own bookkeeping).
+    tables = {
+        row[0] for row in warehouse.con.execute("SELECT table_name FROM information_schema.tables").fetchall()
+    } - {warehouse.ETL_METADATA_TABLE}
+    message = runner.build_system_message("u1")
+    assert {t for t in tables if f"{t}(" not in message} == set()
+    assert "user_id='u1'" in message.replace(" ", "")
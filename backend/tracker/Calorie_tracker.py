@@ -1,53 +1,53 @@
 import os
 import requests
 import json
-from google import genai
-from google.genai import types
+from functools import lru_cache
+from clients import get_gemini_client
 from dotenv import load_dotenv  
 load_dotenv()
-try:
-    api_key=os.getenv("CALORIES_GEMINI_KEY")
-    client_gemini = genai.Client(api_key=api_key)
-except Exception as e:
-    print(f"Error initializing Gemini client: {e}")
-    client_gemini = None
 MODEL_NAME = "gemini-2.5-flash" 
-FoodItem = types.Schema(
-    type=types.Type.OBJECT,
-    properties={
-        "food": types.Schema(type=types.Type.STRING, description="Name of the food item."),
-        "quantity": types.Schema(type=types.Type.NUMBER, description="Number of servings or items."),
-        "weight": types.Schema(type=types.Type.NUMBER, description="Weight of the item in grams."),
-        "calories": types.Schema(type=types.Type.NUMBER, description="Total energy content (kcal)."),
-        "proteins": types.Schema(type=types.Type.NUMBER, description="Protein in grams."),
-        "fats": types.Schema(type=types.Type.NUMBER, description="Total fat in grams."),
-        "carbs": types.Schema(type=types.Type.NUMBER, description="Total carbohydrates in grams."),
-        "fiber": types.Schema(type=types.Type.NUMBER, description="Dietary fiber in grams."),
-    }
-)
+@lru_cache(maxsize=None)
+def food_day_schema():
+    from google.genai import types
+    FoodItem = types.Schema(
+        type=types.Type.OBJECT,
+        properties={
+            "food": types.Schema(type=types.Type.STRING, description="Name of the food item."),
+            "quantity": types.Schema(type=types.Type.NUMBER, description="Number of servings or items."),
+            "weight": types.Schema(type=types.Type.NUMBER, description="Weight of the item in grams."),
+            "calories": types.Schema(type=types.Type.NUMBER, description="Total energy content (kcal)."),
+            "proteins": types.Schema(type=types.Type.NUMBER, description="Protein in grams."),
+            "fats": types.Schema(type=types.Type.NUMBER, description="Total fat in grams."),
+            "carbs": types.Schema(type=types.Type.NUMBER, description="Total carbohydrates in grams."),
+            "fiber": types.Schema(type=types.Type.NUMBER, description="Dietary fiber in grams."),
+        }
+    )
+
+    FoodMeal = types.Schema(
+        type=types.Type.OBJECT,
+        properties={
+            "meal_type": types.Schema(type=types.Type.STRING, description="The category of the meal (e.g., 'breakfast', 'snack')."),
+            "items": types.Schema(
+                type=types.Type.ARRAY, 
+                items=FoodItem,
+                description="List of all food items in the meal."
+            ),
+        }
+    )
+
+    FoodDaySchema = types.Schema(
+        type=types.Type.OBJECT,
+        properties={
+            "meals": types.Schema(
+                type=types.Type.ARRAY, 
+                items=FoodMeal,
+                description="List of all meals consumed throughout the day."
+            ),
+        }
+    )
+    return FoodDaySchema
 
-FoodMeal = types.Schema(
-    type=types.Type.OBJECT,
-    properties={
-        "meal_type": types.Schema(type=types.Type.STRING, description="The category of the meal (e.g., 'breakfast', 'snack')."),
-        "items": types.Schema(
-            type=types.Type.ARRAY, 
-            items=FoodItem,
-            description="List of all food items in the meal."
-        ),
-    }
-)
 
-FoodDaySchema = types.Schema(
-    type=types.Type.OBJECT,
-    properties={
-        "meals": types.Schema(
-            type=types.Type.ARRAY, 
-            items=FoodMeal,
-            description="List of all meals consumed throughout the day."
-        ),
-    }
-)
 SYSTEM_PROMPT = """
 You are a nutrition parser. 
 Extract foods, estimate macros.
@@ -57,7 +57,9 @@ Avoid text. Output only structured data.
 
 
 def estimate_calories(food_text):
+    from google.genai import types
 
+    client_gemini = get_gemini_client("CALORIES_GEMINI_KEY")
     response = client_gemini.models.generate_content(
     model=MODEL_NAME,
     contents=[
@@ -66,7 +68,7 @@ def estimate_calories(food_text):
     config=types.GenerateContentConfig(
         system_instruction=SYSTEM_PROMPT,
         response_mime_type="application/json",
-        response_schema=FoodDaySchema,
+        response_schema=food_day_schema(),
         candidate_count=1,
     ),
 )
@@ -0,0 +1,322 @@
+import os
+import copy
+import math
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+import numpy as np
+from pymongo import UpdateOne
+from db_connection import progress_col, macro_collection, progress_weekly_col
+from tracker.progress_tracker import (
+    iso_date,
+    parse_date,
+    week_dates,
+    fill_missing_macros,
+    compute_week_adaptation,
+    build_next_week_docs,
+    bulk_upsert_progress_docs,
+)
+
+BATCH_ADAPT_CHUNK = int(os.getenv("BATCH_ADAPT_CHUNK", "1000"))
+
+# Outcome codes of the weight rule, mirrored from compute_week_adaptation.
+NO_WEIGHT, LOSE_ABOVE, LOSE_BELOW, LOSE_ON_TRACK, GAIN_BELOW, GAIN_ABOVE, GAIN_ON_TRACK, NO_GOAL = range(8)
+CALORIE_FACTORS = {LOSE_ABOVE: 0.94, LOSE_BELOW: 1.08, GAIN_BELOW: 1.06, GAIN_ABOVE: 0.95}
+
+
+def _to_float(value) -> float:
+    try:
+        return float(value) if value is not None else math.nan
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _opt(value: float) -> Optional[float]:
+    return None if math.isnan(value) else float(value)
+
+
+def _group_mean(idx: np.ndarray, values: np.ndarray, n: int) -> np.ndarray:
+    # np.bincount adds the weights in input order, the same left-to-right
+    # summation _safe_avg does, so the means match the per-user path exactly.
+    mask = ~np.isnan(values)
+    sums = np.bincount(idx[mask], weights=values[mask], minlength=n)
+    counts = np.bincount(idx[mask], minlength=n)
+    return np.divide(sums, counts, out=np.full(n, np.nan), where=counts > 0)
+
+
+def _docs_by_date(slot: Dict[str, Any]) -> List[Dict[str, Any]]:
+    # Same ordering compute_week_adaptation applies, whatever order the docs
+    # were loaded in.
+    return sorted(slot["docs"], key=lambda d: d["date"])
+
+
+def load_week_inputs(user_weeks: Dict[str, str]) -> Dict[str, Dict[str, Any]]:
+    # user_weeks maps user_id -> week start date. One query per collection per
+    # distinct start date instead of three per user.
+    inputs = {
+        user_id: {"start_date": start, "docs": [], "plan": None, "last_week_number": None}
+        for user_id, start in user_weeks.items()
+    }
+    if not inputs:
+        return inputs
+    user_ids = list(inputs)
+
+    by_start: Dict[str, List[str]] = {}
+    for user_id, start in user_weeks.items():
+        by_start.setdefault(start, []).append(user_id)
+    for start, ids in by_start.items():
+        cursor = progress_col.find({"user_id": {"$in": ids}, "date": {"$in": week_dates(start)}})
+        for doc in cursor:
+            inputs[doc["user_id"]]["docs"].append(doc)
+
+    for plan in macro_collection.find({"user_id": {"$in": user_ids}}):
+        slot = inputs[plan["user_id"]]
+        if slot["plan"] is None:
+            slot["plan"] = plan
+
+    pipeline = [
+        {"$match": {"user_id": {"$in": user_ids}}},
+        {"$group": {"_id": "$user_id", "week_number": {"$max": "$week_number"}}},
+    ]
+    for row in progress_weekly_col.aggregate(pipeline):
+        inputs[row["_id"]]["last_week_number"] = row["week_number"]
+    return inputs
+
+
+def compute_batch_adaptation(inputs: Dict[str, Dict[str, Any]], now: Optional[datetime] = None) -> Dict[str, Dict[str, Any]]:
+    users = [u for u, slot in inputs.items() if slot["docs"]]
+    n = len(users)
+    if not n:
+        return {}
+    docs_by_user = [_docs_by_date(inputs[u]) for u in users]
+
+    # Flatten every progress doc into columns; row order is user, then date.
+    row_user, ach_cal, ach_p, ach_c, ach_f, intensity = [], [], [], [], [], []
+    exp_cal, exp_p, exp_c, exp_f = [], [], [], []
+    w_user, w_val, w_obj = [], [], []
+    for i, docs in enumerate(docs_by_user):
+        for doc in docs:
+            ach = doc.get("achieved", {})
+            exp = doc.get("expected", {})
+            macros = ach.get("macros") or {}
+            exp_macros = exp.get("daily_macros") or {}
+            row_user.append(i)
+            ach_cal.append(_to_float(ach.get("calories")))
+            ach_p.append(_to_float(macros.get("protein_g")))
+            ach_c.append(_to_float(macros.get("carbs_g")))
+            ach_f.append(_to_float(macros.get("fats_g")))
+            intensity.append(_to_float(ach.get("workout_intensity")))
+            exp_cal.append(_to_float(exp.get("daily_calories")))
+            exp_p.append(_to_float(exp_macros.get("protein_g")))
+            exp_c.append(_to_float(exp_macros.get("carbs_g")))
+            exp_f.append(_to_float(exp_macros.get("fats_g")))
+            if ach.get("weight_kg") is not None:
+                w_user.append(i)
+                w_val.append(_to_float(ach.get("weight_kg")))
+                w_obj.append(ach.get("weight_kg"))
+
+    idx = np.asarray(row_user, dtype=np.int64)
+    avg = {
+        name: _group_mean(idx, np.asarray(col, dtype=np.float64), n)
+        for name, col in [
+            ("ach_cal", ach_cal), ("ach_p", ach_p), ("ach_c", ach_c), ("ach_f", ach_f),
+            ("workout", intensity), ("exp_cal", exp_cal),
+            ("exp_p", exp_p), ("exp_c", exp_c), ("exp_f", exp_f),
+        ]
+    }
+
+    # Weight rows are already date-ordered within each user: first/last per
+    # group plus the mean of the last three readings.
+    w_idx = np.asarray(w_user, dtype=np.int64)
+    w_arr = np.asarray(w_val, dtype=np.float64)
+    w_count = np.bincount(w_idx, minlength=n)
+    w_end = np.cumsum(w_count)
+    w_start = w_end - w_count
+    rank_from_end = w_end[w_idx] - 1 - np.arange(len(w_idx))
+    recent_avg = _group_mean(w_idx[rank_from_end < 3], w_arr[rank_from_end < 3], n)
+
+    week_number = np.array(
+        [(inputs[u]["last_week_number"] + 1) if inputs[u]["last_week_number"] is not None else 1 for u in users],
+        dtype=np.int64,
+    )
+    goals = [docs[0].get("goal", "unspecified") for docs in docs_by_user]
+    is_lose = np.array(["lose" in g.lower() for g in goals])
+    is_gain = np.array(["gain" in g.lower() or "muscle" in g.lower() for g in goals]) & ~is_lose
+
+    expected_weight = np.full(n, np.nan)
+    has_expected_weight = np.zeros(n, dtype=bool)
+    for i, u in enumerate(users):
+        weeks = (inputs[u]["plan"] or {}).get("Weekly_Plan")
+        if weeks is not None and len(weeks) >= week_number[i]:
+            value = weeks[week_number[i] - 1].get("expected_weight_kg")
+            if value is not None:
+                expected_weight[i] = value
+                has_expected_weight[i] = True
+
+    # Weight rule, evaluated for all users at once.
+    diff = recent_avg - expected_weight
+    has_weight = has_expected_weight & ~np.isnan(recent_avg)
+    outcome = np.select(
+        [
+            ~has_weight,
+            is_lose & (diff > 0.3), is_lose & (diff < -0.7), is_lose,
+            is_gain & (diff < -0.2), is_gain & (diff > 0.8), is_gain,
+        ],
+        [NO_WEIGHT, LOSE_ABOVE, LOSE_BELOW, LOSE_ON_TRACK, GAIN_BELOW, GAIN_ABOVE, GAIN_ON_TRACK],
+        default=NO_GOAL,
+    )
+
+    base_cal = np.where(~np.isnan(avg["exp_cal"]), avg["exp_cal"], avg["ach_cal"])
+    factor = np.array([CALORIE_FACTORS.get(int(o), math.nan) for o in outcome])
+
+    w_pad = np.append(w_arr, np.nan)
+    first_w = np.where(w_count > 0, w_pad[w_start], np.nan)
+    last_w = np.where(w_count > 0, w_pad[w_end - 1], np.nan)
+    change = last_w - first_w
+    protein_bump = is_lose & (avg["exp_p"] != 0) & ~np.isnan(avg["exp_p"]) & (change > -0.3)
+
+    generated_at = iso_date(now or datetime.utcnow())
+    results = {}
+    for i, user_id in enumerate(users):
+        results[user_id] = _emit_weekly_doc(
+            user_id, inputs[user_id], i, int(week_number[i]), avg, recent_avg, w_count, w_start, w_end, w_obj,
+            float(diff[i]), int(outcome[i]), base_cal, factor, bool(protein_bump[i]), generated_at,
+        )
+    return results
+
+
+def _emit_weekly_doc(user_id, slot, i, week_number, avg, recent_avg, w_count, w_start, w_end, w_obj,
+                     diff, outcome, base_cal, factor, protein_bump, generated_at) -> Dict[str, Any]:
+    # Rounding happens here with Python's round() on Python floats so the
+    # stored values are bit-identical to the per-user path.
+    plan = slot["plan"]
+    docs = _docs_by_date(slot)
+    week_start_date = slot["start_date"]
+    mean = {name: _opt(col[i]) for name, col in avg.items()}
+    recent_avg_weight = _opt(recent_avg[i])
+    first_weight = w_obj[w_start[i]] if w_count[i] else None
+    last_weight = w_obj[w_end[i] - 1] if w_count[i] else None
+    actual_change = (last_weight - first_weight) if (first_weight is not None and last_weight is not None) else None
+
+    next_expected_weight = None
+    if plan and "Weekly_Plan" in plan and len(plan["Weekly_Plan"]) > week_number:
+        next_expected_weight = plan["Weekly_Plan"][week_number].get("expected_weight_kg")
+
+    base = _opt(base_cal[i])
+    adjusted_daily_calories = int(round(base)) if base is not None else None
+    if outcome in CALORIE_FACTORS:
+        adjusted_daily_calories = round((adjusted_daily_calories or mean["ach_cal"] or 0) * float(factor[i]))
+
+    reasons = {
+        NO_WEIGHT: "Insufficient weight data or expected weight missing; falling back to adherence rules.",
+        LOSE_ABOVE: f"Weight above expected by {diff:.2f} kg; reducing calories by ~6%.",
+        LOSE_BELOW: f"Weight below expected by {abs(diff):.2f} kg; increasing calories by ~8%.",
+        LOSE_ON_TRACK: "Weight on track with expected; keeping calories similar.",
+        GAIN_BELOW: f"Weight below expected by {abs(diff):.2f} kg; increasing calories by ~6%.",
+        GAIN_ABOVE: f"Weight above expected by {diff:.2f} kg; reducing calories by ~5%.",
+        GAIN_ON_TRACK: "Gaining as expected; keeping calories stable.",
+        NO_GOAL: "Goal not specified; minor/no adjustment applied.",
+    }
+    adjustment_reason = reasons[outcome]
+
+    adjusted_macros = {"protein_g": mean["exp_p"], "carbs_g": mean["exp_c"], "fats_g": mean["exp_f"]}
+    if protein_bump:
+        adjusted_macros["protein_g"] = round(adjusted_macros["protein_g"] * 1.08)
+        adjustment_reason += " Increased protein by 8% to support fat loss."
+    fill_missing_macros(adjusted_macros, plan, week_number)
+
+    def r2(value):
+        return round(value, 2) if value is not None else None
+
+    avg_workout = mean["workout"]
+    return {
+        "user_id": user_id,
+        "week_number": week_number,
+        "start_date": week_start_date,
+        "end_date": iso_date(parse_date(week_start_date) + timedelta(days=6)),
+        "average_achieved": {
+            "calories": r2(mean["ach_cal"]),
+            "protein_g": r2(mean["ach_p"]),
+            "carbs_g": r2(mean["ach_c"]),
+            "fats_g": r2(mean["ach_f"]),
+            "workout_intensity": r2(avg_workout),
+            "recent_avg_weight_kg": r2(recent_avg_weight),
+            "first_week_weight_kg": r2(first_weight),
+            "last_week_weight_kg": r2(last_weight),
+            "weight_change_kg": r2(actual_change),
+        },
+        "adjusted_targets": {
+            "daily_calories": adjusted_daily_calories,
+            "daily_macros": adjusted_macros,
+            "workout_intensity": avg_workout if avg_workout is not None else (docs[0].get("expected", {}).get("workout_intensity")),
+            "target_weight_kg": next_expected_weight,
+        },
+        "adjustment_reason": adjustment_reason,
+        "generated_at": generated_at,
+    }
+
+
+def _next_week_docs(user_id: str, slot: Dict[str, Any], weekly_doc: Dict[str, Any]) -> List[Dict[str, Any]]:
+    next_start = iso_date(parse_date(slot["start_date"]) + timedelta(days=7))
+    goal = _docs_by_date(slot)[0].get("goal", "unspecified")
+    # build_next_week_docs fills macros in place; keep the weekly doc as computed.
+    targets = copy.deepcopy(weekly_doc["adjusted_targets"])
+    return build_next_week_docs(user_id, targets, next_start, weekly_doc["week_number"] + 1, goal, slot["plan"])
+
+
+def batch_aggregate_and_adapt(user_weeks: Dict[str, str], now: Optional[datetime] = None, chunk: int = BATCH_ADAPT_CHUNK) -> Dict[str, Any]:
+    report = {"adapted": 0, "skipped": [], "errors": []}
+    items = list(user_weeks.items())
+    for pos in range(0, len(items), chunk):
+        part = dict(items[pos:pos + chunk])
+        try:
+            inputs = load_week_inputs(part)
+            weekly_docs = compute_batch_adaptation(inputs, now=now)
+            report["skipped"].extend(u for u in part if u not in weekly_docs)
+
+            weekly_ops = []
+            next_docs = []
+            for user_id, weekly_doc in weekly_docs.items():
+                weekly_ops.append(UpdateOne(
+                    {"user_id": user_id, "week_number": weekly_doc["week_number"], "start_date": weekly_doc["start_date"]},
+                    {"$set": weekly_doc},
+                    upsert=True,
+                ))
+                next_docs.extend(_next_week_docs(user_id, inputs[user_id], weekly_doc))
+            if weekly_ops:
+                progress_weekly_col.bulk_write(weekly_ops, ordered=False)
+            bulk_upsert_progress_docs(next_docs)
+            report["adapted"] += len(weekly_docs)
+        except Exception as e:
+            print(f"❌ Batch adaptation failed for {len(part)} users: {e}")
+            report["errors"].append({"users": list(part), "error": str(e)})
+    return report
+
+
+def check_parity(user_weeks: Dict[str, str], now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    # Runs both engines on the same inputs without writing anything and returns
+    # every user whose weekly doc or next-week docs differ.
+    now = now or datetime.utcnow()
+    inputs = load_week_inputs(user_weeks)
+    batch = compute_batch_adaptation(inputs, now=now)
+    mismatches = []
+    for user_id, slot in inputs.items():
+        if not slot["docs"]:
+            continue
+        expected = compute_week_adaptation(user_id, slot["start_date"], slot["docs"], slot["plan"], slot["last_week_number"], now=now)
+        expected_next = _next_week_docs(user_id, slot, expected)
+        actual = batch.get(user_id)
+        actual_next = _next_week_docs(user_id, slot, actual) if actual else None
+        if actual != expected or actual_next != expected_next:
+            mismatches.append({"user_id": user_id, "per_user": expected, "batch": actual})
+    return mismatches
+
+
+if __name__ == "__main__":
+    import sys
+    import json
+    if len(sys.argv) < 3:
+        print("usage: python -m tracker.batch_adapt <week_start YYYY-MM-DD> <user_id> [user_id ...]")
+        sys.exit(1)
+    start = sys.argv[1]
+    diff = check_parity({u: start for u in sys.argv[2:]})
+    print(json.dumps({"checked": len(sys.argv) - 2, "mismatches": diff}, indent=2, default=str))
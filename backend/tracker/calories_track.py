@@ -1,69 +1,79 @@
 import os
 import requests
 import json
-from google import genai
-from google.genai import types
-import psycopg2
-from tracker.fallback_cal import estimate_food_with_llm
+from typing import Any, Dict, List, Optional, Set
+from functools import lru_cache
+from pg_connection import pg_connection
+from tracker.fallback_cal import estimate_food_with_llm, estimate_foods_with_llm
+from tracker.ttl_cache import TTLCache
+from tracker.parse_cache import ParseCache
+from tracker.local_parser import parse_simple_log
+from clients import get_gemini_client
 from dotenv import load_dotenv  
 
 load_dotenv()
-try:
-    api_key=os.getenv("CALORIES_GEMINI_KEY")
-    client_gemini = genai.Client(api_key=api_key)
-except Exception as e:
-    print(f"Error initializing Gemini client: {e}")
-    client_gemini = None
 MODEL_NAME = "gemini-2.5-flash" 
-SUPABASE_DB_URL = os.getenv("P_DATABASE_URL")
-
-FoodItem = types.Schema(
-    type=types.Type.OBJECT,
-    properties={
-        "food": types.Schema(
-            type=types.Type.STRING,
-            description="Name of the food item."
-        ),
-        "quantity": types.Schema(
-            type=types.Type.NUMBER,
-            description="Quantity consumed. If missing, assume 1."
-        ),
-        "weight": types.Schema(
-            type=types.Type.NUMBER,
-            description="Weight of the food item in grams, if available."
-        ),
-    },
-    required=["food"]
-)
-
-
-FoodMeal = types.Schema(
-    type=types.Type.OBJECT,
-    properties={
-        "meal_type": types.Schema(
-            type=types.Type.STRING,
-            description="Meal time (breakfast, lunch, dinner, snack)."
-        ),
-        "items": types.Schema(
-            type=types.Type.ARRAY,
-            items=FoodItem
-        ),
-    },
-    required=["meal_type", "items"]
-)
+FOOD_CACHE_SIZE = int(os.getenv("FOOD_CACHE_SIZE", "2048"))
+FOOD_CACHE_TTL = float(os.getenv("FOOD_CACHE_TTL", "21600"))
+FOOD_CATALOG_TTL = float(os.getenv("FOOD_CATALOG_TTL", "3600"))
+LOCAL_PARSER_ENABLED = os.getenv("LOCAL_PARSER_ENABLED", "1") == "1"
+
+food_macro_cache = TTLCache(maxsize=FOOD_CACHE_SIZE, ttl=FOOD_CACHE_TTL)
+parse_cache = ParseCache()
+food_catalog_cache = TTLCache(maxsize=1, ttl=FOOD_CATALOG_TTL)
+
+@lru_cache(maxsize=None)
+def food_day_schema():
+    from google.genai import types
+    FoodItem = types.Schema(
+        type=types.Type.OBJECT,
+        properties={
+            "food": types.Schema(
+                type=types.Type.STRING,
+                description="Name of the food item."
+            ),
+            "quantity": types.Schema(
+                type=types.Type.NUMBER,
+                description="Quantity consumed. If missing, assume 1."
+            ),
+            "weight": types.Schema(
+                type=types.Type.NUMBER,
+                description="Weight of the food item in grams, if available."
+            ),
+        },
+        required=["food"]
+    )
+
+
+    FoodMeal = types.Schema(
+        type=types.Type.OBJECT,
+        properties={
+            "meal_type": types.Schema(
+                type=types.Type.STRING,
+                description="Meal time (breakfast, lunch, dinner, snack)."
+            ),
+            "items": types.Schema(
+                type=types.Type.ARRAY,
+                items=FoodItem
+            ),
+        },
+        required=["meal_type", "items"]
+    )
+
+
+    FoodDaySchema = types.Schema(
+        type=types.Type.OBJECT,
+        properties={
+            "meals": types.Schema(
+                type=types.Type.ARRAY,
+                items=FoodMeal
+            ),
+        },
+        required=["meals"]
+    )
+    return FoodDaySchema
 
 
-FoodDaySchema = types.Schema(
-    type=types.Type.OBJECT,
-    properties={
-        "meals": types.Schema(
-            type=types.Type.ARRAY,
-            items=FoodMeal
-        ),
-    },
-    required=["meals"]
-)
-
 SYSTEM_PROMPT = """
 You are a food intake parser.
 
@@ -83,28 +93,72 @@ def insert_food_macros_100g(
     fat_100g: float,
     fiber_100g: float,
 ):
-    conn = psycopg2.connect(SUPABASE_DB_URL)
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        INSERT INTO foods (food_name, calories, protein, carbs, fat, fiber)
-        VALUES (%s, %s, %s, %s, %s, %s)
-        ON CONFLICT (food_name_lower) DO NOTHING;
-    """, (
-        food_name,
-        calories_100g,
-        protein_100g,
-        carbs_100g,
-        fat_100g,
-        fiber_100g,
-    ))
-
-    conn.commit()
-    cursor.close()
-    conn.close()
+    with pg_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO foods (food_name, calories, protein, carbs, fat, fiber)
+                VALUES (%s, %s, %s, %s, %s, %s)
+                ON CONFLICT (food_name_lower) DO NOTHING
+                RETURNING food_name_lower;
+            """, (
+                food_name,
+                calories_100g,
+                protein_100g,
+                carbs_100g,
+                fat_100g,
+                fiber_100g,
+            ))
+            inserted = cursor.fetchone()
+
+    if inserted:
+        catalog = food_catalog_cache.get("names")
+        if catalog is not None:
+            catalog.add(inserted[0])
+        food_macro_cache.set(inserted[0], _row_to_macros(
+            (calories_100g, protein_100g, carbs_100g, fat_100g, fiber_100g)
+        ))
+    else:
+        # Row already existed with its own values; let the next lookup read them.
+        food_macro_cache.pop(food_name.lower())
+
+def get_food_catalog() -> Set[str]:
+    catalog = food_catalog_cache.get("names")
+    if catalog is not None:
+        return catalog
+
+    with pg_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT food_name_lower FROM foods;")
+            catalog = {row[0] for row in cursor.fetchall()}
+
+    food_catalog_cache.set("names", catalog)
+    return catalog
+
 
 def estimate_calories(food_text):
+    if LOCAL_PARSER_ENABLED:
+        try:
+            local = parse_simple_log(food_text, get_food_catalog())
+        except Exception as e:
+            print(f"⚠️ Local food parser unavailable: {e}")
+            local = None
+        if local:
+            return local
 
+    cached = parse_cache.get(food_text)
+    if cached is not None:
+        return cached
+
+    food_json = _parse_with_gemini(food_text)
+    if food_json and food_json.get("meals"):
+        parse_cache.set(food_text, food_json)
+    return food_json
+
+
+def _parse_with_gemini(food_text):
+    from google.genai import types
+
+    client_gemini = get_gemini_client("CALORIES_GEMINI_KEY")
     response = client_gemini.models.generate_content(
     model=MODEL_NAME,
     contents=[
@@ -113,7 +167,7 @@ def estimate_calories(food_text):
     config=types.GenerateContentConfig(
         system_instruction=SYSTEM_PROMPT,
         response_mime_type="application/json",
-        response_schema=FoodDaySchema,
+        response_schema=food_day_schema(),
         candidate_count=1,
     ),
 )
@@ -130,24 +184,66 @@ def estimate_calories(food_text):
 
 
 def get_food_macros(food_name: str):
-    conn = psycopg2.connect(SUPABASE_DB_URL)
-    cursor = conn.cursor()
+    cached = food_macro_cache.get(food_name.lower())
+    if cached is not None:
+        return dict(cached)
+
+    with pg_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT calories, protein, carbs, fat, fiber
+                FROM foods
+                WHERE food_name_lower = %s
+                LIMIT 1;
+            """, (food_name.lower(),))
+            row = cursor.fetchone()
+
+    if not row:
+        return None
 
-    cursor.execute("""
-        SELECT calories, protein, carbs, fat, fiber
-        FROM foods
-        WHERE food_name_lower = %s
-        LIMIT 1;
-    """, (food_name.lower(),))
+    macros = _row_to_macros(row)
+    food_macro_cache.set(food_name.lower(), macros)
+    return dict(macros)
 
-    row = cursor.fetchone()
 
-    cursor.close()
-    conn.close()
+def get_food_macros_bulk(food_names: List[str]) -> Dict[str, Dict[str, float]]:
+    names = sorted({name.lower() for name in food_names if name})
+    found = {}
+    missing = []
+    for name in names:
+        cached = food_macro_cache.get(name)
+        if cached is not None:
+            found[name] = dict(cached)
+        else:
+            missing.append(name)
+    if not missing:
+        return found
+
+    with pg_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT food_name_lower, calories, protein, carbs, fat, fiber
+                FROM foods
+                WHERE food_name_lower = ANY(%s);
+            """, (missing,))
+            rows = cursor.fetchall()
+
+    for row in rows:
+        macros = _row_to_macros(row[1:])
+        food_macro_cache.set(row[0], macros)
+        found[row[0]] = dict(macros)
+    return found
+
+
+def food_macro_cache_stats() -> Dict[str, Any]:
+    return food_macro_cache.stats()
 
-    if not row:
-        return None
 
+def parse_cache_stats() -> Dict[str, Any]:
+    return parse_cache.stats()
+
+
+def _row_to_macros(row) -> Dict[str, float]:
     calories, protein, carbs, fat, fiber = row
 
     return {
@@ -159,27 +255,60 @@ def get_food_macros(food_name: str):
     }
 
 
-def calculate_macros(food_name: str, weight: float,quantity: float):
+def store_llm_estimate(food_name: str, weight: float, llm_data: Dict[str, Any], macros_map: Optional[Dict[str, Dict[str, float]]] = None) -> Dict[str, float]:
+    factor_100g = 100.0 / (weight or 100)
+
+    macros = {
+        "calories_100g": round(llm_data["calories"] * factor_100g, 2),
+        "protein_100g": round(llm_data["proteins"] * factor_100g, 2),
+        "carbs_100g": round(llm_data["carbs"] * factor_100g, 2),
+        "fat_100g": round(llm_data["fats"] * factor_100g, 2),
+        "fiber_100g": round(llm_data["fiber"] * factor_100g, 2),
+    }
 
-    macros = get_food_macros(food_name)
+    insert_food_macros_100g(
+        food_name=food_name,
+        calories_100g=macros["calories_100g"],
+        protein_100g=macros["protein_100g"],
+        carbs_100g=macros["carbs_100g"],
+        fat_100g=macros["fat_100g"],
+        fiber_100g=macros["fiber_100g"],
+    )
+    if macros_map is not None:
+        macros_map[food_name.lower()] = macros
+    return macros
+
+
+def fill_unknown_foods(llm_output, macros_map: Dict[str, Dict[str, float]]):
+    unknown = {}
+    for meal in llm_output["meals"]:
+        for item in meal["items"]:
+            key = item["food"].lower()
+            if key not in macros_map and key not in unknown:
+                unknown[key] = (item["food"], item.get("weight", 100))
+    if not unknown:
+        return
+
+    estimates = estimate_foods_with_llm(list(unknown.values()))
+    for food, weight in unknown.values():
+        llm_data = estimates.get(food)
+        if not llm_data:
+            continue
+        try:
+            store_llm_estimate(food, weight, llm_data, macros_map)
+        except Exception as e:
+            print(f"⚠️ Could not store LLM estimate for {food}: {e}")
+
+
+def calculate_macros(food_name: str, weight: float,quantity: float, macros_map: Optional[Dict[str, Dict[str, float]]] = None):
+
+    if macros_map is not None:
+        macros = macros_map.get(food_name.lower())
+    else:
+        macros = get_food_macros(food_name)
     if not macros:
         llm_data= estimate_food_with_llm(food_name, weight)
-        factor_100g = 100.0 / weight
-
-        calories_100g = llm_data["calories"] * factor_100g
-        protein_100g  = llm_data["proteins"] * factor_100g
-        carbs_100g    = llm_data["carbs"] * factor_100g
-        fat_100g      = llm_data["fats"] * factor_100g
-        fiber_100g    = llm_data["fiber"] * factor_100g
-
-        insert_food_macros_100g(
-            food_name=food_name,
-            calories_100g=round(calories_100g, 2),
-            protein_100g=round(protein_100g, 2),
-            carbs_100g=round(carbs_100g, 2),
-            fat_100g=round(fat_100g, 2),
-            fiber_100g=round(fiber_100g, 2),
-        )
+        store_llm_estimate(food_name, weight, llm_data, macros_map)
 
         return llm_data
 
@@ -197,7 +326,12 @@ def calculate_macros(food_name: str, weight: float,quantity: float):
     }
 def enrich_with_macros(llm_output):
     meals = []
+    macros_map = get_food_macros_bulk(
+        [item["food"] for meal in llm_output["meals"] for item in meal["items"]]
+    )
+    fill_unknown_foods(llm_output, macros_map)
 
+    unresolved = []
     for meal in llm_output["meals"]:
         items = []
 
@@ -206,7 +340,11 @@ def enrich_with_macros(llm_output):
             weight = item.get("weight", 100)
             quantity = item.get("quantity", 1)
 
-            macros = calculate_macros(food, weight, quantity)
+            if food.lower() not in macros_map:
+                print(f"⚠️ Skipping {food}: no macros found or estimated")
+                unresolved.append({"meal_type": meal["meal_type"], "food": food, "quantity": quantity, "weight": weight})
+                continue
+            macros = calculate_macros(food, weight, quantity, macros_map)
 
             if macros:
                 items.append({
@@ -225,7 +363,9 @@ def enrich_with_macros(llm_output):
             "items": items
         })
 
-    return {"meals": meals}
+    # Items left out because their macros could not be found or estimated
+    # (LLM failure or timeout), so the caller can tell the user what is missing.
+    return {"meals": meals, "unresolved_items": unresolved}
 
 if __name__ == "__main__":
     food_input = "I had paneer for breakfast and a egg for lunch."
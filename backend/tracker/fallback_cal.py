@@ -1,19 +1,17 @@
 import os
+import math
 import requests
 import json
-from google import genai
-from google.genai import types
-import psycopg2
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, List, Tuple
+from clients import get_gemini_client
 from dotenv import load_dotenv  
 
 load_dotenv()
-try:
-    api_key=os.getenv("CALORIES_GEMINI_KEY")
-    client_gemini = genai.Client(api_key=api_key)
-except Exception as e:
-    print(f"Error initializing Gemini client: {e}")
-    client_gemini = None
 MODEL_NAME = "gemini-2.5-flash"
+FALLBACK_MAX_WORKERS = int(os.getenv("FALLBACK_MAX_WORKERS", "4"))
+FALLBACK_TIMEOUT = float(os.getenv("FALLBACK_TIMEOUT", "20"))
 
 SYSTEM_PROMPT_FALLBACK = """
 You are a nutrition expert.
@@ -21,31 +19,39 @@ Estimate calories and macros for the given food and weight.
 Return values for the full item.
 Output JSON only.
 """
-FoodItem = types.Schema(
-    type=types.Type.OBJECT,
-    properties={
-        "food": types.Schema(type=types.Type.STRING),
-        "quantity": types.Schema(type=types.Type.NUMBER),
-        "weight": types.Schema(type=types.Type.NUMBER),
-        "calories": types.Schema(type=types.Type.NUMBER),
-        "proteins": types.Schema(type=types.Type.NUMBER),
-        "fats": types.Schema(type=types.Type.NUMBER),
-        "carbs": types.Schema(type=types.Type.NUMBER),
-        "fiber": types.Schema(type=types.Type.NUMBER),
-    },
-)
-
-def estimate_food_with_llm(food: str, weight: float):
+@lru_cache(maxsize=None)
+def food_item_schema():
+    from google.genai import types
+    FoodItem = types.Schema(
+        type=types.Type.OBJECT,
+        properties={
+            "food": types.Schema(type=types.Type.STRING),
+            "quantity": types.Schema(type=types.Type.NUMBER),
+            "weight": types.Schema(type=types.Type.NUMBER),
+            "calories": types.Schema(type=types.Type.NUMBER),
+            "proteins": types.Schema(type=types.Type.NUMBER),
+            "fats": types.Schema(type=types.Type.NUMBER),
+            "carbs": types.Schema(type=types.Type.NUMBER),
+            "fiber": types.Schema(type=types.Type.NUMBER),
+        },
+    )
+    return FoodItem
+
+
+def estimate_food_with_llm(food: str, weight: float, timeout: float = FALLBACK_TIMEOUT):
+    from google.genai import types
     prompt = f"{food}, {weight} grams"
 
+    client_gemini = get_gemini_client("CALORIES_GEMINI_KEY")
     response = client_gemini.models.generate_content(
         model=MODEL_NAME,
         contents=[types.Content(role="user", parts=[types.Part(text=prompt)])],
         config=types.GenerateContentConfig(
             system_instruction=SYSTEM_PROMPT_FALLBACK,
             response_mime_type="application/json",
-            response_schema=FoodItem,
+            response_schema=food_item_schema(),
             candidate_count=1,
+            http_options=types.HttpOptions(timeout=int(timeout * 1000)),
         ),
     )
 
@@ -53,3 +59,34 @@ def estimate_food_with_llm(food: str, weight: float):
     data = json.loads(raw)
 
     return data
+
+
+def estimate_foods_with_llm(foods: List[Tuple[str, float]], max_workers: int = FALLBACK_MAX_WORKERS, timeout: float = FALLBACK_TIMEOUT) -> Dict[str, dict]:
+    # Foods missing from the result failed or timed out. Each call is bounded by
+    # its own HTTP timeout; the overall wait only guards against a hung worker
+    # and allows every queued wave of max_workers calls its full timeout.
+    results = {}
+    if not foods:
+        return results
+
+    workers = max(1, min(max_workers, len(foods)))
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        future_to_food = {
+            executor.submit(estimate_food_with_llm, food, weight, timeout): food
+            for food, weight in foods
+        }
+        done, not_done = wait(future_to_food, timeout=timeout * math.ceil(len(foods) / workers) + timeout)
+        for future in done:
+            food = future_to_food[future]
+            try:
+                results[food] = future.result()
+            except Exception as e:
+                print(f"⚠️ LLM fallback failed for {food}: {e}")
+        for future in not_done:
+            future.cancel()
+            print(f"⚠️ LLM fallback timed out for {future_to_food[future]}")
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return results
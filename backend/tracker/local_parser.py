@@ -0,0 +1,121 @@
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+MEAL_PATTERN = re.compile(
+    r"\b(?:for|at|in|during|as)?\s*(?:my\s+)?(breakfast|lunch|dinner|snacks?)\b"
+)
+ITEM_SPLIT_PATTERN = re.compile(r"\s*(?:,|&|\+|\band\b|\bthen\b)\s*")
+QUANTITY_PATTERN = re.compile(
+    r"^(?P<qty>\d+(?:\.\d+)?)?\s*(?P<unit>kg|kgs|g|gm|gms|gram|grams|ml)?\b\s*(?:of\s+)?(?P<rest>.*)$"
+)
+
+NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10, "half": 0.5,
+}
+FILLER_WORDS = {"i", "had", "have", "ate", "eaten", "just", "today", "some", "my", "also"}
+UNIT_TO_GRAMS = {"kg": 1000, "kgs": 1000, "g": 1, "gm": 1, "gms": 1, "gram": 1, "grams": 1, "ml": 1}
+
+
+def _meal_type(keyword: str) -> str:
+    return "snack" if keyword.startswith("snack") else keyword
+
+
+def _clean(text: str) -> str:
+    text = text.lower()
+    text = re.sub(r"(\d)\s*(kg|kgs|gms|gm|grams|gram|g|ml)\b", r"\1 \2", text)
+    text = re.sub(r"[^a-z0-9.,&+\s]", " ", text)
+    text = re.sub(r"\.(?!\d)", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _match_food(name: str, catalog: Iterable[str]) -> Optional[str]:
+    candidates = [name]
+    if name.endswith("es"):
+        candidates.append(name[:-2])
+    if name.endswith("s"):
+        candidates.append(name[:-1])
+    for candidate in candidates:
+        if candidate in catalog:
+            return candidate
+    return None
+
+
+def _parse_item(piece: str, catalog: Iterable[str]) -> Optional[Dict[str, Any]]:
+    words = [w for w in piece.split() if w not in FILLER_WORDS]
+    if not words:
+        return None
+
+    quantity = None
+    if words[0] in NUMBER_WORDS:
+        quantity = NUMBER_WORDS[words[0]]
+        words = words[1:]
+
+    m = QUANTITY_PATTERN.match(" ".join(words))
+    if not m or not m.group("rest"):
+        return None
+    # Macros are computed from weight alone and the catalog has no per-piece
+    # weights, so counts ("2 eggs", "half egg") are left to the LLM; only an
+    # explicit mass ("200g rice", "a 150 g apple") is parsed here.
+    if m.group("qty") is None or not m.group("unit") or quantity not in (None, 1):
+        return None
+    weight = float(m.group("qty")) * UNIT_TO_GRAMS[m.group("unit")]
+
+    food = _match_food(m.group("rest").strip(), catalog)
+    if not food:
+        return None
+
+    return {
+        "food": food,
+        "quantity": quantity if quantity is not None else 1,
+        "weight": weight,
+    }
+
+
+def _parse_chunk(chunk: str, catalog: Iterable[str]) -> Optional[List[Dict[str, Any]]]:
+    pieces = [p for p in ITEM_SPLIT_PATTERN.split(chunk) if p and p.strip()]
+    items = []
+    for piece in pieces:
+        if all(w in FILLER_WORDS for w in piece.split()):
+            continue
+        item = _parse_item(piece, catalog)
+        if item is None:
+            return None
+        items.append(item)
+    return items
+
+
+def parse_simple_log(text: str, catalog: Iterable[str]) -> Optional[Dict[str, Any]]:
+    # Same {"meals": [...]} shape as the Gemini parser; None whenever any part
+    # of the text is not fully understood, so the caller falls back to the LLM.
+    cleaned = _clean(text)
+    if not cleaned or not catalog:
+        return None
+
+    segments: List[Tuple[str, Optional[str]]] = []
+    pos = 0
+    for m in MEAL_PATTERN.finditer(cleaned):
+        segments.append((cleaned[pos:m.start()], _meal_type(m.group(1))))
+        pos = m.end()
+    segments.append((cleaned[pos:], None))
+
+    meals: Dict[str, List[Dict[str, Any]]] = {}
+    leading = None
+    for chunk, keyword in segments:
+        items = _parse_chunk(chunk, catalog)
+        if items is None:
+            return None
+        if items:
+            meal = leading or keyword
+            if meal is None:
+                return None
+            meals.setdefault(meal, []).extend(items)
+            leading = keyword if leading else None
+        elif keyword:
+            if leading:
+                return None
+            leading = keyword
+    if leading or not meals:
+        return None
+
+    return {"meals": [{"meal_type": meal, "items": items} for meal, items in meals.items()]}
@@ -0,0 +1,99 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+from typing import Any, Dict, Optional
+from tracker.ttl_cache import TTLCache
+
+PARSE_CACHE_SIZE = int(os.getenv("PARSE_CACHE_SIZE", "4096"))
+PARSE_CACHE_TTL = float(os.getenv("PARSE_CACHE_TTL", "604800"))
+PARSE_CACHE_PATH = os.getenv("PARSE_CACHE_PATH")
+
+
+def normalize_log_text(text: str) -> str:
+    text = (text or "").lower().strip()
+    text = re.sub(r"\s+", " ", text)
+    return text.strip(" .!?")
+
+
+class ParseCache:
+    def __init__(self, maxsize: int = PARSE_CACHE_SIZE, ttl: Optional[float] = PARSE_CACHE_TTL, path: Optional[str] = PARSE_CACHE_PATH):
+        self.memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.path = path
+        self._db = None
+        self._db_lock = threading.Lock()
+        if path:
+            try:
+                self._db = sqlite3.connect(path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS parse_cache ("
+                    " text_key TEXT PRIMARY KEY,"
+                    " meals_json TEXT NOT NULL,"
+                    " created_at REAL NOT NULL)"
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                print(f"⚠️ Parse cache persistence disabled ({path}): {e}")
+                self._db = None
+
+    def get(self, text: str) -> Optional[Dict[str, Any]]:
+        key = normalize_log_text(text)
+        if not key:
+            return None
+        raw = self.memory.get(key)
+        if raw is None and self._db is not None:
+            raw = self._load(key)
+            if raw is not None:
+                self.memory.set(key, raw)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, text: str, parsed: Dict[str, Any]):
+        key = normalize_log_text(text)
+        if not key or not parsed:
+            return
+        raw = json.dumps(parsed)
+        self.memory.set(key, raw)
+        if self._db is not None:
+            self._store(key, raw)
+
+    def _load(self, key: str) -> Optional[str]:
+        with self._db_lock:
+            try:
+                row = self._db.execute(
+                    "SELECT meals_json, created_at FROM parse_cache WHERE text_key = ?", (key,)
+                ).fetchone()
+            except sqlite3.Error as e:
+                print(f"⚠️ Parse cache read failed: {e}")
+                return None
+        if not row:
+            return None
+        raw, created_at = row
+        if self.ttl and created_at + self.ttl < time.time():
+            return None
+        return raw
+
+    def _store(self, key: str, raw: str):
+        with self._db_lock:
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO parse_cache (text_key, meals_json, created_at) VALUES (?, ?, ?)",
+                    (key, raw, time.time()),
+                )
+                # Keep the file bounded the same way as the in-memory cache.
+                self._db.execute(
+                    "DELETE FROM parse_cache WHERE text_key NOT IN "
+                    "(SELECT text_key FROM parse_cache ORDER BY created_at DESC LIMIT ?)",
+                    (self.maxsize,),
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                print(f"⚠️ Parse cache write failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.memory.stats()
+        stats["persistent"] = self._db is not None
+        return stats
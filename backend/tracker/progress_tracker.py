@@ -1,4 +1,5 @@
-from pymongo import MongoClient, ASCENDING
+from pymongo import MongoClient, ASCENDING, UpdateOne
+from pymongo.errors import OperationFailure
 from datetime import datetime, timedelta
 from typing import Dict, Any, Optional, List
 import math
@@ -15,8 +16,7 @@ def date_range(start_date: datetime, days: int):
     for i in range(days):
         yield start_date + timedelta(days=i)
 
-def compute_workout_intensity_for_day(user_id: str, date_str: str) -> Optional[float]:
-    docs = list(workout_summary_col.find({"user_id": user_id, "date": date_str}))
+def workout_intensity_from_docs(docs: List[Dict[str, Any]]) -> Optional[float]:
     if not docs:
         return None
     total_cal = 0
@@ -35,8 +35,7 @@ def compute_workout_intensity_for_day(user_id: str, date_str: str) -> Optional[f
         return cal_mapped
     return (cal_mapped * 0.5) + (avg_score * 0.5)
 
-def fetch_daily_calories_and_macros(user_id: str, date_str: str) -> Dict[str, Any]:
-    doc = summary_col.find_one({"user_id": user_id, "date": date_str})
+def calories_and_macros_from_summary(doc: Optional[Dict[str, Any]]) -> Dict[str, Any]:
     if not doc or "summary_text" not in doc:
         return {"calories": None, "macros": None}
 
@@ -50,8 +49,7 @@ def fetch_daily_calories_and_macros(user_id: str, date_str: str) -> Dict[str, An
         }
     }
 
-def fetch_weight_for_date(user_id: str, date_str: str) -> Optional[float]:
-    doc = weight_col.find_one({"user_id": user_id,"date": date_str})
+def weight_from_doc(doc: Optional[Dict[str, Any]]) -> Optional[float]:
     if not doc:
         return None
     weight_value = doc.get("weight") or doc.get("weight_kg")
@@ -60,8 +58,74 @@ def fetch_weight_for_date(user_id: str, date_str: str) -> Optional[float]:
     except (TypeError, ValueError):
         return None
 
+def compute_workout_intensity_for_day(user_id: str, date_str: str) -> Optional[float]:
+    docs = list(workout_summary_col.find({"user_id": user_id, "date": date_str}))
+    return workout_intensity_from_docs(docs)
 
-def create_or_update_progress_doc(user_id: str, date_str: str, expected: Dict[str, Any], achieved: Dict[str, Any], week_number: int, goal: str):
+def fetch_daily_calories_and_macros(user_id: str, date_str: str) -> Dict[str, Any]:
+    doc = summary_col.find_one({"user_id": user_id, "date": date_str})
+    return calories_and_macros_from_summary(doc)
+
+def fetch_weight_for_date(user_id: str, date_str: str) -> Optional[float]:
+    doc = weight_col.find_one({"user_id": user_id,"date": date_str})
+    return weight_from_doc(doc)
+
+def _tagged_branch(collection, match: Dict[str, Any], source: str, extra: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    pipeline = [{"$match": match}] + (extra or []) + [{"$addFields": {"_source": source}}]
+    return {"$unionWith": {"coll": collection.name, "pipeline": pipeline}}
+
+def daily_inputs_pipeline(user_id: str, date_str: str) -> List[Dict[str, Any]]:
+    # Runs on progress_col and pulls the other four inputs in with $unionWith,
+    # so one aggregate command replaces the five separate lookups.
+    key = {"user_id": user_id, "date": date_str}
+    return [
+        {"$match": key},
+        {"$limit": 1},
+        {"$addFields": {"_source": "progress"}},
+        _tagged_branch(summary_col, key, "diet_summary", [{"$limit": 1}]),
+        _tagged_branch(workout_summary_col, key, "workout_summary"),
+        _tagged_branch(weight_col, key, "weight", [{"$limit": 1}]),
+        _tagged_branch(
+            macro_collection,
+            {"user_id": user_id},
+            "plan",
+            [{"$sort": {"start_date": ASCENDING}}, {"$limit": 1},
+             {"$project": {"daily_calories": 1, "daily_macros": 1, "target_weight_kg": 1, "workout_intensity": 1, "goal": 1}}],
+        ),
+    ]
+
+def fetch_daily_inputs(user_id: str, date_str: str) -> Dict[str, Any]:
+    inputs = {"progress": None, "plan": None, "diet_summary": None, "workout_summary": [], "weight": None}
+    try:
+        docs = list(progress_col.aggregate(daily_inputs_pipeline(user_id, date_str)))
+    except OperationFailure as e:
+        # $unionWith needs MongoDB 4.4+; fall back to the individual lookups.
+        print(f"⚠️ Combined progress lookup failed, using separate queries: {e}")
+        inputs["progress"] = progress_col.find_one({"user_id": user_id, "date": date_str})
+        if not inputs["progress"]:
+            inputs["plan"] = macro_collection.find_one({"user_id": user_id}, sort=[("start_date", ASCENDING)])
+        inputs["diet_summary"] = summary_col.find_one({"user_id": user_id, "date": date_str})
+        inputs["workout_summary"] = list(workout_summary_col.find({"user_id": user_id, "date": date_str}))
+        inputs["weight"] = weight_col.find_one({"user_id": user_id, "date": date_str})
+        return inputs
+    for doc in docs:
+        source = doc.pop("_source")
+        if source == "workout_summary":
+            inputs["workout_summary"].append(doc)
+        else:
+            inputs[source] = doc
+    return inputs
+
+def expected_from_plan(plan: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "daily_calories": plan.get("daily_calories"),
+        "daily_macros": plan.get("daily_macros"),
+        "target_weight_kg": plan.get("target_weight_kg"),
+        "workout_intensity": plan.get("workout_intensity")
+    }
+
+
+def build_progress_doc(user_id: str, date_str: str, expected: Dict[str, Any], achieved: Dict[str, Any], week_number: int, goal: str) -> Dict[str, Any]:
     progress_percentage = {}
     try:
         if expected.get("daily_calories") and achieved.get("calories") is not None:
@@ -93,10 +157,44 @@ def create_or_update_progress_doc(user_id: str, date_str: str, expected: Dict[st
         "progress_percentage": progress_percentage,
         "remarks": None
     }
-    progress_col.update_one({"user_id": user_id, "date": date_str}, {"$set": doc}, upsert=True)
     return doc
 
 
+def progress_update(doc: Dict[str, Any], now: Optional[datetime] = None) -> Dict[str, Any]:
+    # updated_at is the ETL watermark (duckdb_etl pulls progress by it), so
+    # every write path must go through here.
+    now = now or datetime.utcnow()
+    return {"$set": {**doc, "updated_at": now}, "$setOnInsert": {"created_at": now}}
+
+
+def create_or_update_progress_doc(user_id: str, date_str: str, expected: Dict[str, Any], achieved: Dict[str, Any], week_number: int, goal: str):
+    doc = build_progress_doc(user_id, date_str, expected, achieved, week_number, goal)
+    progress_col.update_one({"user_id": user_id, "date": date_str}, progress_update(doc), upsert=True)
+    return doc
+
+
+def bulk_upsert_progress_docs(docs: List[Dict[str, Any]]):
+    # One unordered round-trip for a whole week instead of seven update_one calls.
+    if not docs:
+        return None
+    now = datetime.utcnow()
+    ops = [
+        UpdateOne({"user_id": doc["user_id"], "date": doc["date"]}, progress_update(doc, now), upsert=True)
+        for doc in docs
+    ]
+    return progress_col.bulk_write(ops, ordered=False)
+
+
+def stamp_unversioned_progress_docs() -> int:
+    # Docs written before updated_at existed get stamped once so the next
+    # watermark query picks them up; afterwards this matches nothing.
+    result = progress_col.update_many(
+        {"updated_at": {"$exists": False}},
+        {"$set": {"updated_at": datetime.utcnow()}},
+    )
+    return result.modified_count
+
+
 def generate_initial_week(user_id: str, start_date):
 
     plan = macro_collection.find_one({"user_id": user_id})
@@ -130,10 +228,12 @@ def generate_initial_week(user_id: str, start_date):
                                   'fiber_g':plan['Macros']['Fiber_g']}
     base_expected['target_weight_kg']=week_data['expected_weight_kg']
 
+    docs = []
     for d in date_range(start_dt, 7):
         date_str = iso_date(d)
         achieved = {"calories": None, "macros": None, "workout_intensity": None, "weight_kg": None}
-        create_or_update_progress_doc(user_id=user_id, date_str=date_str, expected=base_expected, achieved=achieved, week_number=week_number, goal=goal)
+        docs.append(build_progress_doc(user_id=user_id, date_str=date_str, expected=base_expected, achieved=achieved, week_number=week_number, goal=goal))
+    bulk_upsert_progress_docs(docs)
     return {"status": "ok", "generated_from": iso_date(start_dt), "days": 7}
 
 def update_daily_progress(user_id: str, date_obj: datetime):
@@ -141,36 +241,27 @@ def update_daily_progress(user_id: str, date_obj: datetime):
         date_str = date_obj.strftime("%Y-%m-%d")
     else:'''
     date_str = date_obj
-    existing = progress_col.find_one({"user_id": user_id, "date": date_str})
+    inputs = fetch_daily_inputs(user_id, date_str)
+    existing = inputs["progress"]
     if existing:
         expected = existing["expected"]
         week_number = existing.get("week_number", 0)
         goal = existing.get("goal", "unspecified")
     else:
-        plan = macro_collection.find_one({"user_id": user_id}, sort=[("start_date", ASCENDING)])
+        plan = inputs["plan"]
         if not plan:
             raise ValueError("No plan or progress doc found for user/date")
-        expected = {
-            "daily_calories": plan.get("daily_calories"),
-            "daily_macros": plan.get("daily_macros"),
-            "target_weight_kg": plan.get("target_weight_kg"),
-            "workout_intensity": plan.get("workout_intensity")
-        }
+        expected = expected_from_plan(plan)
         week_number = 0
         goal = plan.get("goal", "unspecified")
 
-    cal_and_macros = fetch_daily_calories_and_macros(user_id, date_str)
-    achieved_calories = cal_and_macros["calories"]
-    achieved_macros = cal_and_macros["macros"]
-
-    workout_intensity = compute_workout_intensity_for_day(user_id, date_str)
-    weight_kg = fetch_weight_for_date(user_id,date_str)
+    cal_and_macros = calories_and_macros_from_summary(inputs["diet_summary"])
 
     achieved = {
-        "calories": achieved_calories,
-        "macros": achieved_macros,
-        "workout_intensity": workout_intensity,
-        "weight_kg": weight_kg
+        "calories": cal_and_macros["calories"],
+        "macros": cal_and_macros["macros"],
+        "workout_intensity": workout_intensity_from_docs(inputs["workout_summary"]),
+        "weight_kg": weight_from_doc(inputs["weight"])
     }
 
     updated_doc = create_or_update_progress_doc(user_id=user_id, date_str=date_str, expected=expected, achieved=achieved, week_number=week_number, goal=goal)
@@ -180,15 +271,103 @@ def _safe_avg(values: List[float]) -> Optional[float]:
     vals = [v for v in values if v is not None]
     return (sum(vals) / len(vals)) if vals else None
 
-def aggregate_and_adapt_week(user_id: str, week_start_date: str):
-
+def week_dates(week_start_date: str) -> List[str]:
     start_dt = parse_date(week_start_date)
-    dates = [iso_date(start_dt + timedelta(days=i)) for i in range(7)]
-    docs = list(progress_col.find({"user_id": user_id, "date": {"$in": dates}}))
+    return [iso_date(start_dt + timedelta(days=i)) for i in range(7)]
+
+def week_inputs_pipeline(user_id: str, week_start_date: str) -> List[Dict[str, Any]]:
+    # The week's progress docs plus the plan and the latest weekly doc, read
+    # with one aggregate the same way daily_inputs_pipeline does.
+    return [
+        {"$match": {"user_id": user_id, "date": {"$in": week_dates(week_start_date)}}},
+        {"$sort": {"date": ASCENDING}},
+        {"$addFields": {"_source": "progress"}},
+        _tagged_branch(macro_collection, {"user_id": user_id}, "plan", [{"$limit": 1}]),
+        _tagged_branch(progress_weekly_col, {"user_id": user_id}, "last_week", [{"$sort": {"week_number": -1}}, {"$limit": 1}]),
+    ]
+
+def fetch_week_inputs(user_id: str, week_start_date: str) -> Dict[str, Any]:
+    inputs = {"progress": [], "plan": None, "last_week": None}
+    try:
+        docs = list(progress_col.aggregate(week_inputs_pipeline(user_id, week_start_date)))
+    except OperationFailure as e:
+        print(f"⚠️ Combined week lookup failed, using separate queries: {e}")
+        inputs["progress"] = list(progress_col.find({"user_id": user_id, "date": {"$in": week_dates(week_start_date)}}).sort("date", ASCENDING))
+        inputs["plan"] = macro_collection.find_one({"user_id": user_id})
+        inputs["last_week"] = progress_weekly_col.find_one({"user_id": user_id}, sort=[("week_number", -1)])
+        return inputs
+    for doc in docs:
+        source = doc.pop("_source")
+        if source == "progress":
+            inputs["progress"].append(doc)
+        else:
+            inputs[source] = doc
+    return inputs
+
+def aggregate_and_adapt_week(user_id: str, week_start_date: str):
+    # One read for all inputs, then the weekly doc upsert and one bulk write of
+    # next week's days (two collections, so the writes cannot share a command).
+    inputs = fetch_week_inputs(user_id, week_start_date)
+    docs = inputs["progress"]
 
     if len(docs) < 1:
         raise ValueError("No progress documents found for the week start")
 
+    plan = inputs["plan"]
+    last_week_doc = inputs["last_week"]
+    last_week_number = last_week_doc["week_number"] if last_week_doc else None
+
+    weekly_doc = compute_week_adaptation(user_id, week_start_date, docs, plan, last_week_number)
+    week_number = weekly_doc["week_number"]
+
+    progress_weekly_col.update_one(
+        {"user_id": user_id, "week_number": week_number, "start_date": week_start_date},
+        {"$set": weekly_doc},
+        upsert=True
+    )
+
+    next_week_start = parse_date(week_start_date) + timedelta(days=7)
+    generated_info = write_next_week_docs(
+        user_id=user_id,
+        adjusted_targets=weekly_doc["adjusted_targets"],
+        start_date=iso_date(next_week_start),
+        week_number=(week_number + 1),
+        goal=docs[0].get("goal", "unspecified"),
+        plan=plan
+    )
+
+    return {"weekly_summary": weekly_doc, "generated_next_week": generated_info}
+
+def fill_missing_macros(adjusted_macros: Dict[str, Any], plan: Optional[Dict[str, Any]], plan_index: int):
+    if plan and "Weekly_Plan" in plan:
+        if len(plan["Weekly_Plan"]) > plan_index:
+            candidate = plan["Weekly_Plan"][plan_index].get("expected_macros") or {}
+            candidate_norm = {
+                "protein_g": candidate.get("Protein_g") or candidate.get("protein_g"),
+                "carbs_g": candidate.get("Carbs_g") or candidate.get("carbs_g"),
+                "fats_g": candidate.get("Fats_g") or candidate.get("fats_g")
+            }
+            for k in ["protein_g", "carbs_g", "fats_g"]:
+                if adjusted_macros.get(k) is None and candidate_norm.get(k) is not None:
+                    try:
+                        adjusted_macros[k] = float(candidate_norm[k])
+                    except Exception:
+                        adjusted_macros[k] = adjusted_macros.get(k)
+
+    if plan and plan.get("Macros"):
+        for src_k, tgt_k in [("Protein_g", "protein_g"), ("Carbs_g", "carbs_g"), ("Fats_g", "fats_g")]:
+            if adjusted_macros.get(tgt_k) is None and plan["Macros"].get(src_k) is not None:
+                try:
+                    adjusted_macros[tgt_k] = float(plan["Macros"].get(src_k))
+                except Exception:
+                    pass
+
+def compute_week_adaptation(user_id: str, week_start_date: str, docs: List[Dict[str, Any]], plan: Optional[Dict[str, Any]], last_week_number: Optional[int], now: Optional[datetime] = None) -> Dict[str, Any]:
+    # Pure part of aggregate_and_adapt_week: no reads or writes, so the batch
+    # engine in tracker/batch_adapt.py can be checked against it. Docs are taken
+    # in date order whatever order the caller read them in: the goal comes from
+    # the first day and float averages depend on summation order.
+    docs = sorted(docs, key=lambda d: d["date"])
     achieved_calories_list = []
     achieved_protein = []
     achieved_carbs = []
@@ -252,9 +431,7 @@ def aggregate_and_adapt_week(user_id: str, week_start_date: str):
     recent_avg_weight = _safe_avg(recent_weights_only)
     actual_change = (last_weight - first_weight) if (first_weight is not None and last_weight is not None) else None
 
-    plan = macro_collection.find_one({"user_id": user_id})
-    last_week_doc = progress_weekly_col.find_one({"user_id": user_id}, sort=[("week_number", -1)])
-    week_number = (last_week_doc["week_number"] + 1) if last_week_doc else 1
+    week_number = (last_week_number + 1) if last_week_number is not None else 1
 
     expected_weight = None
     next_expected_weight = None
@@ -303,28 +480,7 @@ def aggregate_and_adapt_week(user_id: str, week_start_date: str):
             adjusted_macros["protein_g"] = round(adjusted_macros["protein_g"] * 1.08)
             adjustment_reason += " Increased protein by 8% to support fat loss."
 
-    if plan and "Weekly_Plan" in plan:
-        if len(plan["Weekly_Plan"]) > week_number:
-            candidate = plan["Weekly_Plan"][week_number].get("expected_macros") or {}
-            candidate_norm = {
-                "protein_g": candidate.get("Protein_g") or candidate.get("protein_g"),
-                "carbs_g": candidate.get("Carbs_g") or candidate.get("carbs_g"),
-                "fats_g": candidate.get("Fats_g") or candidate.get("fats_g")
-            }
-            for k in ["protein_g", "carbs_g", "fats_g"]:
-                if adjusted_macros.get(k) is None and candidate_norm.get(k) is not None:
-                    try:
-                        adjusted_macros[k] = float(candidate_norm[k])
-                    except Exception:
-                        adjusted_macros[k] = adjusted_macros.get(k)
-
-    if plan and plan.get("Macros"):
-        for src_k, tgt_k in [("Protein_g", "protein_g"), ("Carbs_g", "carbs_g"), ("Fats_g", "fats_g")]:
-            if adjusted_macros.get(tgt_k) is None and plan["Macros"].get(src_k) is not None:
-                try:
-                    adjusted_macros[tgt_k] = float(plan["Macros"].get(src_k))
-                except Exception:
-                    pass
+    fill_missing_macros(adjusted_macros, plan, week_number)
 
     weekly_doc = {
         "user_id": user_id,
@@ -349,34 +505,30 @@ def aggregate_and_adapt_week(user_id: str, week_start_date: str):
             "target_weight_kg": next_expected_weight
         },
         "adjustment_reason": adjustment_reason,
-        "generated_at": iso_date(datetime.utcnow())
+        "generated_at": iso_date(now or datetime.utcnow())
     }
+    return weekly_doc
 
-    progress_weekly_col.update_one(
-        {"user_id": user_id, "week_number": week_number, "start_date": week_start_date},
-        {"$set": weekly_doc},
-        upsert=True
-    )
+def generate_next_week_docs(user_id: str, adjusted_targets: Dict[str, Any], start_date: str, week_number: int, goal: str, plan: Optional[Dict[str, Any]] = None):
 
-    next_week_start = parse_date(week_start_date) + timedelta(days=7)
-    generated_info = generate_next_week_docs(
-        user_id=user_id,
-        adjusted_targets=weekly_doc["adjusted_targets"],
-        start_date=iso_date(next_week_start),
-        week_number=(week_number + 1),
-        goal=goal
-    )
+    if plan is None:
+        plan = macro_collection.find_one({"user_id": user_id})
+    return write_next_week_docs(user_id, adjusted_targets, start_date, week_number, goal, plan)
 
-    return {"weekly_summary": weekly_doc, "generated_next_week": generated_info}
+def write_next_week_docs(user_id: str, adjusted_targets: Dict[str, Any], start_date: str, week_number: int, goal: str, plan: Optional[Dict[str, Any]]):
+    # plan is used as given, None included: no lookup here.
+    docs = build_next_week_docs(user_id, adjusted_targets, start_date, week_number, goal, plan)
+    bulk_upsert_progress_docs(docs)
+    created = [doc["date"] for doc in docs]
+    return {"start_date": start_date, "created_dates": created, "week_number": week_number}
 
-def generate_next_week_docs(user_id: str, adjusted_targets: Dict[str, Any], start_date: str, week_number: int, goal: str):
+def build_next_week_docs(user_id: str, adjusted_targets: Dict[str, Any], start_date: str, week_number: int, goal: str, plan: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
 
     daily_calories = adjusted_targets.get("daily_calories")
     daily_macros = adjusted_targets.get("daily_macros") or {}
     target_weight = adjusted_targets.get("target_weight_kg")
     workout_intensity = adjusted_targets.get("workout_intensity")
 
-    plan = macro_collection.find_one({"user_id": user_id})
     if plan and (not daily_macros or any(daily_macros.get(k) is None for k in ["protein_g", "carbs_g", "fats_g"])):
         # next_week_index = week_number - 1 (because generate_next_week_docs is called for next week)
         plan_index = week_number - 1
@@ -404,7 +556,7 @@ def generate_next_week_docs(user_id: str, adjusted_targets: Dict[str, Any], star
                     pass
 
     start_dt = parse_date(start_date)
-    created = []
+    docs = []
     for d in date_range(start_dt, 7):
         date_str = iso_date(d)
         expected = {
@@ -414,9 +566,8 @@ def generate_next_week_docs(user_id: str, adjusted_targets: Dict[str, Any], star
             "workout_intensity": workout_intensity
         }
         achieved = {"calories": None, "macros": None, "workout_intensity": None, "weight_kg": None}
-        doc = create_or_update_progress_doc(user_id=user_id, date_str=date_str, expected=expected, achieved=achieved, week_number=week_number, goal=goal)
-        created.append(doc["date"])
-    return {"start_date": start_date, "created_dates": created, "week_number": week_number}
+        docs.append(build_progress_doc(user_id=user_id, date_str=date_str, expected=expected, achieved=achieved, week_number=week_number, goal=goal))
+    return docs
 
 if __name__ == "__main__":
     USER_ID = "u003"
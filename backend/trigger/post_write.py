@@ -0,0 +1,166 @@
+import os
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+from trigger.diet_trigger import handle_summary_trigger
+from trigger.workout_trigger import handle_wo_summary_trigger
+from tracker.progress_tracker import update_daily_progress
+
+POST_WRITE_ASYNC = os.getenv("POST_WRITE_ASYNC", "1") == "1"
+POST_WRITE_WORKERS = int(os.getenv("POST_WRITE_WORKERS", "2"))
+POST_WRITE_QUEUE_PATH = os.getenv("POST_WRITE_QUEUE_PATH")
+
+JobKey = Tuple[str, str]
+
+
+def run_post_write_job(user_id: str, date: str, payload: Dict[str, Any]):
+    # Each step is guarded on its own: a failing summary trigger must not keep
+    # daily progress from being recomputed for the day.
+    if "diet_summary" in payload:
+        try:
+            handle_summary_trigger(user_id, payload["diet_summary"], date)
+        except Exception as e:
+            print(f"⚠️ Diet summary trigger failed for {user_id} on {date}: {e}")
+    if "workout_summary" in payload:
+        try:
+            handle_wo_summary_trigger(user_id, payload["workout_summary"], date)
+        except Exception as e:
+            print(f"⚠️ Workout summary trigger failed for {user_id} on {date}: {e}")
+    try:
+        update_daily_progress(user_id, date)
+    except Exception as e:
+        print(f"⚠️ Failed to update daily progress for {user_id} on {date}: {e}")
+
+
+class PostWriteQueue:
+    # Jobs are keyed by (user_id, date): a burst of edits to the same day while
+    # a job is queued (or running) collapses into a single follow-up recompute.
+    def __init__(self, handler: Callable[[str, str, Dict[str, Any]], None], workers: int = POST_WRITE_WORKERS, path: Optional[str] = POST_WRITE_QUEUE_PATH):
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.processed = 0
+        self.coalesced = 0
+        self._pending: "OrderedDict[JobKey, Dict[str, Any]]" = OrderedDict()
+        self._rerun: Dict[JobKey, Dict[str, Any]] = {}
+        self._running = set()
+        self._cond = threading.Condition()
+        self._threads = []
+        self._db = None
+        if path:
+            try:
+                self._db = sqlite3.connect(path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS post_write_jobs ("
+                    " user_id TEXT NOT NULL,"
+                    " date TEXT NOT NULL,"
+                    " payload TEXT NOT NULL,"
+                    " PRIMARY KEY (user_id, date))"
+                )
+                self._db.commit()
+                for user_id, date, payload in self._db.execute("SELECT user_id, date, payload FROM post_write_jobs"):
+                    self._pending[(user_id, date)] = json.loads(payload)
+                if self._pending:
+                    print(f"Recovered {len(self._pending)} post-write jobs from {path}")
+            except sqlite3.Error as e:
+                print(f"⚠️ Durable post-write queue disabled ({path}): {e}")
+                self._db = None
+        if self._pending:
+            self.start()
+
+    def start(self):
+        with self._cond:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._work, name=f"post-write-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def submit(self, user_id: str, date: str, payload: Dict[str, Any]):
+        key = (user_id, date)
+        with self._cond:
+            target = self._rerun if key in self._running else self._pending
+            if key in target:
+                self.coalesced += 1
+            target.setdefault(key, {}).update(payload)
+            self._persist(key, payload)
+            self._cond.notify()
+        self.start()
+
+    def _persist(self, key: JobKey, payload: Dict[str, Any]):
+        if self._db is None:
+            return
+        try:
+            row = self._db.execute(
+                "SELECT payload FROM post_write_jobs WHERE user_id = ? AND date = ?", key
+            ).fetchone()
+            stored = json.loads(row[0]) if row else {}
+            stored.update(payload)
+            self._db.execute(
+                "INSERT OR REPLACE INTO post_write_jobs (user_id, date, payload) VALUES (?, ?, ?)",
+                (key[0], key[1], json.dumps(stored, default=str)),
+            )
+            self._db.commit()
+        except sqlite3.Error as e:
+            print(f"⚠️ Could not persist post-write job {key}: {e}")
+
+    def _forget(self, key: JobKey):
+        if self._db is None:
+            return
+        try:
+            self._db.execute("DELETE FROM post_write_jobs WHERE user_id = ? AND date = ?", key)
+            self._db.commit()
+        except sqlite3.Error as e:
+            print(f"⚠️ Could not clear post-write job {key}: {e}")
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                key, payload = self._pending.popitem(last=False)
+                self._running.add(key)
+            try:
+                self.handler(key[0], key[1], payload)
+            except Exception as e:
+                print(f"❌ Post-write job failed for {key}: {e}")
+            with self._cond:
+                self._running.discard(key)
+                self.processed += 1
+                if key in self._rerun:
+                    self._pending[key] = self._rerun.pop(key)
+                else:
+                    self._forget(key)
+                self._cond.notify_all()
+
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending and not self._running, timeout=timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "pending": len(self._pending) + len(self._rerun),
+                "running": len(self._running),
+                "processed": self.processed,
+                "coalesced": self.coalesced,
+                "workers": self.workers,
+                "durable": self._db is not None,
+            }
+
+
+post_write_queue = PostWriteQueue(run_post_write_job)
+
+
+def enqueue_post_write(user_id: str, date: str, diet_summary: Optional[Dict[str, Any]] = None, workout_summary: Optional[Dict[str, Any]] = None):
+    payload = {}
+    if diet_summary is not None:
+        payload["diet_summary"] = diet_summary
+    if workout_summary is not None:
+        payload["workout_summary"] = workout_summary
+    if not POST_WRITE_ASYNC:
+        run_post_write_job(user_id, date, payload)
+        return
+    post_write_queue.submit(user_id, date, payload)
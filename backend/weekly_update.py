@@ -2,58 +2,127 @@ from datetime import datetime, timedelta
 from tracker.progress_tracker import aggregate_and_adapt_week
 import traceback
 import os
-from pymongo import MongoClient
-try:
-    MONGO_URI = os.environ.get("MONGO_URI")
-    DB_NAME = os.environ.get("DB_NAME")
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+from db_connection import macro_collection
 
-    client = MongoClient(MONGO_URI)
-    db = client[DB_NAME]
-
-    macro_collection = db["macro_plans"]
-except Exception:
-    from db_connection import macro_collection
+WEEKLY_ADAPT_WORKERS = int(os.getenv("WEEKLY_ADAPT_WORKERS", "8"))
+WEEKLY_ADAPT_BATCH_SIZE = int(os.getenv("WEEKLY_ADAPT_BATCH_SIZE", "500"))
+WEEKLY_ADAPT_MODE = os.getenv("WEEKLY_ADAPT_MODE", "per_user")
 
 
 def iso(dt: datetime) -> str:
     return dt.strftime("%Y-%m-%d")
 
-def run_weekly_adaptation():
-    today = datetime.utcnow().date()
-    yesterday = today - timedelta(days=1)
-    yesterday_str = iso(yesterday)
-
-    print(f"[CRON] Weekly adaptation running for date: {yesterday_str}")
-
-    plans = list(macro_collection.find({}))
-
-    for plan in plans:
-        user_id = plan.get("user_id")
-        weekly_plan = plan.get("Weekly_Plan", [])
-
-        if not user_id or not weekly_plan:
-            continue
-
-        for week in weekly_plan:
-            end_date = week.get("end_date")
-            start_date = week.get("start_date")
-
-            if not end_date or not start_date:
+def plans_ending_on(end_date: str, batch_size: int = WEEKLY_ADAPT_BATCH_SIZE):
+    # Served by the multikey index on Weekly_Plan.end_date; $elemMatch keeps only
+    # the matching week so the rest of the plan never leaves the server.
+    return macro_collection.find(
+        {"Weekly_Plan.end_date": end_date},
+        {"_id": 0, "user_id": 1, "Weekly_Plan": {"$elemMatch": {"end_date": end_date}}},
+        no_cursor_timeout=True,
+    ).batch_size(batch_size)
+
+def adapt_user_week(user_id: str, start_date: str):
+    result = aggregate_and_adapt_week(user_id, start_date)
+    print(f"[CRON] Adaptation completed for {user_id}")
+    print(result.get("weekly_summary", {}))
+    return result
+
+def run_batch_adaptation(target_date: str, batch_size: int = WEEKLY_ADAPT_BATCH_SIZE) -> Dict[str, Any]:
+    from tracker.batch_adapt import batch_aggregate_and_adapt
+    report = {"date": target_date, "matched": 0, "succeeded": 0, "failed": 0, "skipped": 0, "errors": []}
+    started = time.perf_counter()
+
+    def flush(chunk):
+        result = batch_aggregate_and_adapt(chunk)
+        report["succeeded"] += result["adapted"]
+        report["skipped"] += len(result["skipped"])
+        for err in result["errors"]:
+            report["failed"] += len(err["users"])
+            report["errors"].extend({"user_id": u, "error": err["error"]} for u in err["users"])
+
+    chunk = {}
+    cursor = plans_ending_on(target_date, batch_size)
+    try:
+        for plan in cursor:
+            weeks = plan.get("Weekly_Plan") or []
+            start_date = weeks[0].get("start_date") if weeks else None
+            if not plan.get("user_id") or not start_date:
+                report["skipped"] += 1
                 continue
-
-            if end_date == yesterday_str:
-                print(f"[CRON] Match found → User: {user_id}, Week ending: {end_date}")
-
-                try:
-                    result = aggregate_and_adapt_week(user_id, start_date)
-                    print(f"[CRON] Adaptation completed for {user_id}")
-                    print(result.get("weekly_summary", {}))
-
-                except Exception as e:
-                    print(f"[CRON] ERROR for user {user_id}: {str(e)}")
-                    traceback.print_exc()
-
-    print("[CRON] Weekly adaptation process completed.")
+            report["matched"] += 1
+            chunk[plan["user_id"]] = start_date
+            if len(chunk) >= batch_size:
+                flush(chunk)
+                chunk = {}
+    finally:
+        cursor.close()
+    if chunk:
+        flush(chunk)
+
+    report["seconds"] = round(time.perf_counter() - started, 2)
+    print(
+        f"[CRON] Batch weekly adaptation completed: {report['matched']} matched, "
+        f"{report['succeeded']} adapted, {report['failed']} failed, {report['skipped']} skipped "
+        f"in {report['seconds']}s"
+    )
+    return report
+
+def run_weekly_adaptation(target_date: Optional[str] = None, max_workers: int = WEEKLY_ADAPT_WORKERS, mode: str = WEEKLY_ADAPT_MODE) -> Dict[str, Any]:
+    if target_date is None:
+        target_date = iso(datetime.utcnow().date() - timedelta(days=1))
+
+    print(f"[CRON] Weekly adaptation running for date: {target_date}")
+    if mode == "batch":
+        return run_batch_adaptation(target_date)
+
+    report = {"date": target_date, "matched": 0, "succeeded": 0, "failed": 0, "skipped": 0, "errors": []}
+    lock = threading.Lock()
+    # Caps queued + running work so the cursor is consumed at the pool's pace.
+    slots = threading.BoundedSemaphore(max_workers * 2)
+    started = time.perf_counter()
+
+    def work(user_id: str, start_date: str):
+        try:
+            adapt_user_week(user_id, start_date)
+            with lock:
+                report["succeeded"] += 1
+        except Exception as e:
+            print(f"[CRON] ERROR for user {user_id}: {str(e)}")
+            traceback.print_exc()
+            with lock:
+                report["failed"] += 1
+                report["errors"].append({"user_id": user_id, "error": str(e)})
+        finally:
+            slots.release()
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="weekly-adapt") as pool:
+        cursor = plans_ending_on(target_date)
+        try:
+            for plan in cursor:
+                user_id = plan.get("user_id")
+                weeks = plan.get("Weekly_Plan") or []
+                start_date = weeks[0].get("start_date") if weeks else None
+                if not user_id or not start_date:
+                    report["skipped"] += 1
+                    continue
+                report["matched"] += 1
+                print(f"[CRON] Match found → User: {user_id}, Week ending: {target_date}")
+                slots.acquire()
+                pool.submit(work, user_id, start_date)
+        finally:
+            cursor.close()
+
+    report["seconds"] = round(time.perf_counter() - started, 2)
+    print(
+        f"[CRON] Weekly adaptation process completed: {report['matched']} matched, "
+        f"{report['succeeded']} adapted, {report['failed']} failed, {report['skipped']} skipped "
+        f"in {report['seconds']}s"
+    )
+    return report
 
 
 if __name__ == "__main__":
@@ -68,6 +68,46 @@ def build_weekly_workout_update(raw_doc):
         ex["last_trained"] = raw_doc["date"]
 
     return week_key, date_obj, muscle_updates, totals
+def build_weekly_workout_summary(raw_docs):
+    # The workout_summary a week's upserts add up to. Docs are folded in date
+    # order so rep_range and last_trained come from the latest session, as the
+    # incremental $set does.
+    summary = {
+        "totals": {k: 0 for k in ("training_days", "total_exercises", "total_sets", "total_reps", "total_duration_minutes", "total_calories_burned")},
+        "by_muscle_group": {}
+    }
+
+    for raw_doc in sorted(raw_docs, key=lambda d: d["date"]):
+        _, _, muscle_updates, totals = build_weekly_workout_update(raw_doc)
+        for k in summary["totals"]:
+            summary["totals"][k] += totals[k]
+
+        for muscle, m_data in muscle_updates.items():
+            muscle_summary = summary["by_muscle_group"].setdefault(muscle, {
+                "total_sets": 0,
+                "total_reps": 0,
+                "total_calories": 0,
+                "exercises": {}
+            })
+            muscle_summary["total_sets"] += m_data["total_sets"]
+            muscle_summary["total_reps"] += m_data["total_reps"]
+            muscle_summary["total_calories"] += m_data["total_calories"]
+
+            for ex_name, ex in m_data["exercises"].items():
+                ex_summary = muscle_summary["exercises"].setdefault(ex_name, {
+                    "sessions": 0,
+                    "total_sets": 0,
+                    "total_weight": 0,
+                    "max_weight": 0
+                })
+                ex_summary["sessions"] += ex["sessions"]
+                ex_summary["total_sets"] += ex["total_sets"]
+                ex_summary["total_weight"] += ex["total_weight"]
+                ex_summary["max_weight"] = max(ex_summary["max_weight"], ex["max_weight"])
+                ex_summary["rep_range"] = [ex["rep_min"], ex["rep_max"]]
+                ex_summary["last_trained"] = ex["last_trained"]
+
+    return summary
 def upsert_weekly_workout_summary(db, raw_doc):
     week_key, date_obj, muscle_updates, totals = build_weekly_workout_update(raw_doc)
 